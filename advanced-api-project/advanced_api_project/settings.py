@@ -11,10 +11,16 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Apps shared by every project in this repository live in <repo>/shared
+sys.path.append(str(BASE_DIR.parent / 'shared'))
+# `manage.py test` also runs the tests of the shared apps installed below
+TEST_RUNNER = 'testrunner.ProjectTestRunner'
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
@@ -40,6 +46,7 @@ INSTALLED_APPS = [
     'rest_framework',
     'django_filters',
     'api',
+    'querylog',
 ]
 
 MIDDLEWARE = [
@@ -2,6 +2,7 @@ from django.contrib import admin
 from django.urls import path, include 
 
 urlpatterns = [
+    path('admin/querylog/', include('querylog.urls')),
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
 ]
\ No newline at end of file
@@ -19,6 +19,8 @@ class Book(models.Model):
     publication_year = models.IntegerField()
     # related_name='books' allows us to access an author's books via author.books.all()
     author = models.ForeignKey(Author, related_name='books', on_delete=models.CASCADE)
+    # Last change, the validator for ETag / Last-Modified (see shared/conditional)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return self.title
\ No newline at end of file
@@ -94,4 +94,31 @@ class BookAPITests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         # First book should be Harry Potter (2001), second should be Old Book (1990)
         self.assertEqual(response.data[0]['title'], "Harry Potter")
-        self.assertEqual(response.data[1]['title'], "Old Book")
\ No newline at end of file
+        self.assertEqual(response.data[1]['title'], "Old Book")
+
+    def test_conditional_get(self):
+        """Test that unchanged books are answered with 304 Not Modified"""
+        detail_url = reverse('book-detail', args=[self.book.id])
+        response = self.client.get(detail_url)
+        self.assertIn('Last-Modified', response)
+        response = self.client.get(detail_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        etag = self.client.get(self.list_url)['ETag']
+        self.assertEqual(self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        # Adding a book changes the list's ETag
+        Book.objects.create(title="The Hobbit", publication_year=1937, author=self.author)
+        self.assertEqual(self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_update_with_stale_etag(self):
+        """Test that If-Match rejects an update based on an old version"""
+        self.client.login(username='testuser', password='password')
+        etag = self.client.get(reverse('book-detail', args=[self.book.id]))['ETag']
+        url = reverse('book-update', args=[self.book.id])
+        data = {"title": "First edit", "publication_year": 2001, "author": self.author.id}
+        self.assertEqual(self.client.put(url, data, HTTP_IF_MATCH=etag).status_code, status.HTTP_200_OK)
+        data["title"] = "Second edit"
+        response = self.client.put(url, data, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.title, "First edit")
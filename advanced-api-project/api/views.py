@@ -4,9 +4,10 @@ from rest_framework import filters # Import standard DRF filters
 from django_filters import rest_framework as django_filters # Import the external package
 from .models import Book
 from .serializers import BookSerializer
+from conditional import ConditionalRequestMixin # ETag / Last-Modified / If-Match (shared/conditional)
 
 # ListView: Retrieve all books
-class BookListView(generics.ListAPIView):
+class BookListView(ConditionalRequestMixin, generics.ListAPIView):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
@@ -26,7 +27,7 @@ class BookListView(generics.ListAPIView):
     ordering = ['title'] # Default ordering
 
 # DetailView: Retrieve a single book by ID
-class BookDetailView(generics.RetrieveAPIView):
+class BookDetailView(ConditionalRequestMixin, generics.RetrieveAPIView):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
@@ -46,7 +47,7 @@ class BookCreateView(generics.CreateAPIView):
         serializer.save()
 
 # UpdateView: Modify an existing book
-class BookUpdateView(generics.UpdateAPIView):
+class BookUpdateView(ConditionalRequestMixin, generics.UpdateAPIView):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
     # Only authenticated users can update
@@ -57,7 +58,7 @@ class BookUpdateView(generics.UpdateAPIView):
         serializer.save()
 
 # DeleteView: Remove a book
-class BookDeleteView(generics.DestroyAPIView):
+class BookDeleteView(ConditionalRequestMixin, generics.DestroyAPIView):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
     # Only authenticated users can delete
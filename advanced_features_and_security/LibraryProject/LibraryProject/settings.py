@@ -21,10 +21,16 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 import os
 from pathlib import Path
+import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Apps shared by every project in this repository live in <repo>/shared
+sys.path.append(str(BASE_DIR.parent.parent / 'shared'))
+# `manage.py test` also runs the tests of the shared apps installed below
+TEST_RUNNER = 'testrunner.ProjectTestRunner'
+
 # -----------------------------------------------------------------------------
 # Basic / Recommended: load secrets from env vars in production
 # -----------------------------------------------------------------------------
@@ -55,6 +61,7 @@ INSTALLED_APPS = [
     'relationship_app',
     'sslserver',
 
+    'querylog',
 ]
 
 MIDDLEWARE = [
@@ -99,6 +106,29 @@ DATABASES = {
     }
 }
 
+# -----------------------------------------------------------------------------
+# Cache
+# -----------------------------------------------------------------------------
+# A small LRU in each worker process in front of one cache shared by all
+# workers on the host, in a memory-mapped file (see shared/cachekit/backends.py).
+# Tests keep a per-process LocMemCache: the file would outlive the test database.
+if 'test' not in sys.argv:
+    CACHES = {
+        'default': {
+            'BACKEND': 'cachekit.backends.TieredCache',
+            'LOCATION': 'default',
+            'OPTIONS': {'SHARED': 'shared', 'LOCAL_MAXSIZE': 1000, 'LOCAL_TIMEOUT': 5},
+        },
+        'shared': {
+            'BACKEND': 'cachekit.backends.SharedMemoryCache',
+            'LOCATION': 'LibraryProject',
+            'OPTIONS': {'SIZE': 64 * 1024 * 1024},
+        },
+    }
+
+# Sessions are read on every request: serve them from the cache, write through to the DB
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
 # -----------------------------------------------------------------------------
 # Password validation
 # -----------------------------------------------------------------------------
@@ -137,6 +167,21 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Profile photos are streamed to a temporary file and rejected as soon as they
+# are too large or not an image, see shared/mediakit/uploads.py for all keys
+FILE_UPLOAD_HANDLERS = ['mediakit.uploads.ImageUploadHandler']
+UPLOADS = {
+    'MAX_BYTES': 2 * 1024 * 1024,
+    'MAX_PIXELS': 2048 * 2048,
+}
+
+# Served by mediakit.serve_media (urls.py). Behind nginx, set MEDIA_SENDFILE to
+# 'x-accel-redirect' and alias its internal /protected-media/ location to MEDIA_ROOT
+MEDIA_SERVING = {
+    'PREFIXES': ['profile_photos/'],
+    'SENDFILE': os.environ.get('MEDIA_SENDFILE') or None,
+}
+
 # -----------------------------------------------------------------------------
 # Authentication redirect URLs
 # -----------------------------------------------------------------------------
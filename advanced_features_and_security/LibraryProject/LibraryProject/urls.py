@@ -1,15 +1,13 @@
 from django.contrib import admin
 from django.urls import path, include
 from django.contrib.auth import views as auth_views
-from django.conf import settings
-from django.conf.urls.static import static
+from mediakit import serve_media
 
 urlpatterns = [
+    path('admin/querylog/', include('querylog.urls')),
     path('admin/', admin.site.urls),
     path('bookshelf/', include('bookshelf.urls')),  # Add this line
     path('relationship/', include('relationship_app.urls')),
     path('accounts/login/', auth_views.LoginView.as_view(template_name='relationship_app/login.html'), name='login'),
-]
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    path('media/<path:path>', serve_media, name='media'),
+]
\ No newline at end of file
@@ -3,6 +3,7 @@ from django.db import models
 class Book(models.Model):
     title = models.CharField(max_length=200)
     author = models.CharField(max_length=100)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)  # validator for conditional requests
 
     def __str__(self):
         return self.title
\ No newline at end of file
@@ -1,3 +1,69 @@
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
 
-# Create your tests here.
+from tokenauth.authentication import local_cache
+
+from .models import Book
+
+
+@override_settings(TOKEN_AUTH_CACHE={'LOCAL_MAXSIZE': 100})
+class TokenAuthenticationTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.user = get_user_model().objects.create_user(username='reader', password='password')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_books_need_a_token_and_later_requests_skip_its_lookup(self):
+        url = reverse('book_all-list')
+        self.assertEqual(self.client.get(url).status_code, 200)
+        # The books' validators and page remain; no token or user query
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_deactivated_users_are_rejected(self):
+        self.client.get(reverse('book_all-list'))
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('book_all-list')).status_code, 401)
+
+
+class ConditionalRequestTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.user = get_user_model().objects.create_user(username='reader', password='password')
+        self.client.force_authenticate(self.user)
+        self.book = Book.objects.create(title='Dune', author='Frank Herbert')
+
+    def test_unchanged_books_are_not_modified(self):
+        detail = reverse('book_all-detail', args=[self.book.pk])
+        response = self.client.get(detail)
+        self.assertIn('Last-Modified', response)
+        self.assertEqual(self.client.get(detail, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        etag = self.client.get(reverse('book-list'))['ETag']
+        self.assertEqual(self.client.get(reverse('book-list'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # A new book changes the list's ETag
+        Book.objects.create(title='Emma', author='Jane Austen')
+        self.assertEqual(self.client.get(reverse('book-list'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_if_match_prevents_lost_updates(self):
+        detail = reverse('book_all-detail', args=[self.book.pk])
+        etag = self.client.get(detail)['ETag']
+        data = {'title': 'Dune Messiah', 'author': 'Frank Herbert'}
+        response = self.client.put(detail, data, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        # A second update from the same version is refused
+        response = self.client.put(detail, {**data, 'title': 'Children of Dune'}, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.title, 'Dune Messiah')
@@ -2,13 +2,14 @@ from rest_framework import generics, viewsets
 from .models import Book
 from .serializers import BookSerializer
 from rest_framework.permissions import IsAuthenticated 
+from conditional import ConditionalRequestMixin
 
-class BookList(generics.ListAPIView):
+class BookList(ConditionalRequestMixin, generics.ListAPIView):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
    
 
-class BookViewSet(viewsets.ModelViewSet):
+class BookViewSet(ConditionalRequestMixin, viewsets.ModelViewSet):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
     permission_classes = [IsAuthenticated] 
\ No newline at end of file
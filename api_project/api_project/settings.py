@@ -11,10 +11,16 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Apps shared by every project in this repository live in <repo>/shared
+sys.path.append(str(BASE_DIR.parent / 'shared'))
+# `manage.py test` also runs the tests of the shared apps installed below
+TEST_RUNNER = 'testrunner.ProjectTestRunner'
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
@@ -40,6 +46,9 @@ INSTALLED_APPS = [
     'rest_framework',
     'rest_framework.authtoken',
     'api',
+    'querylog',
+    'cachekit',
+    'tokenauth',
 ]
 
 MIDDLEWARE = [
@@ -126,10 +135,31 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'tokenauth.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+}
+
+# One cache shared by all worker processes on the host, in a memory-mapped
+# file (see shared/cachekit/backends.py). Tests keep a per-process LocMemCache:
+# the file would outlive the test database.
+if 'test' not in sys.argv:
+    CACHES = {
+        'default': {
+            'BACKEND': 'cachekit.backends.SharedMemoryCache',
+            'LOCATION': 'api_project',
+            'OPTIONS': {'SIZE': 64 * 1024 * 1024},
+        },
+    }
+
+# Token -> user lookups are cached for TIMEOUT seconds (see shared/tokenauth/authentication.py).
+# Set LOCAL_MAXSIZE > 0 to add a small per-process LRU in front of the cache.
+TOKEN_AUTH_CACHE = {
+    'ALIAS': 'default',
+    'TIMEOUT': 60,
+    'LOCAL_MAXSIZE': 0,
+    'LOCAL_TIMEOUT': 5,
 }
\ No newline at end of file
@@ -3,6 +3,7 @@ from django.urls import path, include
 from rest_framework.authtoken.views import obtain_auth_token 
 
 urlpatterns = [
+    path('admin/querylog/', include('querylog.urls')),
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
     path('api-token-auth/', obtain_auth_token, name='api_token_auth'), 
@@ -11,10 +11,14 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Apps shared by every project in this repository live in <repo>/shared
+sys.path.append(str(BASE_DIR.parent.parent / 'shared'))
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
@@ -40,6 +44,7 @@ INSTALLED_APPS = [
     'bookshelf',
     'relationship_app',
 
+    'querylog',
 ]
 
 MIDDLEWARE = [
@@ -3,6 +3,7 @@ from django.urls import path, include
 from django.contrib.auth import views as auth_views
 
 urlpatterns = [
+    path('admin/querylog/', include('querylog.urls')),
     path('admin/', admin.site.urls),
     path('relationship/', include('relationship_app.urls')),
     path('accounts/login/', auth_views.LoginView.as_view(template_name='relationship_app/login.html'), name='login'),
@@ -4,10 +4,16 @@ Django settings for django_blog project.
 
 import os
 from pathlib import Path
+import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Apps shared by every project in this repository live in <repo>/shared
+sys.path.append(str(BASE_DIR.parent / 'shared'))
+# `manage.py test` also runs the tests of the shared apps installed below
+TEST_RUNNER = 'testrunner.ProjectTestRunner'
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
@@ -31,6 +37,7 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'taggit',
     'blog',  # Your custom app
+    'querylog',
 ]
 
 MIDDLEWARE = [
@@ -82,6 +89,29 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# A small LRU in each worker process in front of one cache shared by all
+# workers on the host, in a memory-mapped file (see shared/cachekit/backends.py).
+# Tests keep a per-process LocMemCache: the file would outlive the test database.
+if 'test' not in sys.argv:
+    CACHES = {
+        'default': {
+            'BACKEND': 'cachekit.backends.TieredCache',
+            'LOCATION': 'default',
+            'OPTIONS': {'SHARED': 'shared', 'LOCAL_MAXSIZE': 1000, 'LOCAL_TIMEOUT': 5},
+        },
+        'shared': {
+            'BACKEND': 'cachekit.backends.SharedMemoryCache',
+            'LOCATION': 'django_blog',
+            'OPTIONS': {'SIZE': 64 * 1024 * 1024},
+        },
+    }
+
+# Sessions are read on every request: serve them from the cache, write through to the DB
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -0,0 +1 @@
+from .stampede import get_or_set  # noqa: F401
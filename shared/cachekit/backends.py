@@ -0,0 +1,580 @@
+"""
+Cache backends.
+
+SharedMemoryCache keeps entries in a memory-mapped file that every worker
+process on the host maps, so gunicorn workers share one cache (and its hit
+rate) without running Redis or memcached:
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'cachekit.backends.SharedMemoryCache',
+            'LOCATION': 'social_media_api',   # file name, in a private directory in /dev/shm
+            'OPTIONS': {'SIZE': 64 * 1024 * 1024},
+        },
+    }
+
+Layout: the file is split evenly between size classes (ITEM_SIZES, like
+memcached's slabs). Each class is a set-associative table: a key's 64-bit
+hash picks one set of WAYS slots, so lookups read a handful of slot headers
+and no separate index has to be kept consistent. Storing into a full set
+evicts its least recently used slot (LRU per set). Per-key expiry is
+checked on read, and expired slots are the first to be reused.
+
+An entry is key + pickled value. It goes into the smallest class it fits;
+entries larger than the largest class are not cached. Every operation holds
+an exclusive flock() on the file, which the kernel releases if a worker
+dies. A process opens and maps the file once, for all its threads. The
+backend needs a POSIX system (fcntl).
+
+Values are unpickled, so whoever can write the file can run code in the
+workers: the file must belong to the user running them and be accessible
+to nobody else. A relative LOCATION is kept in a directory only that user
+can enter (djcache-<uid> in /dev/shm, or in the temporary directory). A
+file laid out for other OPTIONS is refused rather than rewritten, as
+running processes may still have it mapped.
+
+TieredCache puts a per-process LRU in front of any shared cache, see its
+docstring.
+"""
+import fcntl
+import hashlib
+import mmap
+import os
+import pickle
+import random
+import stat
+import struct
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.functional import cached_property
+
+MISSING = object()
+
+MAGIC = b'djshmc01'
+HEADER_SIZE = 4096
+# hash, expires (0 = never), last access, key length, value length
+SLOT = struct.Struct('<QddII')
+
+DEFAULT_OPTIONS = {
+    'SIZE': 64 * 1024 * 1024,
+    'ITEM_SIZES': (256, 1024, 4096, 16384, 65536, 262144),
+    'WAYS': 8,
+}
+
+
+class SizeClass:
+    """One slab: `sets` sets of `ways` slots holding up to `item_size` bytes each."""
+
+    def __init__(self, offset, item_size, ways, size):
+        self.offset = offset
+        self.item_size = item_size
+        self.ways = ways
+        self.stride = SLOT.size + item_size
+        self.sets = size // (self.stride * ways)
+        self.end = offset + self.sets * ways * self.stride
+        # Unpacks the hashes of all slots of a set in one call
+        self.hashes = struct.Struct('<' + f'Q{self.stride - 8}x' * ways)
+
+    def set_offset(self, key_hash):
+        return self.offset + (key_hash % self.sets) * self.ways * self.stride
+
+
+# One file description and mapping per file, shared by the threads (and
+# so the per-thread cache instances) of a process
+_mappings = {}
+_mappings_lock = threading.Lock()
+
+
+class SharedMemoryCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = {**DEFAULT_OPTIONS, **params.get('OPTIONS', {})}
+        self.directory = None
+        if not os.path.isabs(location):
+            base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+            self.directory = os.path.join(base, f'djcache-{os.geteuid()}')
+            location = os.path.join(self.directory, f'{location or "django"}.djcache')
+        self.path = location
+
+        item_sizes = sorted(options['ITEM_SIZES'])
+        share = (options['SIZE'] - HEADER_SIZE) // len(item_sizes)
+        self.classes, offset = [], HEADER_SIZE
+        for item_size in item_sizes:
+            if share < (SLOT.size + item_size) * options['WAYS']:
+                break  # not even one set fits: larger items are not cached
+            size_class = SizeClass(offset, item_size, options['WAYS'], share)
+            self.classes.append(size_class)
+            offset = size_class.end
+        if not self.classes:
+            raise ImproperlyConfigured(f'SharedMemoryCache: SIZE is too small for {location!r}.')
+        self.size = offset
+        geometry = repr([(c.item_size, c.ways, c.sets) for c in self.classes]).encode()
+        self.header = MAGIC + hashlib.blake2b(geometry, digest_size=8).digest()
+
+    # File handling
+
+    def _mapping(self):
+        """This process's (lock, fd, mmap) of the file, opened on first use."""
+        key = (self.path, os.getpid())
+        mapping = _mappings.get(key)
+        if mapping is None:
+            with _mappings_lock:
+                mapping = _mappings.get(key)
+                if mapping is None:
+                    # Inherited from the parent across a fork: ours to close,
+                    # the parent keeps its own
+                    for inherited in [other for other in _mappings if other[1] != key[1]]:
+                        _, fd, mm = _mappings.pop(inherited)
+                        mm.close()
+                        os.close(fd)
+                    mapping = _mappings[key] = (threading.Lock(), *self._open())
+        return mapping
+
+    def _open(self):
+        if self.directory is not None:
+            os.makedirs(self.directory, 0o700, exist_ok=True)
+            self._check_private(os.lstat(self.directory), self.directory, stat.S_ISDIR)
+        # After a fork the child must open its own file description, or its
+        # flock() would be shared with (and not exclude) the parent's
+        try:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_EXCL | os.O_NOFOLLOW, 0o600)
+        except FileExistsError:
+            fd = os.open(self.path, os.O_RDWR | os.O_NOFOLLOW)
+        try:
+            self._check_private(os.fstat(fd), self.path, stat.S_ISREG)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                size = os.fstat(fd).st_size
+                if size == 0:
+                    # New file, nobody maps it yet: lay it out
+                    os.ftruncate(fd, self.size)
+                    os.pwrite(fd, self.header, 0)
+                elif size != self.size or os.pread(fd, len(self.header), 0) != self.header:
+                    raise ImproperlyConfigured(
+                        f'SharedMemoryCache: {self.path!r} is laid out for other OPTIONS and may still be '
+                        f'mapped by running processes. Use another LOCATION, or remove the file once they stopped.'
+                    )
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            return fd, mmap.mmap(fd, self.size)
+        except BaseException:
+            os.close(fd)
+            raise
+
+    @staticmethod
+    def _check_private(st, name, is_kind):
+        """Refuse what another user could write: values read from the file are unpickled."""
+        if not is_kind(st.st_mode) or st.st_uid != os.geteuid() or st.st_mode & 0o077:
+            raise ImproperlyConfigured(
+                f'SharedMemoryCache: {name!r} must belong to this user, with no permissions for group or others.'
+            )
+
+    @contextmanager
+    def _locked(self):
+        # flock() excludes other processes, the thread lock the other
+        # threads of this one: they share the file description
+        lock, fd, mm = self._mapping()
+        with lock:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                yield mm
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def close(self, **kwargs):
+        # Called at the end of each request: keep the mapping, it is reused
+        pass
+
+    # Slots
+
+    @staticmethod
+    def _hash(key):
+        return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little') or 1
+
+    def _find(self, mm, key_hash, raw_key, now):
+        """Offset of the live slot holding the key, or None. Frees it if expired."""
+        for size_class in self.classes:
+            base = size_class.set_offset(key_hash)
+            for way, slot_hash in enumerate(size_class.hashes.unpack_from(mm, base)):
+                if slot_hash != key_hash:
+                    continue
+                offset = base + way * size_class.stride
+                _, expires, _, key_length, _ = SLOT.unpack_from(mm, offset)
+                start = offset + SLOT.size
+                if mm[start:start + key_length] != raw_key:
+                    continue
+                if expires and expires <= now:
+                    self._free(mm, offset)
+                    return None
+                return offset
+        return None
+
+    @staticmethod
+    def _free(mm, offset):
+        mm[offset:offset + 8] = bytes(8)
+
+    def _read(self, mm, offset, now):
+        key_hash, expires, _, key_length, value_length = SLOT.unpack_from(mm, offset)
+        SLOT.pack_into(mm, offset, key_hash, expires, now, key_length, value_length)
+        start = offset + SLOT.size + key_length
+        return mm[start:start + value_length]
+
+    def _store(self, mm, key_hash, raw_key, pickled, expires, now):
+        """Write the entry into its size class, evicting if needed. False if it is too large."""
+        existing = self._find(mm, key_hash, raw_key, now)
+        if existing is not None:
+            self._free(mm, existing)
+        length = len(raw_key) + len(pickled)
+        size_class = next((c for c in self.classes if c.item_size >= length), None)
+        if size_class is None:
+            return False
+
+        # An empty or expired slot, else the least recently used one
+        base = size_class.set_offset(key_hash)
+        victim, oldest = None, None
+        for way in range(size_class.ways):
+            offset = base + way * size_class.stride
+            slot_hash, slot_expires, accessed, _, _ = SLOT.unpack_from(mm, offset)
+            if not slot_hash or (slot_expires and slot_expires <= now):
+                victim = offset
+                break
+            if oldest is None or accessed < oldest:
+                victim, oldest = offset, accessed
+
+        # The hash goes in last: a half-written slot is never found
+        self._free(mm, victim)
+        start = victim + SLOT.size
+        mm[start:start + length] = raw_key + pickled
+        SLOT.pack_into(mm, victim, 0, expires, now, len(raw_key), len(pickled))
+        mm[victim:victim + 8] = key_hash.to_bytes(8, 'little')
+        return True
+
+    def _expires(self, timeout):
+        expires = self.get_backend_timeout(timeout)
+        return 0.0 if expires is None else expires
+
+    # Cache API
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        raw_key, key_hash = key.encode(), self._hash(key)
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        expires = self._expires(timeout)
+        with self._locked() as mm:
+            now = time.time()
+            if self._find(mm, key_hash, raw_key, now) is not None:
+                return False
+            return self._store(mm, key_hash, raw_key, pickled, expires, now)
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        raw_key, key_hash = key.encode(), self._hash(key)
+        with self._locked() as mm:
+            now = time.time()
+            offset = self._find(mm, key_hash, raw_key, now)
+            if offset is None:
+                return default
+            pickled = self._read(mm, offset, now)
+        return pickle.loads(pickled)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        raw_key, key_hash = key.encode(), self._hash(key)
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        expires = self._expires(timeout)
+        with self._locked() as mm:
+            self._store(mm, key_hash, raw_key, pickled, expires, time.time())
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        raw_key, key_hash = key.encode(), self._hash(key)
+        with self._locked() as mm:
+            now = time.time()
+            offset = self._find(mm, key_hash, raw_key, now)
+            if offset is None:
+                return False
+            slot_hash, _, _, key_length, value_length = SLOT.unpack_from(mm, offset)
+            SLOT.pack_into(mm, offset, slot_hash, self._expires(timeout), now, key_length, value_length)
+            return True
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        raw_key, key_hash = key.encode(), self._hash(key)
+        with self._locked() as mm:
+            now = time.time()
+            offset = self._find(mm, key_hash, raw_key, now)
+            if offset is None:
+                raise ValueError("Key '%s' not found" % key)
+            expires = SLOT.unpack_from(mm, offset)[1]
+            new_value = pickle.loads(self._read(mm, offset, now)) + delta
+            self._store(mm, key_hash, raw_key, pickle.dumps(new_value, self.pickle_protocol), expires, now)
+        return new_value
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._locked() as mm:
+            return self._find(mm, self._hash(key), key.encode(), time.time()) is not None
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._locked() as mm:
+            offset = self._find(mm, self._hash(key), key.encode(), time.time())
+            if offset is None:
+                return False
+            self._free(mm, offset)
+            return True
+
+    def clear(self):
+        with self._locked() as mm:
+            chunk = 1024 * 1024
+            for start in range(HEADER_SIZE, self.size, chunk):
+                end = min(start + chunk, self.size)
+                mm[start:end] = bytes(end - start)
+
+
+class LocalLRU:
+    """
+    Thread-safe LRU of pickled values with per-entry expiry, in process memory.
+    """
+    def __init__(self):
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.generation = None     # of the shared tier, when the entries were filled
+        self.pid = self.owner = None  # the process filling it, and its id in fill markers
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            pickled, expires = entry
+            if expires <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return pickled
+
+    def set(self, key, pickled, timeout, maxsize):
+        with self._lock:
+            self._data[key] = (pickled, time.monotonic() + timeout)
+            self._data.move_to_end(key)
+            while len(self._data) > maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# One local tier per TieredCache LOCATION, shared by the threads of a process
+_local_tiers = {}
+
+# Fill marker of a key kept by more than one process
+SEVERAL = '*'
+
+TIERED_OPTIONS = {
+    'SHARED': 'shared',       # alias of the shared cache behind the local tier
+    'LOCAL_MAXSIZE': 1000,    # entries kept in each process
+    'LOCAL_TIMEOUT': 5,       # seconds an entry may live in a process, whatever happens
+    'CHECK_INTERVAL': 1,      # seconds between generation checks within one request
+}
+
+
+class TieredCache(BaseCache):
+    """
+    A small per-process LRU in front of a shared cache (another CACHES alias):
+
+        CACHES = {
+            'default': {
+                'BACKEND': 'cachekit.backends.TieredCache',
+                'LOCATION': 'default',
+                'OPTIONS': {'SHARED': 'shared', 'LOCAL_MAXSIZE': 1000},
+            },
+            'shared': {'BACKEND': 'cachekit.backends.SharedMemoryCache', 'LOCATION': 'myproject'},
+        }
+
+    Reads are served from the process when possible. Before a process reads
+    a key from the shared cache to keep it, it leaves a fill marker there
+    naming itself, or several processes. Coherence: a write through this
+    backend that finds another process in the key's marker increments a
+    generation counter in the shared cache. Each process reads the counter
+    once per request (and every CHECK_INTERVAL seconds within one) and drops
+    its local entries when it has moved, so a write is seen by every worker
+    from its next request on. Writes of keys no other process keeps (cold
+    fills, counters and locks nobody reads) leave the other local tiers
+    alone. add() does not count as a write: it only fills a missing key.
+    Write through this alias, not the shared one, or other workers keep
+    stale entries for up to LOCAL_TIMEOUT; the same holds for keys whose
+    marker the shared cache evicted.
+    """
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.options = {**TIERED_OPTIONS, **params.get('OPTIONS', {})}
+        self.local = _local_tiers.setdefault(location, LocalLRU())
+        self.generation_key = f'cachekit:generation:{self.options["SHARED"]}'
+        self._checked_at = None
+
+    @cached_property
+    def shared(self):
+        from django.core.cache import caches
+        return caches[self.options['SHARED']]
+
+    # Generations
+
+    def sync(self):
+        """Drop the local entries if another process wrote since we last looked."""
+        if self.local.pid != os.getpid():
+            # New process (or forked child): markers name the parent, start over
+            self.local.clear()
+            self.local.pid, self.local.owner = os.getpid(), os.urandom(8).hex()
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.options['CHECK_INTERVAL']:
+            return
+        generation = self.shared.get(self.generation_key)
+        if generation is None:
+            # Evicted or never written: start at a random value, so an old
+            # generation a process still remembers is not reused
+            self.shared.add(self.generation_key, random.getrandbits(62), None)
+            generation = self.shared.get(self.generation_key)
+        if generation != self.local.generation:
+            self.local.clear()
+            self.local.generation = generation
+        self._checked_at = now
+
+    def bump(self):
+        try:
+            self.shared.incr(self.generation_key)
+        except ValueError:
+            self.shared.add(self.generation_key, random.getrandbits(62), None)
+        # Our own local entries are dropped on the next sync, like everyone's
+        self._checked_at = None
+
+    # Fill markers
+
+    def marker_key(self, key, version):
+        local_key = self.local_key(key, version)
+        return 'cachekit:filled:' + hashlib.blake2b(local_key.encode(), digest_size=16).hexdigest()
+
+    def claim(self, keys, version):
+        """Mark `keys` as kept by this process. Before reading them: a write in between then bumps."""
+        owner, timeout = self.local.owner, self.options['LOCAL_TIMEOUT'] + 1  # outlives the entries filled after it
+        markers = [self.marker_key(key, version) for key in keys]
+        # add() is atomic: of two processes claiming a fresh key, one finds the other's marker
+        taken = [marker for marker in markers if not self.shared.add(marker, owner, timeout)]
+        if not taken:
+            return
+        found, several = self.shared.get_many(taken), {}
+        for marker in taken:
+            if found.get(marker) in (owner, SEVERAL):
+                self.shared.touch(marker, timeout)
+            else:
+                several[marker] = SEVERAL  # also when it just expired: at worst writes bump needlessly
+        if several:
+            self.shared.set_many(several, timeout)
+
+    def invalidate(self, keys, version):
+        """After writing `keys`: bump the generation if another process may keep one of them."""
+        for key in keys:
+            self.local.delete(self.local_key(key, version))
+        markers = self.shared.get_many([self.marker_key(key, version) for key in keys])
+        if any(owner != self.local.owner for owner in markers.values()):
+            self.bump()
+
+    def close(self, **kwargs):
+        # End of a request: check the generation again on the next read
+        self._checked_at = None
+
+    # Local tier
+
+    def local_key(self, key, version):
+        return self.make_and_validate_key(key, version=version)
+
+    def fill(self, key, value, version):
+        timeout = self.options['LOCAL_TIMEOUT']
+        self.local.set(
+            self.local_key(key, version), pickle.dumps(value, self.pickle_protocol),
+            timeout, self.options['LOCAL_MAXSIZE'],
+        )
+
+    # Cache API
+
+    def get(self, key, default=None, version=None):
+        self.sync()
+        pickled = self.local.get(self.local_key(key, version))
+        if pickled is not None:
+            return pickle.loads(pickled)
+        self.claim([key], version)
+        value = self.shared.get(key, MISSING, version=version)
+        if value is MISSING:
+            return default
+        self.fill(key, value, version)
+        return value
+
+    def get_many(self, keys, version=None):
+        self.sync()
+        found, missing = {}, []
+        for key in keys:
+            pickled = self.local.get(self.local_key(key, version))
+            if pickled is not None:
+                found[key] = pickle.loads(pickled)
+            else:
+                missing.append(key)
+        if missing:
+            self.claim(missing, version)
+            fetched = self.shared.get_many(missing, version=version)
+            for key, value in fetched.items():
+                self.fill(key, value, version)
+            found.update(fetched)
+        return found
+
+    def has_key(self, key, version=None):
+        self.sync()
+        return self.local.get(self.local_key(key, version)) is not None or self.shared.has_key(key, version=version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.add(key, value, timeout, version=version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version=version)
+        self.invalidate([key], version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version)
+        self.invalidate(list(data), version)
+        return failed
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        value = self.shared.incr(key, delta, version=version)
+        self.invalidate([key], version)
+        return value
+
+    def delete(self, key, version=None):
+        deleted = self.shared.delete(key, version=version)
+        self.invalidate([key], version)
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        self.shared.delete_many(keys, version=version)
+        self.invalidate(list(keys), version)
+
+    def clear(self):
+        self.shared.clear()
+        self.local.clear()
+        self.bump()
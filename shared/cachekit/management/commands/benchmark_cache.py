@@ -0,0 +1,93 @@
+import multiprocessing
+import random
+import shutil
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.management.commands.createcachetable import Command as CreateCacheTable
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.utils.module_loading import import_string
+
+TABLE = 'cachekit_benchmark'
+
+
+def run_worker(backend, location, options, ops, keys, seed, results):
+    """Read-through loop over Zipf-distributed keys: get, and set on a miss."""
+    cache = import_string(backend)(location, {'OPTIONS': options, 'TIMEOUT': 300})
+    rng = random.Random(seed)
+    cum_weights, total = [], 0.0
+    for rank in range(1, keys + 1):
+        total += 1 / rank
+        cum_weights.append(total)
+    names = [f'bench:{i}' for i in range(keys)]
+    sample = rng.choices(names, cum_weights=cum_weights, k=ops)
+    value = {'id': 1, 'title': 'x' * 200, 'tags': list(range(50))}
+
+    hits = 0
+    start = time.perf_counter()
+    for key in sample:
+        if cache.get(key) is None:
+            cache.set(key, value)
+        else:
+            hits += 1
+    results.put((time.perf_counter() - start, hits))
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare cache backends under several worker processes: throughput of a '
+        'read-through loop, and the hit rate the processes get together'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--ops', type=int, default=20000, help='get (+ set on a miss) per process')
+        parser.add_argument('--keys', type=int, default=5000, help='Distinct keys, requested with a Zipf distribution')
+        parser.add_argument('--skip', nargs='*', default=[], help='Backends to skip, e.g. db')
+
+    def handle(self, *args, **options):
+        directory = tempfile.mkdtemp(prefix='cachekit-bench-')
+        backends = [
+            ('locmem', 'django.core.cache.backends.locmem.LocMemCache', 'bench', {'MAX_ENTRIES': 100000}),
+            ('file', 'django.core.cache.backends.filebased.FileBasedCache', f'{directory}/files', {'MAX_ENTRIES': 100000}),
+            ('db', 'django.core.cache.backends.db.DatabaseCache', TABLE, {'MAX_ENTRIES': 100000}),
+            ('shm', 'cachekit.backends.SharedMemoryCache', f'{directory}/shm.djcache', {'SIZE': 64 * 1024 * 1024}),
+        ]
+        create_table = CreateCacheTable()
+        create_table.verbosity = 0
+        create_table.create_table(DEFAULT_DB_ALIAS, TABLE, dry_run=False)
+        context = multiprocessing.get_context('fork')
+        try:
+            for name, backend, location, backend_options in backends:
+                if name in options['skip']:
+                    continue
+                import_string(backend)(location, {'OPTIONS': backend_options}).clear()
+                connections.close_all()  # children must not share the parent's connection
+
+                results = context.Queue()
+                workers = [
+                    context.Process(target=run_worker, args=(
+                        backend, location, backend_options, options['ops'], options['keys'], seed, results,
+                    ))
+                    for seed in range(options['processes'])
+                ]
+                started = time.perf_counter()
+                for worker in workers:
+                    worker.start()
+                outcomes = [results.get() for _ in workers]
+                for worker in workers:
+                    worker.join()
+                elapsed = time.perf_counter() - started
+
+                total = options['ops'] * options['processes']
+                hits = sum(worker_hits for _, worker_hits in outcomes)
+                self.stdout.write(
+                    f'{name:8} {total / elapsed:10.0f} ops/s   hit rate {hits / total:6.1%}   '
+                    f'slowest process {max(seconds for seconds, _ in outcomes):.2f}s'
+                )
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute(f'DROP TABLE {connection.ops.quote_name(TABLE)}')
+            shutil.rmtree(directory, ignore_errors=True)
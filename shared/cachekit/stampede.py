@@ -0,0 +1,118 @@
+"""
+Cache stampede protection.
+
+When a hot key expires, every worker that misses it would rebuild the value
+at the same time. get_or_set() prevents that in two ways:
+
+* Single flight: a rebuild takes a short lock (cache.add) on the key. Only
+  the worker holding it rebuilds. The others serve the previous value while
+  it is within its stale window (stale-while-revalidate). If there is no
+  previous value, they wait for the lock holder's result.
+* Probabilistic early expiration (XFetch, Vattani et al. 2015): every read
+  may refresh a value slightly before it expires. The chance rises as expiry
+  nears and with how long the last rebuild took. Usually one worker refreshes
+  it ahead of time, and the key never expires under load at all.
+
+Entries are stored as {'value', 'delta', 'expires'}: 'delta' is how many
+seconds the last rebuild took, 'expires' the wall-clock soft expiry. The
+cache keeps them STALE_TIMEOUT seconds longer, to serve while rebuilding.
+"""
+import math
+import random
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+# Defaults, override any of them with CACHEKIT in settings.py
+DEFAULTS = {
+    'ALIAS': 'default',       # which entry of CACHES to use
+    'STALE_TIMEOUT': 60,      # seconds an expired value may be served while it is rebuilt
+    'BETA': 1.0,              # XFetch eagerness, > 1 refreshes earlier, 0 turns it off
+    'LOCK_TIMEOUT': 30,       # seconds after which a crashed rebuild's lock frees itself
+    'WAIT': 5,                # seconds to wait for another worker's rebuild on a cold miss
+    'POLL_INTERVAL': 0.05,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'CACHEKIT', {})}
+
+
+def lock_key(key):
+    return f'stampede:lock:{key}'
+
+
+def acquire(cache, key, timeout):
+    """A token if we now hold the rebuild lock of `key`, else None."""
+    token = uuid.uuid4().hex
+    return token if cache.add(lock_key(key), token, timeout) else None
+
+
+def release(cache, key, token):
+    # Not atomic, but only a lock that expired while we rebuilt can be lost
+    if cache.get(lock_key(key)) == token:
+        cache.delete(lock_key(key))
+
+
+def expires_early(entry, beta, now=None):
+    """XFetch: True if this read should refresh the entry ahead of its expiry."""
+    now = time.time() if now is None else now
+    # -log(U) for U in (0, 1] is exponentially distributed with mean 1
+    return now - entry['delta'] * beta * math.log(1.0 - random.random()) >= entry['expires']
+
+
+def rebuild(cache, key, build, timeout, stale_timeout):
+    started = time.monotonic()
+    value = build()
+    if value is not None:
+        entry = {'value': value, 'delta': time.monotonic() - started, 'expires': time.time() + timeout}
+        cache.set(key, entry, timeout + stale_timeout)
+    return value
+
+
+def get_or_set(key, build, timeout, cache=None, is_valid=None, **options):
+    """
+    The cached value of `key`, calling build() to (re)compute it at most once
+    per expiry across all workers sharing the cache.
+
+    `timeout`: seconds the value is fresh. `is_valid(value)`: optional check
+    for values that can go stale before their timeout (e.g. tag versions);
+    an invalid value is rebuilt like an expired one. build() returning None
+    means "do not cache": the None is returned and nothing is stored.
+    Any CACHEKIT setting can be overridden per call, in lowercase
+    (e.g. ``stale_timeout=10``).
+    """
+    config = {**get_config(), **{name.upper(): value for name, value in options.items()}}
+    cache = cache or caches[config['ALIAS']]
+
+    entry = cache.get(key)
+    fresh = (
+        entry is not None
+        and entry['expires'] > time.time()
+        and (is_valid is None or is_valid(entry['value']))
+    )
+    if fresh and not expires_early(entry, config['BETA']):
+        return entry['value']
+
+    token = acquire(cache, key, config['LOCK_TIMEOUT'])
+    if token is not None:
+        try:
+            return rebuild(cache, key, build, timeout, config['STALE_TIMEOUT'])
+        finally:
+            release(cache, key, token)
+
+    # Someone else is rebuilding
+    if entry is not None:
+        return entry['value']
+    deadline = time.monotonic() + config['WAIT']
+    while time.monotonic() < deadline:
+        time.sleep(config['POLL_INTERVAL'])
+        entry = cache.get(key)
+        if entry is not None and (is_valid is None or is_valid(entry['value'])):
+            return entry['value']
+        if cache.get(lock_key(key)) is None:
+            break  # the rebuild failed or stored nothing
+    # Give up waiting rather than fail the request
+    return rebuild(cache, key, build, timeout, config['STALE_TIMEOUT'])
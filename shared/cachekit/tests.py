@@ -0,0 +1,275 @@
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, override_settings
+
+from . import stampede
+from .backends import SharedMemoryCache, _mappings
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'cachekit-tests'}}
+
+
+@override_settings(CACHES=LOCMEM, CACHEKIT={'BETA': 0})
+class StampedeTests(SimpleTestCase):
+
+    def setUp(self):
+        self.cache = caches['default']
+        self.cache.clear()
+        self.builds = 0
+        self.lock = threading.Lock()
+
+    def slow_build(self, value='fresh'):
+        def build():
+            with self.lock:
+                self.builds += 1
+            time.sleep(0.2)
+            return value
+        return build
+
+    def hammer(self, build, threads=20):
+        """Call get_or_set from many threads at once, return what each got."""
+        barrier = threading.Barrier(threads)
+        results = []
+
+        def worker():
+            barrier.wait()
+            results.append(stampede.get_or_set('key', build, 60))
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return results
+
+    def test_cold_miss_is_built_once(self):
+        results = self.hammer(self.slow_build())
+        self.assertEqual(self.builds, 1)
+        self.assertEqual(results, ['fresh'] * 20)
+
+    def test_expired_value_is_rebuilt_once_and_served_stale_meanwhile(self):
+        self.cache.set('key', {'value': 'old', 'delta': 0.2, 'expires': time.time() - 1}, 60)
+        started = time.monotonic()
+        results = self.hammer(self.slow_build())
+        self.assertEqual(self.builds, 1)
+        self.assertEqual(sorted(results), ['fresh'] + ['old'] * 19)
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(stampede.get_or_set('key', self.slow_build(), 60), 'fresh')
+        self.assertEqual(self.builds, 1)
+
+    def test_invalid_value_is_rebuilt(self):
+        self.cache.set('key', {'value': 'old', 'delta': 0, 'expires': time.time() + 60}, 60)
+        value = stampede.get_or_set('key', lambda: 'new', 60, is_valid=lambda value: value != 'old')
+        self.assertEqual(value, 'new')
+
+    def test_none_is_not_cached(self):
+        self.assertIsNone(stampede.get_or_set('key', lambda: None, 60))
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_xfetch_refreshes_before_expiry(self):
+        entry = {'value': 'old', 'delta': 2.0, 'expires': 1000.0}
+        # -log(1 - 0.9) * 2s = 4.6s: early enough 1s before expiry
+        with mock.patch('random.random', return_value=0.9):
+            self.assertTrue(stampede.expires_early(entry, beta=1.0, now=999.0))
+            self.assertFalse(stampede.expires_early(entry, beta=1.0, now=990.0))
+            self.assertFalse(stampede.expires_early(entry, beta=0, now=999.0))
+
+
+SMALL = {'OPTIONS': {'SIZE': 4 * 1024 * 1024}}
+
+
+def increment(location, times):
+    cache = SharedMemoryCache(location, SMALL)
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SharedMemoryCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.location = os.path.join(directory, 'test.djcache')
+        self.addCleanup(lambda: os.path.exists(self.location) and os.remove(self.location))
+        self.cache = SharedMemoryCache(self.location, SMALL)
+        self.addCleanup(self.unmap)
+
+    def unmap(self):
+        mapping = _mappings.pop((self.location, os.getpid()), None)
+        if mapping is not None:
+            mapping[2].close()
+            os.close(mapping[1])
+
+    def test_cache_api(self):
+        self.cache.set('a', {'x': 1})
+        self.assertEqual(self.cache.get('a'), {'x': 1})
+        self.assertFalse(self.cache.add('a', 2))
+        self.assertTrue(self.cache.add('b', 2))
+        self.assertEqual(self.cache.incr('b', 3), 5)
+        self.assertTrue(self.cache.delete('a'))
+        self.assertIsNone(self.cache.get('a'))
+
+        # Moves to a larger size class and back
+        self.cache.set('b', 'x' * 3000)
+        self.cache.set('b', 'small')
+        self.assertEqual(self.cache.get('b'), 'small')
+
+        self.cache.set('c', 1, timeout=0.05)
+        time.sleep(0.1)
+        self.assertFalse(self.cache.has_key('c'))
+
+        self.cache.clear()
+        self.assertIsNone(self.cache.get('b'))
+
+    def test_values_too_large_are_not_cached(self):
+        self.cache.set('big', 'old')
+        self.cache.set('big', 'x' * 300000)
+        self.assertIsNone(self.cache.get('big'))
+
+    def test_full_set_evicts_its_least_recently_used_slot(self):
+        size_class = self.cache.classes[0]
+        same_set = [key for key in map(str, range(5000))
+                    if size_class.set_offset(self.cache._hash(self.cache.make_key(key)))
+                    == size_class.set_offset(self.cache._hash(self.cache.make_key('0')))]
+        for key in same_set[:size_class.ways]:
+            self.cache.set(key, key)
+        self.cache.get(same_set[0])  # now the most recently used
+        self.cache.set(same_set[size_class.ways], 'new')
+        self.assertEqual(self.cache.get(same_set[0]), same_set[0])
+        self.assertIsNone(self.cache.get(same_set[1]))
+
+    def test_files_others_could_write_or_laid_out_differently_are_refused(self):
+        self.cache.set('a', 1)
+        self.unmap()  # as in a new process
+        with self.assertRaises(ImproperlyConfigured):
+            SharedMemoryCache(self.location, {'OPTIONS': {'SIZE': 8 * 1024 * 1024}}).get('a')
+        self.assertEqual(os.path.getsize(self.location), self.cache.size)  # not rewritten
+
+        # Its values are unpickled: a file other users can write is never read
+        os.chmod(self.location, 0o666)
+        with self.assertRaises(ImproperlyConfigured):
+            SharedMemoryCache(self.location, SMALL).get('a')
+
+    def test_threads_share_one_mapping_and_exclude_each_other(self):
+        self.cache.set('counter', 0)
+        # Django gives each thread its own cache instance
+        threads = [threading.Thread(target=increment, args=(self.location, 200)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.cache.get('counter'), 800)
+        self.assertEqual(len([key for key in _mappings if key[0] == self.location]), 1)
+
+    def test_processes_share_entries_atomically(self):
+        self.cache.set('counter', 0)
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=increment, args=(self.location, 200)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get('counter'), 800)
+
+
+TIERED = {
+    'default': {
+        'BACKEND': 'cachekit.backends.TieredCache',
+        'LOCATION': 'worker-a',
+        'OPTIONS': {'SHARED': 'shared', 'CHECK_INTERVAL': 60},
+    },
+    # A second worker: the same shared cache behind another local tier
+    'other_worker': {
+        'BACKEND': 'cachekit.backends.TieredCache',
+        'LOCATION': 'worker-b',
+        'OPTIONS': {'SHARED': 'shared', 'CHECK_INTERVAL': 60},
+    },
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'cachekit-shared'},
+}
+
+
+@override_settings(CACHES=TIERED)
+class TieredCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.cache, self.other, self.shared = caches['default'], caches['other_worker'], caches['shared']
+        self.cache.clear()
+        self.cache.close()
+        self.other.close()
+
+    def test_reads_are_served_locally(self):
+        self.cache.set('post:1', {'title': 'First'})
+        self.assertEqual(self.cache.get('post:1'), {'title': 'First'})
+        self.shared.delete('post:1')  # behind the tier's back
+        self.assertEqual(self.cache.get('post:1'), {'title': 'First'})
+        self.assertEqual(self.cache.get_many(['post:1', 'post:2']), {'post:1': {'title': 'First'}})
+
+    def test_writes_reach_other_workers_on_their_next_request(self):
+        self.cache.set('post:1', 'First')
+        self.assertEqual(self.other.get('post:1'), 'First')
+
+        self.cache.set('post:1', 'Edited')
+        # Within the same request the other worker may keep its copy...
+        self.assertEqual(self.other.get('post:1'), 'First')
+        self.other.close()  # request_finished
+        # ...and sees the write from its next request on
+        self.assertEqual(self.other.get('post:1'), 'Edited')
+
+        self.cache.delete('post:1')
+        self.other.close()
+        self.assertIsNone(self.other.get('post:1'))
+
+    def test_fills_leave_other_workers_local_entries_alone(self):
+        self.cache.set('post:1', 'First')
+        self.assertEqual(self.other.get('post:1'), 'First')
+        self.shared.delete('post:1')  # behind the tiers' back: only the local copy has it
+
+        # A cold fill, a lock and a counter no other worker reads
+        self.assertIsNone(self.cache.get('post:2'))
+        self.cache.set('post:2', 'Second')
+        self.cache.add('lock', 'token')
+        self.assertEqual(self.cache.get('lock'), 'token')
+        self.cache.delete('lock')
+        self.cache.add('rate', 0)
+        self.cache.incr('rate')
+
+        self.other.close()
+        self.assertEqual(self.other.get('post:1'), 'First')
+        # Overwriting a key the other worker keeps still reaches it
+        self.cache.set('post:1', 'Edited')
+        self.other.close()
+        self.assertEqual(self.other.get('post:1'), 'Edited')
+
+    def test_workers_filling_the_same_key_at_once_both_see_writes(self):
+        self.cache.set('post:1', 'First')
+        add, set_many, interleaved = self.shared.add, self.shared.set_many, []
+
+        def other_fills_first(write):
+            # The other worker fills between our read of the marker and our write of it
+            def wrapper(*args, **kwargs):
+                if not interleaved:
+                    interleaved.append(True)
+                    self.assertEqual(self.other.get('post:1'), 'First')
+                return write(*args, **kwargs)
+            return wrapper
+
+        with mock.patch.object(self.shared, 'add', other_fills_first(add)), \
+                mock.patch.object(self.shared, 'set_many', other_fills_first(set_many)):
+            self.assertEqual(self.cache.get('post:1'), 'First')
+        self.assertTrue(interleaved)
+
+        self.cache.set('post:1', 'Edited')
+        self.other.close()
+        self.assertEqual(self.other.get('post:1'), 'Edited')
+
+    def test_lost_generation_drops_local_entries(self):
+        self.other.set('post:1', 'First')
+        self.assertEqual(self.other.get('post:1'), 'First')
+        self.shared.clear()
+        self.other.close()
+        self.assertIsNone(self.other.get('post:1'))
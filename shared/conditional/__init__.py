@@ -0,0 +1 @@
+from .mixins import ConditionalRequestMixin  # noqa: F401
@@ -0,0 +1,159 @@
+"""
+Conditional requests for DRF generic views and viewsets.
+
+Validators come from the database, never from the rendered body:
+
+* detail: the object's `updated_at` (already loaded by get_object()), plus
+  max(updated_at) and count() of any embedded relations;
+* list: max(updated_at) and count() over the filtered queryset in one
+  aggregate query, hashed together with the query string (page, filters).
+  Index `updated_at` so the max is a single index lookup. Embedded
+  relations are aggregated over the objects of the page only, so views
+  with `conditional_related` paginate before answering 304. Lists get no
+  Last-Modified: deleting a row does not move the max, only the count in
+  the ETag sees it.
+
+GET answers 304 to a matching If-None-Match or If-Modified-Since before
+serializing. PUT/PATCH/DELETE honour If-Match and If-Unmodified-Since, checked
+with the row locked so two clients cannot both update from the same version.
+"""
+import hashlib
+
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+
+class ConditionalRequestMixin:
+    """
+    Add before the DRF base class, e.g.
+    ``class BookViewSet(ConditionalRequestMixin, viewsets.ModelViewSet)``.
+    Only use it on views whose base class implements list/retrieve/update/
+    destroy, as it overrides those.
+
+    `last_modified_field`: the model's auto_now timestamp.
+    `conditional_related`: relations rendered inside each object (e.g.
+    ``['comments']``); their changes must change the validators too.
+    """
+    last_modified_field = 'updated_at'
+    conditional_related = ()
+
+    # Validators
+
+    def related_validators(self, model, using, pks):
+        """max(updated_at) and count() of each embedded relation, over the objects in `pks`."""
+        values = {}
+        for relation in self.conditional_related:
+            remote = model._meta.get_field(relation)
+            rows = remote.related_model._default_manager.db_manager(using).filter(**{f'{remote.field.name}__in': pks})
+            aggregated = rows.order_by().aggregate(modified=Max(self.last_modified_field), count=Count('pk'))
+            values.update({f'{relation}_{key}': value for key, value in aggregated.items()})
+        return values
+
+    def get_list_validators(self, queryset, page=None):
+        """
+        (etag, None) for a list, or (None, None) if it cannot be aggregated.
+        `page`: the objects rendered, if the list is paginated.
+        """
+        if not hasattr(queryset, 'aggregate'):
+            return None, None
+        values = queryset.order_by().aggregate(modified=Max(self.last_modified_field), count=Count('pk'))
+        if self.conditional_related:
+            # Uses the foreign key's index: one range per object shown, not the whole table
+            pks = [obj.pk for obj in page] if page is not None else queryset.order_by().values('pk')
+            values.update(self.related_validators(queryset.model, queryset.db, pks))
+        # No date: If-Modified-Since would answer 304 after a delete
+        return self.make_etag('list', values), None
+
+    def get_object_validators(self, obj):
+        values = {'pk': obj.pk, 'modified': getattr(obj, self.last_modified_field)}
+        values.update(self.related_validators(type(obj), obj._state.db, [obj.pk]))
+        return self.make_etag('object', values), self.latest(values)
+
+    def latest(self, values):
+        return max((value for key, value in values.items() if key.endswith('modified') and value), default=None)
+
+    def make_etag(self, kind, values):
+        # The query string (page, search, ...) and the format select a different body.
+        # Not the view: the detail and the update view of an object must agree.
+        request = self.request
+        raw = '|'.join([
+            self.get_queryset().model._meta.label, kind, request.GET.urlencode(), request.accepted_renderer.format,
+            repr(sorted((key, str(value)) for key, value in values.items())),
+        ])
+        return '"%s"' % hashlib.sha1(raw.encode()).hexdigest()
+
+    # Preconditions
+
+    def not_modified(self, etag, last_modified):
+        """True if the GET can be answered with 304 (RFC 9110 section 13.2.2)."""
+        if_none_match = self.request.headers.get('If-None-Match')
+        if if_none_match is not None:
+            return etag is not None and (
+                if_none_match.strip() == '*' or etag in [tag.strip() for tag in if_none_match.split(',')]
+            )
+        since = parse_http_date_safe(self.request.headers.get('If-Modified-Since', ''))
+        return since is not None and last_modified is not None and int(last_modified.timestamp()) <= since
+
+    def precondition_failed(self, etag, last_modified):
+        """True if If-Match / If-Unmodified-Since rule out the write."""
+        if_match = self.request.headers.get('If-Match')
+        if if_match is not None:
+            return if_match.strip() != '*' and etag not in [tag.strip() for tag in if_match.split(',')]
+        since = parse_http_date_safe(self.request.headers.get('If-Unmodified-Since', ''))
+        return since is not None and last_modified is not None and int(last_modified.timestamp()) > since
+
+    def with_validators(self, response, etag, last_modified):
+        if etag is not None:
+            response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        return response
+
+    # Actions
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        # The embedded relations' validators need the page's objects
+        page = self.paginate_queryset(queryset) if self.conditional_related else None
+        etag, last_modified = self.get_list_validators(queryset, page)
+        if self.not_modified(etag, last_modified):
+            return self.with_validators(Response(status=status.HTTP_304_NOT_MODIFIED), etag, last_modified)
+        if page is not None:
+            response = self.get_paginated_response(self.get_serializer(page, many=True).data)
+        else:
+            response = super().list(request, *args, **kwargs)
+        return self.with_validators(response, etag, last_modified)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag, last_modified = self.get_object_validators(instance)
+        if self.not_modified(etag, last_modified):
+            return self.with_validators(Response(status=status.HTTP_304_NOT_MODIFIED), etag, last_modified)
+        return self.with_validators(Response(self.get_serializer(instance).data), etag, last_modified)
+
+    def conditional_write(self, write, request, *args, **kwargs):
+        if not {'If-Match', 'If-Unmodified-Since'} & set(request.headers):
+            return write(request, *args, **kwargs)
+        instance = self.get_object()
+        with transaction.atomic(using=instance._state.db):
+            # Lock the row, then compare against its current version
+            locked = type(instance)._default_manager.db_manager(instance._state.db).select_for_update().get(pk=instance.pk)
+            if self.precondition_failed(*self.get_object_validators(locked)):
+                return Response(
+                    {'detail': 'The resource was modified since you fetched it.'},
+                    status=status.HTTP_412_PRECONDITION_FAILED,
+                )
+            return write(request, *args, **kwargs)
+
+    def update(self, request, *args, **kwargs):
+        response = self.conditional_write(super().update, request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            # Hand out the new validators so the client can chain If-Match
+            response = self.with_validators(response, *self.get_object_validators(self.get_object()))
+        return response
+
+    def destroy(self, request, *args, **kwargs):
+        return self.conditional_write(super().destroy, request, *args, **kwargs)
@@ -0,0 +1,3 @@
+from .images import render_variants, source_digest, store_variants, stored_variants  # noqa: F401
+from .uploads import ImageUploadHandler, UploadRejected  # noqa: F401
+from .serving import serve_media  # noqa: F401
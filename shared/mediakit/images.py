@@ -0,0 +1,80 @@
+"""
+Resized, recompressed variants of uploaded images, stored content-addressed.
+
+render_variants() only turns bytes into bytes and is CPU-bound: run it in a
+process pool (e.g. a jobs task with pool='process'), not in a request.
+Variant names are derived from the SHA-256 of the source image and the
+rendering parameters. The same picture uploaded by several users is
+rendered and stored once, and new parameters never overwrite old files.
+"""
+import hashlib
+import io
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+# Variant format -> (Pillow format, file extension)
+FORMATS = {
+    'webp': ('WEBP', 'webp'),
+    'jpeg': ('JPEG', 'jpg'),
+}
+
+
+def source_digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def variant_name(prefix, digest, size, fmt, quality):
+    return f'{prefix}/{digest[:2]}/{digest}/{size}q{quality}.{FORMATS[fmt][1]}'
+
+
+def flatten(image):
+    """The image without alpha (JPEG has none), on a white background."""
+    if image.mode != 'RGBA':
+        return image
+    background = Image.new('RGB', image.size, 'white')
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
+def render_variants(data, sizes, formats=('webp', 'jpeg'), quality=80):
+    """{(size, format): bytes}: square crops of the image in `data`, `size` pixels wide."""
+    with Image.open(io.BytesIO(data)) as image:
+        # JPEGs can be decoded at 1/2, 1/4 or 1/8 scale: much less work for
+        # large photos, and still at least as large as the biggest variant
+        image.draft('RGB', (max(sizes), max(sizes)))
+        image = ImageOps.exif_transpose(image)
+        alpha = image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+        image = image.convert('RGBA' if alpha else 'RGB')
+
+        variants = {}
+        for size in sizes:
+            thumbnail = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+            for fmt in formats:
+                output = io.BytesIO()
+                if fmt == 'jpeg':
+                    flatten(thumbnail).save(output, 'JPEG', quality=quality, optimize=True, progressive=True)
+                else:
+                    thumbnail.save(output, FORMATS[fmt][0], quality=quality)
+                variants[size, fmt] = output.getvalue()
+        return variants
+
+
+def stored_variants(storage, prefix, digest, sizes, formats, quality):
+    """{size: {format: name}} if every variant of this source is stored already, else None."""
+    names = {size: {fmt: variant_name(prefix, digest, size, fmt, quality) for fmt in formats} for size in sizes}
+    if all(storage.exists(name) for by_format in names.values() for name in by_format.values()):
+        return names
+    return None
+
+
+def store_variants(storage, prefix, digest, variants, quality):
+    """Save rendered variants under their content-addressed names. Returns {size: {format: name}}."""
+    names = {}
+    for (size, fmt), data in variants.items():
+        name = variant_name(prefix, digest, size, fmt, quality)
+        # A file with this name holds these very bytes: keep it
+        if not storage.exists(name):
+            name = storage.save(name, ContentFile(data))
+        names.setdefault(size, {})[fmt] = name
+    return names
@@ -0,0 +1,175 @@
+"""
+A view serving user uploads from MEDIA_ROOT without copying them through Python.
+
+Django hands the open file to the WSGI server (FileResponse and
+wsgi.file_wrapper), so servers with sendfile support (gunicorn) copy it
+from the page cache to the socket with os.sendfile(). Or, with SENDFILE
+set, the view only checks the path and answers with an X-Accel-Redirect
+(nginx) or X-Sendfile (Apache, lighttpd) header, and the proxy sends the
+bytes.
+
+Responses carry a strong ETag (size and mtime in nanoseconds: storages
+never rewrite a file in place, so new content means a new mtime), a
+Last-Modified date and a long Cache-Control max-age, `immutable` under
+content-addressed prefixes. A matching If-None-Match/If-Modified-Since
+gets a 304. A single byte range gets a 206 with only that range sent,
+also by sendfile. Several ranges get the whole file, which RFC 9110
+allows.
+
+Only the directories listed in PREFIXES are served:
+
+    path('media/<path:path>', serve_media, name='media')
+"""
+import mimetypes
+import os
+import posixpath
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotAllowed
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+# Defaults, override any of them with MEDIA_SERVING in settings.py
+DEFAULTS = {
+    'PREFIXES': [],               # directories of MEDIA_ROOT served, e.g. ['profile_pics/']
+    'IMMUTABLE_PREFIXES': [],     # content-addressed ones: a name never gets other content
+    'MAX_AGE': 7 * 24 * 3600,
+    'IMMUTABLE_MAX_AGE': 365 * 24 * 3600,
+    'SENDFILE': None,             # None, 'x-accel-redirect' or 'x-sendfile'
+    'ACCEL_PREFIX': '/protected-media/',  # the nginx `internal` location aliased to MEDIA_ROOT
+}
+
+
+# One range: 'bytes=0-99', 'bytes=100-' or 'bytes=-100' (the last 100)
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'MEDIA_SERVING', {})}
+
+
+class FileRange:
+    """
+    `length` bytes of an open file from `start`. Keeps fileno(): WSGI
+    servers sendfile() from the file's position, for Content-Length bytes.
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    (start, end), inclusive, of the single byte range in a Range header.
+    None if the whole file should be sent instead, ValueError if the range
+    is unsatisfiable.
+    """
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if match is None or match.groups() == ('', ''):
+        return None  # no range, several ranges or a malformed one
+    first, last = match.groups()
+    if not first:
+        # The last `last` bytes
+        if int(last) == 0 or size == 0:
+            raise ValueError
+        return max(0, size - int(last)), size - 1
+    start, end = int(first), int(last) if last else size - 1
+    if start >= size:
+        raise ValueError
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def range_applies(request, etag, mtime):
+    """False if an If-Range validator no longer matches: the client's copy is outdated."""
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == int(mtime)
+
+
+def serve_media(request, path):
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    config = get_config()
+    path = posixpath.normpath(path).lstrip('/')
+    if not any(path.startswith(prefix) for prefix in config['PREFIXES']):
+        raise Http404
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+        st = os.stat(fullpath)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404
+    if not stat.S_ISREG(st.st_mode):
+        raise Http404
+
+    etag = f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+    headers = {'ETag': etag, 'Last-Modified': http_date(st.st_mtime), 'Accept-Ranges': 'bytes'}
+    if any(path.startswith(prefix) for prefix in config['IMMUTABLE_PREFIXES']):
+        headers['Cache-Control'] = f'public, max-age={config["IMMUTABLE_MAX_AGE"]}, immutable'
+    else:
+        headers['Cache-Control'] = f'public, max-age={config["MAX_AGE"]}'
+
+    response = get_conditional_response(request, etag=etag, last_modified=int(st.st_mtime))
+    if response is None:
+        response = file_response(request, config, path, fullpath, st, etag)
+    for name, value in headers.items():
+        response.headers.setdefault(name, value)
+    return response
+
+
+def file_response(request, config, path, fullpath, st, etag):
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    if config['SENDFILE'] == 'x-accel-redirect':
+        # nginx answers Range requests itself
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = config['ACCEL_PREFIX'].rstrip('/') + '/' + quote(path)
+        return response
+    if config['SENDFILE'] == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = fullpath
+        return response
+
+    try:
+        byte_range = parse_range(request.headers.get('Range', ''), st.st_size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{st.st_size}'
+        return response
+    if byte_range is not None and not range_applies(request, etag, st.st_mtime):
+        byte_range = None
+    start, end = byte_range or (0, st.st_size - 1)
+    length = end - start + 1
+
+    if request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type)
+    else:
+        response = FileResponse(FileRange(open(fullpath, 'rb'), start, length), content_type=content_type)
+    if byte_range is not None:
+        response.status_code = 206
+        response['Content-Range'] = f'bytes {start}-{end}/{st.st_size}'
+    response['Content-Length'] = length
+    return response
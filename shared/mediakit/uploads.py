@@ -0,0 +1,115 @@
+"""
+An upload handler for image fields that never holds an upload in memory.
+
+Django keeps uploads under FILE_UPLOAD_MAX_MEMORY_SIZE in memory and
+only validates a file once the whole request body is read. ImageUploadHandler
+writes every chunk straight to a temporary file. It also checks each image
+as it arrives:
+
+* the magic bytes of the first chunk must be those of an allowed format,
+* the dimensions, parsed from the image header, must stay under MAX_PIXELS,
+* the size must stay under MAX_BYTES, checked against the part's
+  Content-Length if the client sent one, then against every chunk.
+
+A failed check raises UploadRejected, a MultiPartParserError. The parser
+stops there, without reading the rest of the body, and Django (or DRF)
+answers 400. Memory use per upload is one chunk plus the image header,
+however large the file or the number of concurrent uploads.
+
+    FILE_UPLOAD_HANDLERS = ['mediakit.uploads.ImageUploadHandler']
+"""
+import io
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.http.multipartparser import MultiPartParserError
+from PIL import Image
+
+# Defaults, override any of them with UPLOADS in settings.py
+DEFAULTS = {
+    'MAX_BYTES': 5 * 1024 * 1024,
+    'MAX_PIXELS': 4096 * 4096,
+    'FORMATS': ['JPEG', 'PNG', 'GIF', 'WEBP'],
+    'HEADER_BYTES': 256 * 1024,   # give up on finding the dimensions after this much
+    'FIELDS': None,               # names of the image fields, None: every file field
+}
+
+# Pillow format -> leading bytes of its files (WebP: RIFF....WEBP)
+MAGIC = {
+    'JPEG': [b'\xff\xd8\xff'],
+    'PNG': [b'\x89PNG\r\n\x1a\n'],
+    'GIF': [b'GIF87a', b'GIF89a'],
+    'WEBP': [b'RIFF'],
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'UPLOADS', {})}
+
+
+class UploadRejected(MultiPartParserError):
+    pass
+
+
+def sniff(header, formats):
+    """The format of a file starting with `header`, among `formats`, or None."""
+    for fmt in formats:
+        for magic in MAGIC.get(fmt, ()):
+            if header.startswith(magic) and (fmt != 'WEBP' or header[8:12] == b'WEBP'):
+                return fmt
+    return None
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.config = get_config()
+
+    def new_file(self, field_name, file_name, content_type, content_length, *args, **kwargs):
+        if content_length is not None and content_length > self.config['MAX_BYTES']:
+            raise UploadRejected(f'{file_name} is larger than {self.config["MAX_BYTES"]} bytes.')
+        fields = self.config['FIELDS']
+        self.checked = fields is None or field_name in fields
+        self.header = b''
+        super().new_file(field_name, file_name, content_type, content_length, *args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > self.config['MAX_BYTES']:
+            self.reject(f'{self.file_name} is larger than {self.config["MAX_BYTES"]} bytes.')
+        if self.checked and self.header is not None:
+            self.check_header(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        if self.checked and self.header is not None:
+            self.reject(f'{self.file_name} is not a valid image.')
+        return super().file_complete(file_size)
+
+    def check_header(self, raw_data):
+        """Reject the upload as soon as its first bytes show it is not an acceptable image."""
+        self.header += raw_data
+        if len(self.header) < 12:
+            return  # a tiny first chunk: wait for more
+        fmt = sniff(self.header, self.config['FORMATS'])
+        if fmt is None:
+            self.reject(f'{self.file_name} is not a {", ".join(self.config["FORMATS"])} image.')
+        try:
+            # Only reads the header; ImageFile.Parser would allocate the pixels too
+            with Image.open(io.BytesIO(self.header), formats=[fmt]) as image:
+                width, height = image.size
+        except Image.DecompressionBombError:
+            self.reject(f'{self.file_name} has more than {self.config["MAX_PIXELS"]} pixels.')
+        except Exception:
+            # Most likely a header split across chunks
+            if len(self.header) > self.config['HEADER_BYTES']:
+                self.reject(f'{self.file_name} is not a valid image.')
+            return
+        if width * height > self.config['MAX_PIXELS']:
+            self.reject(f'{self.file_name} is {width}x{height}, more than {self.config["MAX_PIXELS"]} pixels.')
+        self.header = None  # checked: stream the rest to disk
+
+    def reject(self, message):
+        # The parser does not close the files of a failed upload
+        self.file.close()
+        raise UploadRejected(message)
@@ -0,0 +1,13 @@
+from django.apps import AppConfig
+
+
+class QuerylogConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'querylog'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from .recorder import install
+
+        # Every new DB connection (any alias, any thread) gets the recorder
+        connection_created.connect(install, dispatch_uid='querylog.install')
@@ -0,0 +1,148 @@
+# querylog/recorder.py
+import os
+import random
+import re
+import sys
+import sysconfig
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.views import View
+
+DEFAULTS = {
+    'THRESHOLD_MS': 100,
+    'SAMPLE_RATE': 1.0,
+    'BUFFER_SIZE': 500,
+    'MAX_FINGERPRINTS': 1000,
+}
+
+# Frames from the standard library, installed packages and this module are
+# skipped when looking for the line of project code that issued a query
+LIBRARY_PATHS = tuple({
+    sysconfig.get_paths()[name] for name in ('stdlib', 'platstdlib', 'purelib', 'platlib')
+}) + (os.path.abspath(__file__),)
+SERIALIZERS_FILE = os.path.join('rest_framework', 'serializers.py')
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+IN_LIST_RE = re.compile(r'\bIN\s*\((?:\s*(?:\?|%s)\s*,?)+\)', re.IGNORECASE)
+VALUES_RE = re.compile(r'\bVALUES\s*(\((?:[^()]|\([^()]*\))*\)\s*,?\s*)+', re.IGNORECASE)
+SPACE_RE = re.compile(r'\s+')
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'QUERYLOG', {})}
+
+
+def fingerprint(sql):
+    """
+    Normalize SQL so that queries differing only in literal values group together.
+    """
+    sql = STRING_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = IN_LIST_RE.sub('IN (...)', sql)
+    sql = VALUES_RE.sub('VALUES (...)', sql)
+    return SPACE_RE.sub(' ', sql).strip()
+
+
+def find_origin():
+    """
+    Walk the current stack and describe who issued the query: the view class,
+    the serializer field being rendered (if any) and the innermost line of
+    project code.
+    """
+    view = field = code = None
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        owner = frame.f_locals.get('self')
+        # Only use type() on the objects found here: request.user and friends
+        # are lazy objects that would run queries (and recurse) if touched
+        if field is None and frame.f_code.co_name == 'to_representation' and filename.endswith(SERIALIZERS_FILE):
+            serializer_field = frame.f_locals.get('field')
+            if serializer_field is not None:
+                field = f'{type(owner).__name__}.{serializer_field.field_name}'
+        if view is None and issubclass(type(owner), View):
+            view = type(owner).__name__
+        if code is None and not filename.startswith(LIBRARY_PATHS):
+            code = f'{filename}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return {'view': view, 'field': field, 'code': code}
+
+
+class SlowQueryRecorder:
+    """
+    Keeps the most recent slow queries in a ring buffer and aggregates count
+    and total time per SQL fingerprint. One instance per process.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        config = get_config()
+        with self.lock:
+            self.recent = deque(maxlen=config['BUFFER_SIZE'])
+            self.stats = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrappers hook
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = (time.perf_counter() - start) * 1000
+            config = get_config()
+            if duration >= config['THRESHOLD_MS'] and random.random() < config['SAMPLE_RATE']:
+                self.record(sql, duration, context['connection'].alias, config)
+
+    def record(self, sql, duration, alias, config):
+        key = fingerprint(sql)
+        origin = find_origin()
+        entry = {
+            'fingerprint': key,
+            'sql': sql,
+            'duration_ms': round(duration, 2),
+            'alias': alias,
+            'at': time.time(),
+            **origin,
+        }
+        with self.lock:
+            self.recent.append(entry)
+            stat = self.stats.get(key)
+            if stat is None:
+                if len(self.stats) >= config['MAX_FINGERPRINTS']:
+                    # Make room by forgetting the cheapest fingerprint
+                    cheapest = min(self.stats, key=lambda k: self.stats[k]['total_ms'])
+                    del self.stats[cheapest]
+                stat = self.stats[key] = {
+                    'fingerprint': key, 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'origins': {},
+                }
+            stat['count'] += 1
+            stat['total_ms'] += duration
+            stat['max_ms'] = max(stat['max_ms'], duration)
+            where = ' / '.join(filter(None, [origin['view'], origin['field'], origin['code']])) or 'unknown'
+            stat['origins'][where] = stat['origins'].get(where, 0) + 1
+
+    def top(self, limit=50, order_by='total_ms'):
+        with self.lock:
+            stats = [dict(stat, origins=dict(stat['origins'])) for stat in self.stats.values()]
+            recent = list(self.recent)
+        for stat in stats:
+            stat['avg_ms'] = stat['total_ms'] / stat['count']
+        stats.sort(key=lambda stat: stat[order_by], reverse=True)
+        return stats[:limit], recent
+
+
+recorder = SlowQueryRecorder()
+
+
+def install(sender, connection, **kwargs):
+    """connection_created receiver: add the recorder to the connection once."""
+    if recorder not in connection.execute_wrappers:
+        # Insert at the front: execute_wrapper() context managers pop from the end
+        connection.execute_wrappers.insert(0, recorder)
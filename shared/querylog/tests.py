@@ -0,0 +1,51 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .recorder import fingerprint, install, recorder
+
+
+class FingerprintTests(TestCase):
+
+    def test_literals_and_placeholders_are_normalized(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t1 WHERE id = 42 AND name = 'bob'"),
+            "SELECT * FROM t1 WHERE id = ? AND name = ?",
+        )
+
+    def test_in_lists_of_any_length_group_together(self):
+        self.assertEqual(
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s, %s)'),
+            fingerprint('SELECT * FROM t WHERE id IN (%s)'),
+        )
+
+
+@override_settings(QUERYLOG={'THRESHOLD_MS': 0, 'SAMPLE_RATE': 1.0}, SECURE_SSL_REDIRECT=False)
+class RecorderTests(TestCase):
+
+    def setUp(self):
+        install(sender=None, connection=connection)
+        recorder.reset()
+
+    def test_slow_queries_are_aggregated_by_fingerprint(self):
+        User = get_user_model()
+        User.objects.filter(pk=1).exists()
+        User.objects.filter(pk=2).exists()
+
+        stats, recent = recorder.top()
+        exists = [stat for stat in stats if stat['fingerprint'].startswith('SELECT ? AS "a" FROM')]
+        self.assertEqual(len(exists), 1)
+        self.assertEqual(exists[0]['count'], 2)
+        self.assertIn('querylog/tests.py', recent[-1]['code'].replace('\\', '/'))
+
+    def test_page_is_staff_only(self):
+        User = get_user_model()
+        url = reverse('querylog_slow_queries')
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        User.objects.create_user(username='staff', email='staff@example.com', password='password', is_staff=True)
+        self.client.login(username='staff', password='password')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Top offenders')
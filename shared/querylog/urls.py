@@ -0,0 +1,6 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('', views.slow_queries, name='querylog_slow_queries'),
+]
@@ -0,0 +1,25 @@
+# querylog/views.py
+from django.contrib.admin.views.decorators import staff_member_required
+from django.shortcuts import render
+
+from .recorder import get_config, recorder
+
+ORDERINGS = {'total_ms', 'count', 'avg_ms', 'max_ms'}
+
+
+@staff_member_required
+def slow_queries(request):
+    """Top slow-query fingerprints recorded by this worker process."""
+    if request.method == 'POST' and request.POST.get('action') == 'reset':
+        recorder.reset()
+
+    order_by = request.GET.get('o', 'total_ms')
+    if order_by not in ORDERINGS:
+        order_by = 'total_ms'
+    stats, recent = recorder.top(order_by=order_by)
+    return render(request, 'querylog/slow_queries.html', {
+        'stats': stats,
+        'recent': list(reversed(recent))[:50],
+        'config': get_config(),
+        'order_by': order_by,
+    })
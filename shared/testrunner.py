@@ -0,0 +1,31 @@
+"""
+Test runner for the projects of this repository.
+
+`manage.py test` without labels only discovers tests under the project's
+own directory. This runner adds the shared apps (this directory) the
+project installs, so their tests run against each project's settings:
+
+    TEST_RUNNER = 'testrunner.ProjectTestRunner'
+"""
+import os
+
+from django.apps import apps
+from django.test.runner import DiscoverRunner
+
+SHARED_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def shared_apps():
+    """Module names of the installed apps that live in the shared directory."""
+    return [
+        config.name for config in apps.get_app_configs()
+        if os.path.dirname(os.path.abspath(config.path)) == SHARED_DIR
+    ]
+
+
+class ProjectTestRunner(DiscoverRunner):
+
+    def build_suite(self, test_labels=None, **kwargs):
+        if not test_labels:
+            test_labels = ['.', *shared_apps()]
+        return super().build_suite(test_labels, **kwargs)
@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class TokenauthConfig(AppConfig):
+    name = 'tokenauth'
+
+    def ready(self):
+        from . import signals  # noqa: F401
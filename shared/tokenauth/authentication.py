@@ -0,0 +1,165 @@
+# tokenauth/authentication.py
+"""
+Token authentication without a database query per request.
+
+CachedTokenAuthentication keeps what a token resolves to in the cache for
+TIMEOUT seconds, with an optional per-process LRU in front of it. The entry
+holds the user's fields except EXCLUDE_FIELDS (the password hash by
+default), not the user object. Each request gets a fresh user instance
+built from them, with the excluded fields deferred: they load on access,
+and save() leaves them alone.
+
+Entries are evicted by the signal handlers in tokenauth/signals.py when a
+token is deleted or rotated, and when its user is saved or deleted. Writes
+that bypass signals, e.g. QuerySet.update(is_active=False), are only seen
+once the entry expires: call invalidate_user() after them.
+"""
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db.models.fields.files import FieldFile
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+# Defaults, override any of them with TOKEN_AUTH_CACHE in settings.py
+DEFAULTS = {
+    'ALIAS': 'default',     # which entry of CACHES to use
+    'TIMEOUT': 60,          # seconds a token -> user lookup stays in the shared cache
+    'LOCAL_MAXSIZE': 0,     # size of the per-process LRU in front of the cache (0 = off)
+    'LOCAL_TIMEOUT': 5,     # seconds an entry may live in the per-process LRU
+    'EXCLUDE_FIELDS': ['password'],  # user fields never cached
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'TOKEN_AUTH_CACHE', {})}
+
+
+def cache_key(key):
+    # Never put the raw token in the cache key, cache keys are easy to list
+    return 'authtoken:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+def user_cache_key(user_id):
+    # Which token entry belongs to a user, so saving a user needs no Token query
+    return f'authtoken-user:{user_id}'
+
+
+class LocalLRU:
+    """
+    Tiny thread-safe LRU with per-entry expiry, kept in process memory.
+    """
+    def __init__(self):
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout, maxsize):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + timeout)
+            self._data.move_to_end(key)
+            while len(self._data) > maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+local_cache = LocalLRU()
+
+
+def invalidate_token(key):
+    """
+    Drop a token from both cache tiers. Other processes' local LRUs expire
+    on their own within LOCAL_TIMEOUT, so keep that value short.
+    """
+    name = cache_key(key)
+    local_cache.delete(name)
+    caches[get_config()['ALIAS']].delete(name)
+
+
+def invalidate_user(user_id):
+    """Drop the cached token of a user, e.g. after updating users in bulk."""
+    cache = caches[get_config()['ALIAS']]
+    name = cache.get(user_cache_key(user_id))
+    if name is not None:
+        local_cache.delete(name)
+        cache.delete_many([name, user_cache_key(user_id)])
+
+
+def make_entry(token, exclude):
+    """What is cached for a token: its creation time and its user's fields."""
+    user = token.user
+    fields = {}
+    for field in user._meta.concrete_fields:
+        if field.attname not in exclude:
+            value = getattr(user, field.attname)
+            fields[field.attname] = value.name if isinstance(value, FieldFile) else value
+    return {'db': user._state.db, 'user': fields, 'created': token.created}
+
+
+def from_entry(key, entry):
+    """A (user, token) pair built from a cached entry, sharing nothing with it."""
+    fields = copy.deepcopy(entry['user'])
+    # from_db() defers the fields that are not given
+    user = get_user_model().from_db(entry['db'], list(fields), list(fields.values()))
+    token = Token(key=key, user=user, created=entry['created'])
+    token._state.adding, token._state.db = False, entry['db']
+    return user, token
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Drop-in replacement for DRF's TokenAuthentication.
+
+    The token -> user join is cached for a short TTL so that most requests
+    authenticate without touching the database.
+    """
+
+    def authenticate_credentials(self, key):
+        config = get_config()
+        cache = caches[config['ALIAS']]
+        name = cache_key(key)
+
+        entry = None
+        if config['LOCAL_MAXSIZE']:
+            entry = local_cache.get(name)
+        if entry is None:
+            entry = cache.get(name)
+            if entry is None:
+                # Cache miss: the normal lookup (select_related user), raises on bad tokens
+                user, token = super().authenticate_credentials(key)
+                entry = make_entry(token, config['EXCLUDE_FIELDS'])
+                cache.set_many({name: entry, user_cache_key(user.pk): name}, config['TIMEOUT'])
+            if config['LOCAL_MAXSIZE']:
+                local_cache.set(name, entry, min(config['LOCAL_TIMEOUT'], config['TIMEOUT']), config['LOCAL_MAXSIZE'])
+
+        user, token = from_entry(key, entry)
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        return (user, token)
@@ -0,0 +1,80 @@
+# tokenauth/management/commands/benchmark_auth.py
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+from rest_framework.views import APIView
+
+from tokenauth.authentication import CachedTokenAuthentication, get_config, invalidate_token, user_cache_key
+
+
+def make_view(authentication_class):
+    """A trivial authenticated endpoint, so the numbers measure authentication only."""
+    class BenchmarkView(APIView):
+        authentication_classes = [authentication_class]
+        permission_classes = [IsAuthenticated]
+
+        def get(self, request):
+            return Response({'user': request.user.pk})
+
+    return BenchmarkView.as_view()
+
+
+class Command(BaseCommand):
+    help = 'Compare authenticated requests per second for TokenAuthentication vs CachedTokenAuthentication'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000)
+        parser.add_argument('--users', type=int, default=50, help='Distinct tokens to rotate through')
+
+    def handle(self, *args, **options):
+        # The benchmark users and tokens are rolled back afterwards
+        with transaction.atomic():
+            self.run(options)
+            transaction.set_rollback(True)
+
+    def run(self, options):
+        User = get_user_model()
+        keys, user_ids = [], []
+        for i in range(options['users']):
+            user, _ = User.objects.get_or_create(username=f'bench_auth_{i}')
+            token, _ = Token.objects.get_or_create(user=user)
+            keys.append(token.key)
+            user_ids.append(user.pk)
+
+        factory = APIRequestFactory()
+        requests = [
+            factory.get('/bench/', HTTP_AUTHORIZATION=f'Token {keys[i % len(keys)]}')
+            for i in range(options['requests'])
+        ]
+
+        # Start cold, but only for our tokens: the cache is shared with sessions and the rest
+        self.forget(keys, user_ids)
+        for name, cls in [('TokenAuthentication', TokenAuthentication),
+                          ('CachedTokenAuthentication', CachedTokenAuthentication)]:
+            view = make_view(cls)
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                for request in requests:
+                    response = view(request)
+                    assert response.status_code == 200, response.status_code
+                elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f'{name:28} {len(requests) / elapsed:10.0f} req/s   '
+                f'{len(queries) / len(requests):.3f} queries/request'
+            )
+        # Their cache entries would outlive the rollback
+        self.forget(keys, user_ids)
+
+    def forget(self, keys, user_ids):
+        for key in keys:
+            invalidate_token(key)
+        caches[get_config()['ALIAS']].delete_many([user_cache_key(user_id) for user_id in user_ids])
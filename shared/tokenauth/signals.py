@@ -0,0 +1,22 @@
+# tokenauth/signals.py
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_token, invalidate_user
+
+
+@receiver([post_save, post_delete], sender=Token)
+def invalidate_cached_token(sender, instance, **kwargs):
+    # Covers deleting a token and rotating it (delete + create a new key)
+    invalidate_token(instance.key)
+
+
+@receiver([post_save, post_delete], sender=get_user_model())
+def invalidate_user_tokens(sender, instance, created=False, **kwargs):
+    # The cached entry holds a copy of the user's fields, so any change to the
+    # user (deactivation in particular) must evict it. No query: the cache
+    # knows which entry belongs to the user.
+    if not created:
+        invalidate_user(instance.pk)
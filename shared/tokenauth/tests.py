@@ -0,0 +1,63 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIRequestFactory
+
+from .authentication import CachedTokenAuthentication, invalidate_user, local_cache
+from .management.commands.benchmark_auth import make_view
+
+view = make_view(CachedTokenAuthentication)
+
+
+@override_settings(TOKEN_AUTH_CACHE={'LOCAL_MAXSIZE': 100})
+class CachedTokenAuthenticationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.user = get_user_model().objects.create_user(username='me', email='me@example.com', password='password')
+        self.token = Token.objects.create(user=self.user)
+
+    def get(self, key=None):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Token {key or self.token.key}')
+        return view(request)
+
+    def test_cached_lookups_skip_the_database(self):
+        self.assertEqual(self.get().status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.get()
+        self.assertEqual(response.data, {'user': self.user.pk})
+
+    def test_the_password_hash_is_not_cached(self):
+        self.get()
+        entry = local_cache.get(next(iter(local_cache._data)))
+        self.assertNotIn('password', entry['user'])
+        self.assertNotIn(self.user.password, repr(cache.get(next(iter(local_cache._data)))))
+
+    def test_saving_a_cached_user_keeps_the_password(self):
+        self.get()
+        user, _ = CachedTokenAuthentication().authenticate_credentials(self.token.key)
+        user.first_name = 'Me'
+        user.save()
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('password'))
+
+    def test_saving_a_user_evicts_its_token_without_a_token_query(self):
+        self.get()
+        self.user.is_active = False
+        with self.assertNumQueries(1):  # the UPDATE
+            self.user.save()
+        self.assertEqual(self.get().status_code, 401)
+
+    def test_bulk_updates_need_an_explicit_eviction(self):
+        self.get()
+        get_user_model().objects.filter(pk=self.user.pk).update(is_active=False)
+        invalidate_user(self.user.pk)
+        self.assertEqual(self.get().status_code, 401)
+
+    def test_deleted_token_is_rejected(self):
+        self.get()
+        key = self.token.key
+        self.token.delete()
+        self.assertEqual(self.get(key).status_code, 401)
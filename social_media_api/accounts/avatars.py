@@ -0,0 +1,92 @@
+# accounts/avatars.py
+"""
+Avatar variants of CustomUser.profile_picture: small square WebP and JPEG
+crops (shared/mediakit), so lists of users do not download the original.
+
+Saving a user with a new picture marks its variants pending and queues
+accounts.render_avatar, which renders them in the jobs process pool. The
+names of the stored files are recorded in CustomUser.avatar_variants:
+
+    {'source': <picture name>, 'version': <parameters>, 'sizes': {'small': {'webp': name, ...}, ...}}
+
+'sizes' is missing while the variants are pending.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from mediakit import render_variants, source_digest, store_variants, stored_variants
+
+# Defaults, override any of them with AVATARS in settings.py
+DEFAULTS = {
+    'SIZES': {'small': 48, 'medium': 96, 'large': 256},   # name -> width/height in pixels
+    'FORMATS': ['webp', 'jpeg'],
+    'QUALITY': 80,
+    'PREFIX': 'avatars',     # directory of the variants in the media storage
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'AVATARS', {})}
+
+
+def version(config=None):
+    """Changes with the rendering parameters, so backfill_avatars knows what to redo."""
+    config = config or get_config()
+    raw = repr((sorted(config['SIZES'].items()), list(config['FORMATS']), config['QUALITY']))
+    return hashlib.sha1(raw.encode()).hexdigest()[:8]
+
+
+def is_current(user):
+    variants = user.avatar_variants
+    return variants.get('source', '') == (user.profile_picture.name or '') and (
+        not user.profile_picture or ('sizes' in variants and variants.get('version') == version())
+    )
+
+
+def schedule(user):
+    """Mark the user's variants pending and queue their rendering. Part of the current transaction."""
+    from .tasks import render_avatar
+
+    source = user.profile_picture.name or ''
+    user.avatar_variants = {'source': source} if source else {}
+    type(user).objects.filter(pk=user.pk).update(avatar_variants=user.avatar_variants)
+    if source:
+        render_avatar.enqueue(user_id=user.pk, source=source)
+
+
+def build(user_id, source):
+    """Render (or find) the variants of picture `source` and record them on the user."""
+    User = get_user_model()
+    user = User.objects.filter(pk=user_id).first()
+    if user is None or user.profile_picture.name != source:
+        return  # deleted or given another picture meanwhile, which has its own job
+    config = get_config()
+    with user.profile_picture.open('rb') as picture:
+        data = picture.read()
+    digest = source_digest(data)
+    pixels = sorted(set(config['SIZES'].values()))
+    names = stored_variants(default_storage, config['PREFIX'], digest, pixels, config['FORMATS'], config['QUALITY'])
+    if names is None:
+        variants = render_variants(data, pixels, config['FORMATS'], config['QUALITY'])
+        names = store_variants(default_storage, config['PREFIX'], digest, variants, config['QUALITY'])
+    User.objects.filter(pk=user_id, profile_picture=source).update(avatar_variants={
+        'source': source,
+        'version': version(config),
+        'sizes': {name: names[size] for name, size in config['SIZES'].items()},
+    })
+
+
+def avatar_urls(user, request=None):
+    """{size: {format: url}}, or None without a picture or while the variants are pending."""
+    sizes = user.avatar_variants.get('sizes')
+    if not user.profile_picture or sizes is None:
+        return None
+    urls = {}
+    for size, by_format in sizes.items():
+        urls[size] = {}
+        for fmt, name in by_format.items():
+            url = default_storage.url(name)
+            urls[size][fmt] = request.build_absolute_uri(url) if request is not None else url
+    return urls
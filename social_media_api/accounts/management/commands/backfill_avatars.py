@@ -0,0 +1,36 @@
+# accounts/management/commands/backfill_avatars.py
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts.avatars import is_current
+from accounts.tasks import render_avatar
+
+
+class Command(BaseCommand):
+    help = (
+        'Queue accounts.render_avatar for users whose profile picture has no variants, or '
+        'variants made with other AVATARS settings. `run_jobs` renders them.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--force', action='store_true', help='Queue every user with a picture')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        users = User.objects.exclude(profile_picture='').exclude(profile_picture=None).order_by('pk')
+        last_pk, queued, seen = 0, 0, 0
+        while True:
+            # Keyset pagination: each batch is an index range scan
+            batch = list(users.filter(pk__gt=last_pk).only('pk', 'profile_picture', 'avatar_variants')[:options['batch_size']])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            seen += len(batch)
+            with transaction.atomic():
+                for user in batch:
+                    if options['force'] or not is_current(user):
+                        render_avatar.enqueue(user_id=user.pk, source=user.profile_picture.name)
+                        queued += 1
+        self.stdout.write(self.style.SUCCESS(f'Queued {queued} of {seen} users with a profile picture'))
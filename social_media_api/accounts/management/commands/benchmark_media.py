@@ -0,0 +1,195 @@
+# accounts/management/commands/benchmark_media.py
+import json
+import os
+import shutil
+import socket
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from django.urls import path
+from django.views.static import serve
+
+from mediakit import serve_media
+from posts.management.commands.benchmark_api import percentile
+
+
+def naive(request, path):
+    # Django's own view: FileResponse, read and written by Python block by block
+    return serve(request, path, document_root=settings.MEDIA_ROOT)
+
+
+# This module is also the URLconf of the benchmark
+urlpatterns = [
+    path('naive/<path:path>', naive),
+    path('media/<path:path>', serve_media),
+]
+
+
+class SendfileWrapper:
+    """wsgi.file_wrapper of a server with sendfile support, like gunicorn's."""
+
+    def __init__(self, filelike, block_size=8192):
+        self.filelike = filelike
+        self.block_size = block_size
+
+    def __iter__(self):
+        return iter(lambda: self.filelike.read(self.block_size), b'')
+
+    def close(self):
+        self.filelike.close()
+
+
+class Connection:
+    """A socket to a peer that reads and discards everything: the client of a server."""
+
+    def __init__(self):
+        self.sock, peer = socket.socketpair()
+        threading.Thread(target=self.drain, args=(peer,), daemon=True).start()
+
+    def close(self):
+        self.sock.close()  # the peer reads EOF and its thread ends
+
+    @staticmethod
+    def drain(peer):
+        while peer.recv(1 << 20):
+            pass
+
+    def respond(self, application, environ):
+        """Run the WSGI application and write its response to the socket. Returns (status, body bytes)."""
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started.update(status=status, headers=headers)
+
+        result = application(environ, start_response)
+        try:
+            head = f"HTTP/1.1 {started['status']}\r\n" + ''.join(f'{k}: {v}\r\n' for k, v in started['headers'])
+            self.sock.sendall(head.encode('latin-1') + b'\r\n')
+            length = int(dict(started['headers']).get('Content-Length', 0))
+            if isinstance(result, SendfileWrapper) and length:
+                # What gunicorn does: from the file's position, Content-Length bytes
+                fd = result.filelike.fileno()
+                offset, sent = os.lseek(fd, 0, os.SEEK_CUR), 0
+                while sent < length:
+                    sent += os.sendfile(self.sock.fileno(), fd, offset + sent, length - sent)
+            else:
+                sent = 0
+                for chunk in result:
+                    self.sock.sendall(chunk)
+                    sent += len(chunk)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return int(started['status'][:3]), sent
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare serving media files through Python (django.views.static.serve), '
+        'with mediakit.serve_media and sendfile (as under gunicorn), and with '
+        'serve_media in X-Accel-Redirect mode (Django only answers headers, the '
+        'proxy sends the bytes). Responses are written to a local socket.'
+    )
+
+    MODES = ['naive', 'sendfile', 'x-accel-redirect']
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Requests per file size and mode')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--sizes', default='64k,1m,8m', help='Comma separated file sizes (k/m suffixes)')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        media_root = tempfile.mkdtemp()
+        try:
+            report = self.run(media_root, options)
+        finally:
+            shutil.rmtree(media_root, ignore_errors=True)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                fh.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def run(self, media_root, options):
+        os.makedirs(os.path.join(media_root, 'profile_pics'))
+        report = {
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'sizes': {},
+        }
+        for label in options['sizes'].split(','):
+            label = label.strip().lower()
+            size = int(label.rstrip('km')) * {'k': 1024, 'm': 1024 * 1024}.get(label[-1], 1)
+            name = f'profile_pics/bench-{label}.bin'
+            with open(os.path.join(media_root, name), 'wb') as fh:
+                fh.write(os.urandom(size))
+
+            report['sizes'][label] = {}
+            for mode in self.MODES:
+                sendfile = 'x-accel-redirect' if mode == 'x-accel-redirect' else None
+                serving = {'PREFIXES': ['profile_pics/'], 'SENDFILE': sendfile}
+                with override_settings(ROOT_URLCONF=__name__, MEDIA_ROOT=media_root, MEDIA_SERVING=serving,
+                                       SECURE_SSL_REDIRECT=False):
+                    url = f'/naive/{name}' if mode == 'naive' else f'/media/{name}'
+                    result = report['sizes'][label][mode] = self.run_mode(mode, url, options)
+                self.stderr.write(
+                    f"{label:>5} {mode:17} p50={result['p50_ms']:8.2f}ms p99={result['p99_ms']:8.2f}ms "
+                    f"{result['throughput_rps']:8.1f} req/s {result['throughput_mb_s']:8.1f} MB/s from Django"
+                )
+        return report
+
+    def run_mode(self, mode, url, options):
+        application = WSGIHandler()
+        local = threading.local()
+        connections = []
+
+        def call(_):
+            if not hasattr(local, 'connection'):
+                # One keep-alive connection per thread
+                local.connection = Connection()
+                connections.append(local.connection)
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': url, 'QUERY_STRING': '', 'SCRIPT_NAME': '',
+                'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+                'HTTP_HOST': 'localhost', 'REMOTE_ADDR': '127.0.0.1',
+                'wsgi.input': BytesIO(), 'wsgi.url_scheme': 'http', 'wsgi.errors': BytesIO(),
+                'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+            }
+            if mode != 'naive':
+                environ['wsgi.file_wrapper'] = SendfileWrapper
+            start = time.perf_counter()
+            status, sent = local.connection.respond(application, environ)
+            return time.perf_counter() - start, status, sent
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            results = list(pool.map(call, range(options['requests'])))
+        wall = time.perf_counter() - started
+        for connection in connections:
+            connection.close()
+
+        latencies = [elapsed * 1000 for elapsed, _, _ in results]
+        statuses = {}
+        for _, code, _ in results:
+            statuses[str(code)] = statuses.get(str(code), 0) + 1
+        sent = sum(sent for _, _, sent in results)
+        return {
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+            'mean_ms': round(statistics.fmean(latencies), 3),
+            'throughput_rps': round(len(results) / wall, 2),
+            # Bytes written by Django's process; X-Accel-Redirect leaves them to the proxy
+            'throughput_mb_s': round(sent / wall / 1024 / 1024, 2),
+            'status_codes': statuses,
+        }
@@ -5,6 +5,8 @@ from django.db import models
 class CustomUser(AbstractUser):
     bio = models.TextField(blank=True, null=True)
     profile_picture = models.ImageField(upload_to='profile_pics/', blank=True, null=True)
+    # Names of the resized copies of profile_picture, see accounts/avatars.py
+    avatar_variants = models.JSONField(default=dict, blank=True, editable=False)
     followers = models.ManyToManyField('self', symmetrical=False, related_name='following')
 
     def __str__(self):
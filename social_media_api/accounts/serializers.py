@@ -1,11 +1,18 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from rest_framework.authtoken.models import Token
+from .avatars import avatar_urls
 
 class UserSerializer(serializers.ModelSerializer):
+    # Resized profile picture per size and format, null until they are rendered
+    avatars = serializers.SerializerMethodField()
+
     class Meta:
         model = get_user_model()
-        fields = ['id', 'username', 'email', 'bio', 'profile_picture', 'followers']
+        fields = ['id', 'username', 'email', 'bio', 'profile_picture', 'avatars', 'followers']
+
+    def get_avatars(self, user):
+        return avatar_urls(user, self.context.get('request'))
 
 class RegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField() 
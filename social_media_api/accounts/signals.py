@@ -0,0 +1,14 @@
+# accounts/signals.py
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from . import avatars
+
+
+@receiver(post_save, sender=get_user_model())
+def schedule_avatar_variants(sender, instance, raw=False, **kwargs):
+    # Only when the picture changed; rendering is left to a job (accounts/avatars.py)
+    if raw or (instance.profile_picture.name or '') == instance.avatar_variants.get('source', ''):
+        return
+    avatars.schedule(instance)
@@ -0,0 +1,10 @@
+# accounts/tasks.py
+from jobs.registry import task
+
+from . import avatars
+
+
+@task(name='accounts.render_avatar', pool='process')
+def render_avatar(user_id, source):
+    """Resize and recompress a profile picture (accounts/avatars.py). CPU-bound, hence the process pool."""
+    avatars.build(user_id, source)
@@ -1,3 +1,249 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from PIL import Image
+
+from jobs.models import Job
+from jobs.worker import Worker
+from tokenauth.authentication import local_cache
+from .models import CustomUser
+from .serializers import UserSerializer
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class BulkFollowTests(APITestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='me', password='password')
+        self.alice = CustomUser.objects.create_user(username='alice', password='password')
+        self.bob = CustomUser.objects.create_user(username='bob', password='password')
+        self.client.force_authenticate(self.user)
+        self.url = reverse('bulk_follow')
+
+    def test_bulk_follow_reports_followed_already_and_missing(self):
+        """Ids and usernames are resolved together and classified in the response"""
+        self.user.following.add(self.bob)
+
+        response = self.client.post(self.url, {"users": [self.alice.pk, 'bob', 'nobody', 9999, 'me']}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['followed'], ['alice'])
+        self.assertEqual(response.data['already_following'], ['bob'])
+        self.assertEqual(response.data['missing'], ['nobody', 9999])
+        self.assertEqual(response.data['following_count'], 2)
+        # Same relation the single FollowUserView creates
+        self.assertEqual(set(self.user.following.all()), {self.alice, self.bob})
+
+    def test_bulk_follow_uses_constant_queries(self):
+        """The number of queries does not grow with the number of targets"""
+        names = [f'user{i}' for i in range(30)]
+        CustomUser.objects.bulk_create([CustomUser(username=name) for name in names])
+
+        with self.assertNumQueries(4):
+            response = self.client.post(self.url, {"users": names}, format='json')
+
+        self.assertEqual(len(response.data['followed']), 30)
+
+    def test_bulk_follow_reports_out_of_range_ids_as_missing(self):
+        response = self.client.post(self.url, {"users": [10 ** 30, str(2 ** 63), -1, self.alice.pk]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['followed'], ['alice'])
+        self.assertEqual(response.data['missing'], [10 ** 30, str(2 ** 63), -1])
+
+    def test_bulk_follow_rejects_bad_payload(self):
+        response = self.client.post(self.url, {"users": "alice"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(self.url, {"users": [True]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_follow_treats_non_decimal_digits_as_usernames(self):
+        response = self.client.post(self.url, {"users": ['²', self.alice.pk]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['missing'], ['²'])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, TOKEN_AUTH_CACHE={'LOCAL_MAXSIZE': 100})
+class CachedTokenAuthenticationTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.user = CustomUser.objects.create_user(username='me', password='password')
+        self.token = Token.objects.create(user=self.user)
+        self.url = reverse('notifications_list')
+
+    def get(self, key):
+        return self.client.get(self.url, HTTP_AUTHORIZATION=f'Token {key}')
+
+    def test_second_request_skips_token_query(self):
+        self.assertEqual(self.get(self.token.key).status_code, status.HTTP_200_OK)
+        # Only the notifications count/list queries remain
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get(self.token.key).status_code, status.HTTP_200_OK)
+
+    def test_deleted_token_is_rejected(self):
+        key = self.token.key
+        self.get(key)
+        self.token.delete()
+        self.assertEqual(self.get(key).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_is_rejected(self):
+        self.get(self.token.key)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get(self.token.key).status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+def make_picture(color=(200, 30, 30, 128), size=(600, 400)):
+    output = io.BytesIO()
+    Image.new('RGBA', size, color).save(output, 'PNG')
+    return output.getvalue()
+
+
+@override_settings(AVATARS={'SIZES': {'small': 48, 'large': 128}})
+class AvatarTests(APITestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.user = CustomUser.objects.create_user(username='pictured', password='password')
+
+    def test_variants_are_rendered_off_the_request_and_exposed(self):
+        self.user.profile_picture.save('me.png', ContentFile(make_picture()))
+        self.assertIsNone(UserSerializer(self.user).data['avatars'])  # pending
+        self.assertEqual(Job.objects.filter(name='accounts.render_avatar').count(), 1)
+
+        Worker(workers=1, pool='inline').run(burst=True)
+        self.user.refresh_from_db()
+        avatars = UserSerializer(self.user).data['avatars']
+        self.assertEqual(set(avatars), {'small', 'large'})
+        self.assertRegex(avatars['small']['webp'], r'^/media/avatars/\w\w/\w{64}/48q80\.webp$')
+        name = self.user.avatar_variants['sizes']['large']['jpeg']
+        with default_storage.open(name) as variant, Image.open(variant) as image:
+            self.assertEqual((image.format, image.size), ('JPEG', (128, 128)))
+
+    def test_identical_pictures_share_their_variants(self):
+        self.user.profile_picture.save('me.png', ContentFile(make_picture()))
+        Worker(workers=1, pool='inline').run(burst=True)
+        twin = CustomUser.objects.create_user(username='twin', password='password')
+        twin.profile_picture.save('same.png', ContentFile(make_picture()))
+        with mock.patch('accounts.avatars.render_variants') as render:
+            Worker(workers=1, pool='inline').run(burst=True)
+        render.assert_not_called()
+        self.user.refresh_from_db()
+        twin.refresh_from_db()
+        self.assertEqual(twin.avatar_variants['sizes'], self.user.avatar_variants['sizes'])
+
+    def test_backfill_queues_users_without_current_variants(self):
+        self.user.profile_picture.save('me.png', ContentFile(make_picture()))
+        Worker(workers=1, pool='inline').run(burst=True)
+        CustomUser.objects.filter(pk=self.user.pk).update(avatar_variants={})
+        Job.objects.all().delete()
+
+        call_command('backfill_avatars', stdout=StringIO())
+        self.assertEqual(Job.objects.count(), 1)
+        Worker(workers=1, pool='inline').run(burst=True)
+        call_command('backfill_avatars', stdout=StringIO())
+        self.assertEqual(Job.objects.filter(status=Job.QUEUED).count(), 0)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, UPLOADS={'MAX_BYTES': 64 * 1024, 'MAX_PIXELS': 1000 * 1000})
+class ImageUploadTests(APITestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+
+    def register(self, name, data):
+        picture = ContentFile(data, name=name)
+        return self.client.post(reverse('register'), {
+            'username': 'uploader', 'password': 'password', 'profile_picture': picture,
+        }, format='multipart')
+
+    def test_images_are_accepted(self):
+        response = self.register('me.png', make_picture())
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(CustomUser.objects.get(username='uploader').profile_picture)
+
+    def test_files_that_are_not_images_are_rejected(self):
+        response = self.register('me.png', b'<?php echo "hello"; ?>' * 10)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('is not a JPEG, PNG, GIF, WEBP image', response.data['detail'])
+        self.assertFalse(CustomUser.objects.exists())
+
+    def test_images_too_large_are_rejected_from_their_header(self):
+        response = self.register('me.png', make_picture(size=(1200, 1000)))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('1200x1000', response.data['detail'])
+
+    def test_uploads_over_the_size_limit_are_rejected(self):
+        noise = Image.effect_noise((400, 400), 100)
+        output = io.BytesIO()
+        noise.save(output, 'PNG')
+        self.assertGreater(len(output.getvalue()), 64 * 1024)
+        response = self.register('me.png', output.getvalue())
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('larger than 65536 bytes', response.data['detail'])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class MediaServingTests(APITestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.name = default_storage.save('profile_pics/me.png', ContentFile(make_picture()))
+        self.size = default_storage.size(self.name)
+        self.url = reverse('media', args=[self.name])
+
+    def test_files_are_served_with_validators_and_cache_headers(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(response.streaming_content), default_storage.open(self.name).read())
+        self.assertEqual((response['Content-Type'], int(response['Content-Length'])), ('image/png', self.size))
+        self.assertIn('max-age=', response['Cache-Control'])
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_range_requests(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-7')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b''.join(response.streaming_content), b'\x89PNG\r\n\x1a\n')
+        self.assertEqual(response['Content-Range'], f'bytes 0-7/{self.size}')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(int(response['Content-Length']), 10)
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={self.size}-')
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        # The client's copy is outdated: send it all
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-7', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_only_listed_directories_are_served(self):
+        default_storage.save('private/secret.txt', ContentFile(b'secret'))
+        for path in ('private/secret.txt', 'profile_pics/../private/secret.txt', 'profile_pics/missing.png'):
+            self.assertEqual(self.client.get(f'/media/{path}').status_code, status.HTTP_404_NOT_FOUND, path)
+
+    def test_a_front_proxy_can_send_the_bytes(self):
+        with override_settings(MEDIA_SERVING={**settings.MEDIA_SERVING, 'SENDFILE': 'x-accel-redirect'}):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.name}')
+        self.assertEqual(response.content, b'')
+        self.assertIn('ETag', response)
@@ -1,10 +1,11 @@
 # accounts/urls.py
 from django.urls import path
-from .views import RegisterView, CustomAuthToken, FollowUserView, UnfollowUserView
+from .views import RegisterView, CustomAuthToken, FollowUserView, UnfollowUserView, BulkFollowView
 
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
     path('login/', CustomAuthToken.as_view(), name='login'),
     path('follow/<int:user_id>/', FollowUserView.as_view(), name='follow_user'),
+    path('follow/bulk/', BulkFollowView.as_view(), name='bulk_follow'),
     path('unfollow/<int:user_id>/', UnfollowUserView.as_view(), name='unfollow_user'),
 ]
\ No newline at end of file
@@ -8,6 +8,7 @@ from django.contrib.auth import get_user_model
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
+from django.db.models import Q
 from .models import CustomUser
 from .serializers import UserSerializer
 
@@ -60,4 +61,79 @@ class UnfollowUserView(generics.GenericAPIView):
     def post(self, request, user_id):
         user_to_unfollow = get_object_or_404(CustomUser, pk=user_id)
         request.user.following.remove(user_to_unfollow)
-        return Response({"message": f"You have unfollowed {user_to_unfollow.username}"}, status=status.HTTP_200_OK)
\ No newline at end of file
+        return Response({"message": f"You have unfollowed {user_to_unfollow.username}"}, status=status.HTTP_200_OK)
+
+class BulkFollowView(generics.GenericAPIView):
+    """
+    Follow many accounts in one request (used by onboarding / contact import).
+
+    Expects {"users": [...]} where each entry is a user id or a username.
+    Targets are resolved in one query and the follow rows are written with a
+    single bulk insert instead of one FollowUserView call per account.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    queryset = CustomUser.objects.all()
+    max_targets = 500
+    # Resolve, existing follows, bulk insert, count (+ token lookup on a cache miss)
+    query_budget = 5
+
+    def post(self, request, *args, **kwargs):
+        targets = request.data.get('users')
+        if not isinstance(targets, list) or not targets:
+            return Response({"error": "'users' must be a non-empty list of ids or usernames"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(targets) > self.max_targets:
+            return Response({"error": f"You can follow at most {self.max_targets} users per request"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # bool is an int subclass: True would follow user 1
+        if any(isinstance(t, bool) or not isinstance(t, (int, str)) for t in targets):
+            return Response({"error": "Each entry of 'users' must be a user id or a username"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Split the input into ids and usernames (ints, or decimal strings, are ids).
+        # isdecimal() rather than isdigit(): int() rejects digits such as '²'
+        def as_id(target):
+            if isinstance(target, int) or target.isdecimal():
+                return int(target)
+            return None
+
+        # Ids no database column can hold are simply not found (SQLite raises
+        # OverflowError for them, PostgreSQL DataError)
+        ids = {as_id(t) for t in targets if as_id(t) is not None and 1 <= as_id(t) < 2 ** 63}
+        usernames = {t for t in targets if isinstance(t, str) and t and as_id(t) is None}
+
+        # 1. Resolve every target in a single query (yourself included, so that
+        # a self-follow is skipped rather than reported as missing)
+        found = list(
+            CustomUser.objects.filter(Q(pk__in=ids) | Q(username__in=usernames)).only('id', 'username')
+        )
+        found_ids = {user.pk for user in found}
+        found_names = {user.username for user in found}
+        missing = [
+            t for t in targets
+            if (as_id(t) not in found_ids if as_id(t) is not None else t not in found_names)
+        ]
+        found = [user for user in found if user.pk != request.user.pk]
+        found_ids.discard(request.user.pk)
+
+        # 2. Find which of them we already follow (one query)
+        # "A follows B" is stored as a row (from_customuser=B, to_customuser=A),
+        # the same row request.user.following.add(B) would create.
+        Follow = CustomUser.followers.through
+        already = set(
+            Follow.objects.filter(to_customuser=request.user, from_customuser__in=found_ids)
+            .values_list('from_customuser_id', flat=True)
+        )
+
+        # 3. Insert all the new rows at once; ignore_conflicts keeps concurrent
+        # requests for the same pair from failing on the unique constraint.
+        new_rows = [
+            Follow(from_customuser_id=user.pk, to_customuser_id=request.user.pk)
+            for user in found if user.pk not in already
+        ]
+        Follow.objects.bulk_create(new_rows, ignore_conflicts=True)
+
+        return Response({
+            "followed": [user.username for user in found if user.pk not in already],
+            "already_following": [user.username for user in found if user.pk in already],
+            "missing": missing,
+            "following_count": Follow.objects.filter(to_customuser=request.user).count(),
+        }, status=status.HTTP_200_OK)
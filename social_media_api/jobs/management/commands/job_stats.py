@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from jobs.queue import queue_stats
+
+
+class Command(BaseCommand):
+    help = 'Show queued/running/done/failed jobs per task, queue lag and mean run time'
+
+    def handle(self, *args, **options):
+        stats = queue_stats()
+        if not stats:
+            self.stdout.write('No jobs.')
+            return
+        self.stdout.write(f"{'task':50} {'queued':>7} {'running':>7} {'done':>7} {'failed':>7} {'lag':>8} {'runtime':>8}")
+        for name, row in sorted(stats.items()):
+            lag = f"{row['lag']:.1f}s" if 'lag' in row else '-'
+            runtime = f"{row['runtime'] * 1000:.0f}ms" if 'runtime' in row else '-'
+            self.stdout.write(
+                f"{name:50} {row['queued']:7} {row['running']:7} {row['done']:7} {row['failed']:7} {lag:>8} {runtime:>8}"
+            )
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from jobs.queue import get_config
+from jobs.worker import Worker
+
+
+class Command(BaseCommand):
+    help = (
+        'Run queued jobs (see jobs/queue.py) until stopped with SIGINT/SIGTERM. '
+        'Run one per host, or several: claiming is safe across workers.'
+    )
+
+    def add_arguments(self, parser):
+        config = get_config()
+        parser.add_argument('--workers', type=int, default=config['WORKERS'], help='Jobs run at the same time')
+        parser.add_argument('--pool', choices=['thread', 'process', 'inline'], default=config['POOL'],
+                            help='Run jobs in threads (I/O-bound tasks), processes (CPU-bound) or in this loop')
+        parser.add_argument('--burst', action='store_true', help='Exit once no job is due')
+
+    def handle(self, *args, **options):
+        worker = Worker(options['workers'], options['pool'], stdout=self.stdout)
+        self.stdout.write(f"Worker {worker.name}: {worker.workers} {worker.pool} slots")
+        worker.run(burst=options['burst'])
@@ -0,0 +1,35 @@
+# jobs/models.py
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """A call of a registered task (see jobs/registry.py), run by `manage.py run_jobs`."""
+    QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+    STATUS_CHOICES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    name = models.CharField(max_length=200)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    priority = models.SmallIntegerField(default=0)  # higher runs first
+    run_at = models.DateTimeField(default=timezone.now)  # not before; retries move it forward
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    # Set while running: which claim holds the job, and since when
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Claiming: WHERE status = 'queued' AND run_at <= now ORDER BY priority DESC, run_at
+            models.Index(fields=['status', '-priority', 'run_at'], name='job_claim_idx'),
+            # Lost workers, pruning and stats
+            models.Index(fields=['status', 'locked_at'], name='job_status_locked_idx'),
+            models.Index(fields=['status', 'finished_at'], name='job_status_finished_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
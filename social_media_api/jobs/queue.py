@@ -0,0 +1,147 @@
+# jobs/queue.py
+"""
+A job queue in the database: no broker, jobs are rows of jobs.Job.
+
+Claiming hands each queued job to exactly one worker:
+
+* PostgreSQL (and any backend with SKIP LOCKED): SELECT ... FOR UPDATE SKIP
+  LOCKED picks the next jobs. Concurrent workers skip rows another worker
+  has locked instead of waiting for them, then mark theirs as running.
+* SQLite: writers are serialized anyway, so a compare-and-set is enough.
+  UPDATE ... WHERE status = 'queued' marks the candidates with a claim
+  token, and the worker takes the rows that carry its token. A job another
+  worker took first is no longer 'queued' and is not updated.
+
+A failed job is queued again with exponential backoff until it has used
+max_attempts. A job whose worker died is found by its stale locked_at
+and treated like a failure.
+"""
+import random
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Avg, Count, F, Min
+from django.utils import timezone
+
+from .models import Job
+
+# Defaults, override any of them with JOBS in settings.py
+DEFAULTS = {
+    'WORKERS': 4,                 # jobs run at the same time by one run_jobs
+    'POOL': 'thread',             # 'thread', 'process' (CPU-bound tasks) or 'inline'
+    'POLL_INTERVAL': 1.0,         # seconds between polls of an empty queue
+    'MAX_ATTEMPTS': 5,            # for tasks that do not set their own
+    'BACKOFF_BASE': 10,           # seconds before the first retry, doubled for each further one
+    'BACKOFF_MAX': 3600,
+    'LOCK_TIMEOUT': 600,          # a job running longer than this is presumed lost and retried
+    'KEEP_FINISHED_HOURS': 24,    # done jobs are deleted after this long
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'JOBS', {})}
+
+
+def enqueue(name, kwargs=None, *, priority=0, run_at=None, max_attempts=None):
+    return Job.objects.create(
+        name=name, kwargs=kwargs or {}, priority=priority,
+        run_at=run_at or timezone.now(), max_attempts=max_attempts or get_config()['MAX_ATTEMPTS'],
+    )
+
+
+def ready_jobs(now):
+    return Job.objects.filter(status=Job.QUEUED, run_at__lte=now).order_by('-priority', 'run_at')
+
+
+def claim(limit, worker='worker', now=None):
+    """Mark up to `limit` due jobs as running for us and return them, highest priority first."""
+    now = now or timezone.now()
+    token = f'{worker}:{uuid.uuid4().hex[:12]}'
+    claimed = {'status': Job.RUNNING, 'locked_by': token, 'locked_at': now, 'attempts': F('attempts') + 1}
+    if connections[Job.objects.db].features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(ready_jobs(now).select_for_update(skip_locked=True).values_list('pk', flat=True)[:limit])
+            Job.objects.filter(pk__in=ids).update(**claimed)
+    else:
+        ids = list(ready_jobs(now).values_list('pk', flat=True)[:limit])
+        # Compare-and-set: only jobs still queued are ours
+        Job.objects.filter(pk__in=ids, status=Job.QUEUED).update(**claimed)
+    if not ids:
+        return []
+    return list(Job.objects.filter(pk__in=ids, locked_by=token).order_by('-priority', 'run_at'))
+
+
+def backoff(attempts):
+    """Seconds before retry number `attempts`, with +-25% jitter so retries do not come in waves."""
+    config = get_config()
+    delay = min(config['BACKOFF_BASE'] * 2 ** (attempts - 1), config['BACKOFF_MAX'])
+    return delay * random.uniform(0.75, 1.25)
+
+
+def complete(job, now=None):
+    # Filtered on our claim: if the job was presumed lost and handed out
+    # again meanwhile, the new run owns the row
+    Job.objects.filter(pk=job.pk, locked_by=job.locked_by).update(
+        status=Job.DONE, finished_at=now or timezone.now(), locked_by='', last_error='',
+    )
+
+
+def fail(job, error, now=None):
+    """Queue the job again after a backoff, or give up once it used all its attempts."""
+    now = now or timezone.now()
+    ours = Job.objects.filter(pk=job.pk, locked_by=job.locked_by)
+    if job.attempts < job.max_attempts:
+        ours.update(
+            status=Job.QUEUED, run_at=now + timedelta(seconds=backoff(job.attempts)),
+            locked_by='', last_error=error,
+        )
+        return True
+    ours.update(status=Job.FAILED, finished_at=now, locked_by='', last_error=error)
+    return False
+
+
+def requeue_lost(now=None):
+    """Retry (or fail) jobs whose worker stopped without finishing them. Returns how many."""
+    now = now or timezone.now()
+    lost = Job.objects.filter(
+        status=Job.RUNNING, locked_at__lt=now - timedelta(seconds=get_config()['LOCK_TIMEOUT']),
+    )
+    error = 'Lost: the worker running this job stopped or timed out.'
+    failed = lost.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, finished_at=now, locked_by='', last_error=error,
+    )
+    retried = lost.update(status=Job.QUEUED, run_at=now, locked_by='', last_error=error)
+    return failed + retried
+
+
+def prune_finished(now=None, batch_size=1000):
+    """Delete done jobs older than KEEP_FINISHED_HOURS. Failed ones stay for inspection."""
+    cutoff = (now or timezone.now()) - timedelta(hours=get_config()['KEEP_FINISHED_HOURS'])
+    total = 0
+    while True:
+        batch = list(
+            Job.objects.filter(status=Job.DONE, finished_at__lt=cutoff).values_list('pk', flat=True)[:batch_size]
+        )
+        if not batch:
+            return total
+        total += Job.objects.filter(pk__in=batch).delete()[0]
+
+
+def queue_stats(now=None):
+    """
+    Per task: jobs in each status, the wait of the oldest due job and the mean
+    run time of the jobs done in the last hour.
+    """
+    now = now or timezone.now()
+    stats = {}
+    for row in Job.objects.order_by().values('name', 'status').annotate(count=Count('pk')):
+        stats.setdefault(row['name'], {status: 0 for status, _ in Job.STATUS_CHOICES})[row['status']] = row['count']
+    for row in ready_jobs(now).order_by().values('name').annotate(oldest=Min('run_at')):
+        stats[row['name']]['lag'] = (now - row['oldest']).total_seconds()
+    recent = Job.objects.filter(status=Job.DONE, finished_at__gte=now - timedelta(hours=1)).order_by()
+    for row in recent.values('name').annotate(runtime=Avg(F('finished_at') - F('locked_at'))):
+        if row['runtime'] is not None:
+            stats[row['name']]['runtime'] = row['runtime'].total_seconds()
+    return stats
@@ -0,0 +1,59 @@
+# jobs/registry.py
+"""
+Tasks: functions the worker may run, registered by name.
+
+    # myapp/tasks.py (imported by the jobs app at startup)
+    from jobs.registry import task
+
+    @task(priority=5)
+    def send_digest(user_id):
+        ...
+
+    send_digest.enqueue(user_id=user.pk)         # runs in `manage.py run_jobs`
+    send_digest(user_id=user.pk)                 # still a plain call
+
+Arguments are stored as JSON, so pass ids rather than model instances.
+CPU-bound tasks can ask for a process pool with @task(pool='process'),
+whatever pool the worker uses for the others.
+"""
+
+_tasks = {}
+
+
+class Task:
+    def __init__(self, func, name, priority, max_attempts, pool=None):
+        self.func = func
+        self.name = name
+        self.priority = priority
+        self.max_attempts = max_attempts
+        self.pool = pool
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def enqueue(self, *, priority=None, run_at=None, **kwargs):
+        """Insert a job for this task. Part of the current transaction, if any."""
+        from .queue import enqueue
+        return enqueue(
+            self.name, kwargs, run_at=run_at, max_attempts=self.max_attempts,
+            priority=self.priority if priority is None else priority,
+        )
+
+    def __repr__(self):
+        return f'<Task {self.name}>'
+
+
+def task(func=None, *, name=None, priority=0, max_attempts=None, pool=None):
+    """Register a function as a task. Named after its module and function unless `name` is given."""
+    def register(func):
+        registered = Task(func, name or f'{func.__module__}.{func.__qualname__}', priority, max_attempts, pool)
+        _tasks[registered.name] = registered
+        return registered
+    return register(func) if func is not None else register
+
+
+def get_task(name):
+    try:
+        return _tasks[name]
+    except KeyError:
+        raise LookupError(f'No task named {name!r} is registered (is its tasks.py imported?)') from None
@@ -0,0 +1,36 @@
+# jobs/runner.py
+"""
+What runs inside the pool. Kept apart from the models: a spawned process
+imports this module before Django is set up.
+"""
+import traceback
+
+from django.db import close_old_connections
+
+from .registry import get_task
+
+
+def execute(name, kwargs, pooled=True):
+    """Run one task. Returns (ok, traceback text): exceptions need not be picklable."""
+    if pooled:
+        # Pool threads live long: drop broken or expired connections, like requests do
+        close_old_connections()
+    try:
+        get_task(name).func(**kwargs)
+        return True, ''
+    except Exception:
+        return False, traceback.format_exc()
+    finally:
+        if pooled:
+            close_old_connections()
+
+
+def init_process(*modules):
+    # Spawned children start from scratch: load settings and apps (and so the
+    # tasks), then any other modules registering tasks
+    import importlib
+
+    import django
+    django.setup()
+    for module in modules:
+        importlib.import_module(module)
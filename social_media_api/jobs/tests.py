@@ -0,0 +1,121 @@
+import os
+import threading
+from datetime import timedelta
+
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from . import queue
+from .models import Job
+from .registry import task
+from .worker import Worker
+
+calls = []
+calls_lock = threading.Lock()
+
+
+@task(name='tests.record')
+def record(value):
+    with calls_lock:
+        calls.append(value)
+
+
+@task(name='tests.crunch', pool='process')
+def crunch():
+    pass
+
+
+@task(name='tests.die', pool='process')
+def die():
+    os._exit(1)  # like a process killed by the OOM killer
+
+
+@task(name='tests.explode', max_attempts=2)
+def explode():
+    raise RuntimeError('boom')
+
+
+class JobQueueTests(TestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def test_jobs_run_by_priority(self):
+        record.enqueue(value='low')
+        record.enqueue(value='high', priority=10)
+        record.enqueue(value='later', run_at=timezone.now() + timedelta(hours=1))
+        Worker(workers=1, pool='inline').run(burst=True)
+
+        self.assertEqual(calls, ['high', 'low'])
+        self.assertEqual(Job.objects.filter(status=Job.DONE).count(), 2)
+        self.assertEqual(Job.objects.get(kwargs={'value': 'later'}).status, Job.QUEUED)
+
+    def test_a_claimed_job_is_not_claimed_again(self):
+        record.enqueue(value='once')
+        first = queue.claim(10, 'a')
+        self.assertEqual([job.kwargs for job in first], [{'value': 'once'}])
+        self.assertEqual(first[0].attempts, 1)
+        self.assertEqual(queue.claim(10, 'b'), [])
+
+    def test_failures_are_retried_with_backoff_then_given_up(self):
+        job = explode.enqueue()
+        with self.assertLogs('jobs.worker', 'WARNING'):
+            Worker(workers=1, pool='inline').run(burst=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertIn('RuntimeError: boom', job.last_error)
+        self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=5))
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        with self.assertLogs('jobs.worker', 'ERROR'):
+            Worker(workers=1, pool='inline').run(burst=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+
+    def test_jobs_of_a_lost_worker_are_requeued(self):
+        record.enqueue(value='lost')
+        [job] = queue.claim(1, 'crashed')
+        later = timezone.now() + timedelta(seconds=queue.get_config()['LOCK_TIMEOUT'] + 1)
+        self.assertEqual(queue.requeue_lost(now=later), 1)
+        # The crashed worker finishing late must not overwrite the new state
+        queue.complete(job)
+        self.assertEqual(Job.objects.get(pk=job.pk).status, Job.QUEUED)
+
+    def test_tasks_can_ask_for_their_own_pool(self):
+        crunching, recording = crunch.enqueue(), record.enqueue(value=1)
+        self.assertEqual(Worker(pool='thread').pool_for(crunching), 'process')
+        self.assertEqual(Worker(pool='thread').pool_for(recording), 'thread')
+        self.assertEqual(Worker(pool='inline').pool_for(crunching), 'inline')
+
+    def test_queue_stats(self):
+        record.enqueue(value=1)
+        explode.enqueue(run_at=timezone.now() - timedelta(seconds=30))
+        with self.assertLogs('jobs.worker', 'WARNING'):
+            Worker(workers=1, pool='inline').run(burst=True)
+        stats = queue.queue_stats()
+        self.assertEqual(stats['tests.record']['done'], 1)
+        self.assertEqual(stats['tests.explode']['queued'], 1)
+        self.assertIn('runtime', stats['tests.record'])
+
+
+class JobWorkerPoolTests(TransactionTestCase):
+
+    def test_thread_pool_runs_every_job_once(self):
+        calls.clear()
+        for value in range(20):
+            record.enqueue(value=value)
+        Worker(workers=4, pool='thread', poll_interval=0.01).run(burst=True)
+        self.assertEqual(sorted(calls), list(range(20)))
+        self.assertEqual(Job.objects.filter(status=Job.DONE).count(), 20)
+
+    def test_a_dead_pool_process_is_replaced(self):
+        class ProcessWorker(Worker):
+            task_modules = ['jobs.tests']  # the tasks above, in the pool processes
+
+        dying, crunching = die.enqueue(priority=1), crunch.enqueue()
+        with self.assertLogs('jobs.worker', 'WARNING'):
+            ProcessWorker(workers=1, pool='thread', poll_interval=0.01).run(burst=True)
+        dying.refresh_from_db()
+        self.assertEqual((dying.status, dying.attempts), (Job.QUEUED, 1))
+        self.assertIn('BrokenProcessPool', dying.last_error)
+        self.assertEqual(Job.objects.get(pk=crunching.pk).status, Job.DONE)
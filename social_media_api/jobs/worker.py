@@ -0,0 +1,183 @@
+# jobs/worker.py
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+import traceback
+from collections import Counter, defaultdict
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from . import queue
+from .registry import get_task
+from .runner import execute, init_process
+
+logger = logging.getLogger(__name__)
+
+
+class InlineExecutor:
+    """Runs each job in the worker loop itself, e.g. while debugging or in tests."""
+
+    def submit(self, func, *args):
+        future = Future()
+        future.set_result(func(*args))
+        return future
+
+    def shutdown(self, wait=True):
+        pass
+
+
+class Worker:
+    """
+    Claims due jobs and runs them in a pool. At most `workers` jobs are
+    claimed at a time, so jobs never wait in memory while other workers
+    could run them. Job states are written by this loop, not by the pool.
+
+    A process pool is replaced once one of its processes dies (killed,
+    out of memory, os._exit): its jobs count as failed attempts.
+    """
+    # Modules defining tasks outside the apps' tasks.py, imported by each pool process
+    task_modules = ()
+
+    def __init__(self, workers=None, pool=None, poll_interval=None, stats_interval=60, stdout=None):
+        config = queue.get_config()
+        self.workers = workers or config['WORKERS']
+        self.pool = pool or config['POOL']
+        self.poll_interval = config['POLL_INTERVAL'] if poll_interval is None else poll_interval
+        self.stats_interval = stats_interval
+        self.stdout = stdout
+        self.name = f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = threading.Event()
+        # Metrics of this worker: outcomes and run time per task
+        self.counts = defaultdict(Counter)
+        self.runtime = Counter()
+
+    def make_executor(self, pool):
+        if pool == 'inline':
+            return InlineExecutor()
+        if pool == 'process':
+            # Spawned, not forked: a forked child would share the parent's DB connections
+            return ProcessPoolExecutor(
+                self.workers, mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_process, initargs=tuple(self.task_modules),
+            )
+        return ThreadPoolExecutor(self.workers, thread_name_prefix='job')
+
+    def pool_for(self, job):
+        # Tasks may ask for their own pool (e.g. 'process' for CPU-bound work),
+        # except from an inline worker, which runs everything inline
+        try:
+            wanted = get_task(job.name).pool
+        except LookupError:
+            wanted = None  # fails in execute(), like in any pool
+        return self.pool if self.pool == 'inline' or wanted is None else wanted
+
+    def submit(self, executors, job):
+        """Start the job in its pool. Returns (future, executor)."""
+        pool = self.pool_for(job)
+        if pool not in executors:
+            executors[pool] = self.make_executor(pool)
+        try:
+            return executors[pool].submit(execute, job.name, job.kwargs, pool != 'inline'), executors[pool]
+        except BrokenProcessPool:
+            # A process died since the last job; the jobs it had fail through their futures
+            self.discard(executors, executors[pool])
+            executors[pool] = self.make_executor(pool)
+            return executors[pool].submit(execute, job.name, job.kwargs, pool != 'inline'), executors[pool]
+
+    def discard(self, executors, executor):
+        """Drop a broken pool, so the next job gets a new one."""
+        for pool, current in list(executors.items()):
+            if current is executor:
+                del executors[pool]
+                logger.warning('A process of the %s pool died, starting a new pool', pool)
+        executor.shutdown(wait=False)
+
+    def stop(self, *args):
+        self.stopping.set()
+
+    def run(self, burst=False):
+        """Work until stopped (SIGINT/SIGTERM), or until nothing is due if `burst`."""
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, self.stop)
+            signal.signal(signal.SIGINT, self.stop)
+        executors = {}  # pool -> executor, made when first needed
+        running = {}  # future -> (job, started, executor)
+        last_housekeeping = 0
+        try:
+            while not self.stopping.is_set():
+                if time.monotonic() - last_housekeeping >= self.stats_interval:
+                    self.housekeeping()
+                    last_housekeeping = time.monotonic()
+
+                free = self.workers - len(running)
+                jobs = queue.claim(free, self.name) if free else []
+                for job in jobs:
+                    future, executor = self.submit(executors, job)
+                    running[future] = (job, time.monotonic(), executor)
+
+                if not running:
+                    if burst:
+                        break
+                    self.stopping.wait(self.poll_interval)
+                    continue
+                # Claim more as soon as a slot frees up, but poll for new jobs
+                # meanwhile if there are free slots
+                done, _ = wait(running, timeout=self.poll_interval if len(running) < self.workers else None,
+                               return_when=FIRST_COMPLETED)
+                for future in done:
+                    job, started, executor = running.pop(future)
+                    self.finish(job, started, *self.outcome(future, executors, executor))
+            # Stopping: let the running jobs finish
+            for future, (job, started, executor) in running.items():
+                self.finish(job, started, *self.outcome(future, executors, executor))
+        finally:
+            for executor in executors.values():
+                executor.shutdown(wait=True)
+            self.report()
+
+    def outcome(self, future, executors, executor):
+        try:
+            return future.result()
+        except BrokenProcessPool:
+            # A process was killed: retry the job, in a new pool
+            if executor in executors.values():
+                self.discard(executors, executor)
+            return False, traceback.format_exc()
+        except Exception:
+            # The pool itself failed: retry the job
+            return False, traceback.format_exc()
+
+    def finish(self, job, started, ok, error):
+        self.runtime[job.name] += time.monotonic() - started
+        if ok:
+            queue.complete(job)
+            self.counts[job.name]['done'] += 1
+        elif queue.fail(job, error):
+            logger.warning('Job %s failed (attempt %s of %s), retrying:\n%s', job, job.attempts, job.max_attempts, error)
+            self.counts[job.name]['retried'] += 1
+        else:
+            logger.error('Job %s failed for good after %s attempts:\n%s', job, job.attempts, error)
+            self.counts[job.name]['failed'] += 1
+
+    def housekeeping(self):
+        lost = queue.requeue_lost()
+        if lost:
+            logger.warning('Requeued %s jobs whose worker was lost', lost)
+        queue.prune_finished()
+        self.report()
+
+    def report(self):
+        for name, counts in sorted(self.counts.items()):
+            runs = sum(counts.values())
+            line = (
+                f"{name}: {counts['done']} done, {counts['retried']} retried, {counts['failed']} failed, "
+                f"{self.runtime[name] / runs * 1000:.0f} ms per run"
+            )
+            if self.stdout is not None:
+                self.stdout.write(line)
+            else:
+                logger.info(line)
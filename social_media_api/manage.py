@@ -6,7 +6,9 @@ import sys
 
 def main():
     """Run administrative tasks."""
-    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'social_media_api.settings')
+    # `manage.py test` runs with the test settings (stricter query budgets, local caches)
+    test = sys.argv[1:2] == ['test']
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'social_media_api.test_settings' if test else 'social_media_api.settings')
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
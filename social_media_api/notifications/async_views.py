@@ -0,0 +1,8 @@
+# notifications/async_views.py
+from social_media_api.async_generics import AsyncListAPIView
+
+from .views import NotificationListView
+
+
+class AsyncNotificationListView(AsyncListAPIView, NotificationListView):
+    pass
@@ -0,0 +1,110 @@
+# notifications/fanout.py
+"""
+Fan-out of new posts to the author's followers, off the request path.
+
+schedule() only queues a job (jobs app). Each job notifies one chunk of
+followers: the next FAN_OUT_CHUNK follower ids after a cursor, read in
+follower id order from the followers table (keyset, no OFFSET). Followers
+who muted the author are skipped, the rest get their notifications in one
+bulk insert per shard. The job then queues the next chunk, so a large
+account becomes a chain of short jobs rather than one long one.
+
+A retried chunk skips followers it already notified. A chunk with a follower
+being moved to another shard fails and is retried. Each author gets at
+most MAX_PER_WINDOW fan-outs per WINDOW seconds; posts over the cap are
+only seen in the feed.
+"""
+import logging
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import transaction
+
+from posts.sharding import UserMoving, placements
+
+from .models import Mute, Notification
+
+logger = logging.getLogger(__name__)
+
+# Defaults, override any of them with NOTIFICATIONS in settings.py
+DEFAULTS = {
+    'FAN_OUT_CHUNK': 1000,      # followers notified per job
+    'MAX_PER_WINDOW': 10,       # fan-outs per author ...
+    'WINDOW': 3600,             # ... per this many seconds
+    'VERB': 'published a new post',
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'NOTIFICATIONS', {})}
+
+
+def within_rate(author_id):
+    """Count a fan-out for the author; False once they used up the current window."""
+    config = get_config()
+    key = f'fanout-rate:{author_id}'
+    # Fixed window: the counter expires WINDOW seconds after the first fan-out
+    cache.add(key, 0, config['WINDOW'])
+    try:
+        return cache.incr(key) <= config['MAX_PER_WINDOW']
+    except ValueError:  # expired in between
+        cache.add(key, 1, config['WINDOW'])
+        return True
+
+
+def schedule(post):
+    """Queue the fan-out of a new post. Part of the current transaction."""
+    from .tasks import fan_out_post
+
+    if not within_rate(post.author_id):
+        logger.info('Not notifying the followers of user %s about post %s: over the rate cap', post.author_id, post.pk)
+        return None
+    return fan_out_post.enqueue(post_id=post.pk, author_id=post.author_id)
+
+
+def follower_chunk(author_id, after, size):
+    """The next `size` follower ids of the author after `after`, in id order."""
+    follows = get_user_model().followers.through.objects
+    return list(
+        follows.filter(from_customuser_id=author_id, to_customuser_id__gt=after)
+        .order_by('to_customuser_id').values_list('to_customuser_id', flat=True)[:size]
+    )
+
+
+def notify_chunk(post_id, author_id, after=0):
+    """
+    Notify the next chunk of followers after follower id `after`. Returns the
+    cursor for the following chunk, or None when this was the last one.
+    """
+    from posts.models import Post
+
+    config = get_config()
+    followers = follower_chunk(author_id, after, config['FAN_OUT_CHUNK'])
+    if not followers:
+        return None
+    muted = set(Mute.objects.filter(muted_id=author_id, user_id__in=followers).values_list('user_id', flat=True))
+    post_type = ContentType.objects.get_for_model(Post)
+
+    by_shard = {}
+    for user_id, (alias, moving) in placements(user_id for user_id in followers if user_id not in muted).items():
+        if moving:
+            # Their notifications are being copied to another shard: retry the chunk later
+            raise UserMoving()
+        by_shard.setdefault(alias, []).append(user_id)
+    for alias, recipients in by_shard.items():
+        notifications = Notification.objects.using(alias)
+        with transaction.atomic(using=alias):
+            # Left over from an earlier attempt at this chunk
+            done = set(notifications.filter(
+                target_content_type=post_type, target_object_id=post_id, recipient_id__in=recipients,
+            ).values_list('recipient_id', flat=True))
+            notifications.bulk_create([
+                Notification(
+                    recipient_id=user_id, actor_id=author_id, verb=config['VERB'],
+                    target_content_type=post_type, target_object_id=post_id,
+                )
+                for user_id in recipients if user_id not in done
+            ])
+    return followers[-1] if len(followers) == config['FAN_OUT_CHUNK'] else None
@@ -0,0 +1,43 @@
+# Generated by Django 6.0 on 2026-10-19 09:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class AlterFieldOffDefault(migrations.AlterField):
+    """
+    AlterField that changes the schema of every database but 'default'. The
+    shards other than 'default' hold rows of users who only exist on
+    'default', so their user foreign keys cannot have constraints; 'default'
+    keeps them, whether sharding is on or not.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.alias != 'default':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.alias != 'default':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AlterFieldOffDefault(
+            model_name='notification',
+            name='recipient',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL),
+        ),
+        AlterFieldOffDefault(
+            model_name='notification',
+            name='actor',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='actor_notifications', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-19 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0002_user_keys_without_constraints'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient', '-timestamp'], name='notif_recipient_time_idx'),
+        ),
+    ]
@@ -3,15 +3,42 @@ from django.db import models
 from django.conf import settings
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
+from posts.sharding import ShardedQuerySet
 
 class Notification(models.Model):
-    recipient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='notifications')
-    actor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='actor_notifications')
+    # No DB constraints on the user keys, notifications may live on another shard than users
+    recipient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='notifications', db_constraint=False)
+    actor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='actor_notifications', db_constraint=False)
     verb = models.CharField(max_length=255) # e.g., "liked your post"
     target_content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, null=True, blank=True)
     target_object_id = models.PositiveIntegerField(null=True, blank=True)
     target = GenericForeignKey('target_content_type', 'target_object_id')
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    objects = ShardedQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['recipient', '-timestamp'], name='notif_recipient_time_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.actor} {self.verb} {self.target}"
+
+class Mute(models.Model):
+    """`user` gets no new-post notifications (notifications/fanout.py) from `muted`."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='mutes')
+    muted = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='muted_by')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'muted'], name='unique_mute'),
+        ]
+        indexes = [
+            # Fan-out: which of a chunk of followers muted the author
+            models.Index(fields=['muted', 'user'], name='mute_muted_user_idx'),
+        ]
+
     def __str__(self):
-        return f"{self.actor} {self.verb} {self.target}"
\ No newline at end of file
+        return f"{self.user} muted {self.muted}"
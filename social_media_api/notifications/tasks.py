@@ -0,0 +1,34 @@
+# notifications/tasks.py
+from django.db import transaction
+
+from jobs.registry import task
+from posts.sharding import check_not_moving, shards_for_users
+
+from . import fanout
+from .models import Notification
+
+
+@task(name='notifications.fan_out_post')
+def fan_out_post(post_id, author_id, after=0):
+    """Notify one chunk of the author's followers (notifications/fanout.py), then queue the next."""
+    with transaction.atomic():
+        cursor = fanout.notify_chunk(post_id, author_id, after)
+        if cursor is not None:
+            fan_out_post.enqueue(post_id=post_id, author_id=author_id, after=cursor)
+
+
+@task(name='notifications.notify', max_attempts=10)  # backs off for hours: outlasts a move
+def notify(recipient_ids, actor_id, verb, target_type_id, target_id):
+    """Notify users whose notifications were held back while they moved shard. Retried while they still are."""
+    check_not_moving(recipient_ids)
+    by_shard = {}
+    for user_id, alias in shards_for_users(recipient_ids).items():
+        by_shard.setdefault(alias, []).append(user_id)
+    for alias, recipients in by_shard.items():
+        Notification.objects.using(alias).bulk_create([
+            Notification(
+                recipient_id=user_id, actor_id=actor_id, verb=verb,
+                target_content_type_id=target_type_id, target_object_id=target_id,
+            )
+            for user_id in recipients
+        ])
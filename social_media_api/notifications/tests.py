@@ -1,3 +1,53 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
 
-# Create your tests here.
+from accounts.models import CustomUser
+from jobs.models import Job
+from jobs.worker import Worker
+from posts.models import Post
+from . import fanout
+from .models import Mute, Notification
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, NOTIFICATIONS={'FAN_OUT_CHUNK': 2, 'MAX_PER_WINDOW': 2})
+class FanOutTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = CustomUser.objects.create_user(username='author', password='password')
+        self.followers = [CustomUser.objects.create_user(username=f'follower{i}', password='password') for i in range(5)]
+        self.author.followers.add(*self.followers)
+        self.client.force_authenticate(self.author)
+
+    def test_new_posts_notify_followers_in_chunks(self):
+        Mute.objects.create(user=self.followers[1], muted=self.author)
+        response = self.client.post(reverse('post-list'), {'title': 'Hello', 'content': '...'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(Notification.objects.exists())  # not on the request path
+
+        Worker(workers=1, pool='inline').run(burst=True)
+        recipients = set(Notification.objects.filter(actor=self.author).values_list('recipient', flat=True))
+        self.assertEqual(recipients, {user.pk for user in self.followers} - {self.followers[1].pk})
+        # 5 followers in chunks of 2
+        self.assertEqual(Job.objects.filter(name='notifications.fan_out_post', status=Job.DONE).count(), 3)
+
+    def test_a_retried_chunk_does_not_notify_twice(self):
+        post = Post.objects.create(author=self.author, title='Hello', content='...')
+        self.assertEqual(fanout.notify_chunk(post.pk, self.author.pk), self.followers[1].pk)
+        self.assertEqual(fanout.notify_chunk(post.pk, self.author.pk), self.followers[1].pk)
+        self.assertEqual(Notification.objects.count(), 2)
+
+    def test_fan_outs_are_rate_capped_per_author(self):
+        for title in ('One', 'Two', 'Three'):
+            self.client.post(reverse('post-list'), {'title': title, 'content': '...'})
+        self.assertEqual(Job.objects.filter(name='notifications.fan_out_post').count(), 2)
+
+    def test_mute_and_unmute(self):
+        self.client.force_authenticate(self.followers[0])
+        url = reverse('mute_user', args=[self.author.pk])
+        self.assertEqual(self.client.post(url).status_code, status.HTTP_200_OK)
+        self.assertTrue(Mute.objects.filter(user=self.followers[0], muted=self.author).exists())
+        self.assertEqual(self.client.delete(url).status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Mute.objects.exists())
@@ -1,7 +1,8 @@
 # notifications/urls.py
 from django.urls import path
-from .views import NotificationListView
+from .views import MuteUserView, NotificationListView
 
 urlpatterns = [
     path('', NotificationListView.as_view(), name='notifications_list'),
-]
\ No newline at end of file
+    path('mutes/<int:user_id>/', MuteUserView.as_view(), name='mute_user'),
+]
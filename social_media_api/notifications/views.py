@@ -1,7 +1,11 @@
 # notifications/views.py
-from rest_framework import generics, permissions
-from .models import Notification
+from django.contrib.auth import get_user_model
+from django.shortcuts import get_object_or_404
+from rest_framework import generics, permissions, status
+from rest_framework.response import Response
+from .models import Mute, Notification
 from .serializers import NotificationSerializer
+from posts.sharding import for_user
 
 class NotificationListView(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -9,4 +13,21 @@ class NotificationListView(generics.ListAPIView):
 
     def get_queryset(self):
         # Return notifications for the current user, newest first
-        return Notification.objects.filter(recipient=self.request.user).order_by('-timestamp')
\ No newline at end of file
+        # Notifications live on the recipient's shard
+        return for_user(Notification.objects.all(), self.request.user.pk).filter(recipient=self.request.user).order_by('-timestamp').prefetch_related('actor')
+
+class MuteUserView(generics.GenericAPIView):
+    """POST mutes the user's new-post notifications, DELETE unmutes them."""
+    permission_classes = [permissions.IsAuthenticated]
+    queryset = Mute.objects.all()
+
+    def post(self, request, user_id):
+        user_to_mute = get_object_or_404(get_user_model(), pk=user_id)
+        if request.user == user_to_mute:
+            return Response({"error": "You cannot mute yourself"}, status=status.HTTP_400_BAD_REQUEST)
+        Mute.objects.get_or_create(user=request.user, muted=user_to_mute)
+        return Response({"message": f"You muted {user_to_mute.username}"}, status=status.HTTP_200_OK)
+
+    def delete(self, request, user_id):
+        Mute.objects.filter(user=request.user, muted_id=user_id).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,52 @@
+# posts/async_views.py
+"""Async post list and feed for the ASGI entry point (see social_media_api/async_generics.py)."""
+from asgiref.sync import sync_to_async
+from conditional import ConditionalRequestMixin
+from rest_framework import status
+from rest_framework.response import Response
+
+from social_media_api.async_generics import AsyncListAPIView
+
+from .sharding import is_sharded
+from .views import FeedView, PostViewSet
+
+
+class AsyncPostListView(ConditionalRequestMixin, AsyncListAPIView):
+    """
+    GET /api/posts/ for authenticated users, with the same filtering and
+    validators as PostViewSet.list. Anonymous GETs are served from the
+    response cache and writes by PostViewSet; both are handed to it.
+    """
+    queryset = PostViewSet.queryset
+    serializer_class = PostViewSet.serializer_class
+    permission_classes = PostViewSet.permission_classes
+    filter_backends = PostViewSet.filter_backends
+    search_fields = PostViewSet.search_fields
+    conditional_related = PostViewSet.conditional_related
+    sync_view = staticmethod(PostViewSet.as_view({'get': 'list', 'post': 'create'}))
+    action = 'list'
+
+    def get_queryset(self):
+        return super().get_queryset().prefetch_related('author', 'comments__author')
+
+    async def get(self, request, *args, **kwargs):
+        if is_sharded() or not request.user.is_authenticated:
+            # The scatter-gather over shards and the response cache are sync
+            return await self.delegate(request, *args, **kwargs)
+        queryset = await self.aget_filtered_queryset()
+        page = await self.apaginate_queryset(queryset)
+        etag, last_modified = await sync_to_async(self.get_list_validators)(queryset, page)
+        if self.not_modified(etag, last_modified):
+            return self.with_validators(Response(status=status.HTTP_304_NOT_MODIFIED), etag, last_modified)
+        if page is None:
+            response = await self.alist(queryset)
+        else:
+            response = self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return self.with_validators(response, etag, last_modified)
+
+    async def post(self, request, *args, **kwargs):
+        return await self.delegate(request, *args, **kwargs)
+
+
+class AsyncFeedView(AsyncListAPIView, FeedView):
+    pass
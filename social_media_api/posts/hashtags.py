@@ -0,0 +1,84 @@
+# posts/hashtags.py
+"""
+Hashtag extraction and the Tag / PostTag index.
+
+Tags are parsed when a post is saved (posts/signals.py). Tag rows carry
+post_count and a decayed trending_score (posts/ranking.py) that are updated
+in place, so neither the tag pages nor the trending list aggregate at
+request time.
+
+Tags live on 'default' and PostTag rows on the post's shard, so a counter
+and its rows are written in separate transactions: a failure between the
+two leaves the counter off. Decrements stop at 0, and the
+reconcile_tag_counts command recounts the counters from the PostTag rows.
+"""
+import re
+
+from django.conf import settings
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from .models import PostTag, Tag
+from .ranking import add_event
+
+# '#' not preceded by a word character or another '#', at least one letter
+HASHTAG_RE = re.compile(r'(?<![\w#])#(\w*[^\W\d]\w*)')
+MAX_TAG_LENGTH = 64
+
+
+def trending_half_life():
+    return getattr(settings, 'TRENDING_TAGS_HALF_LIFE_HOURS', 24)
+
+
+def extract_hashtags(*texts):
+    """Normalized (case-folded), de-duplicated tag names in order of appearance."""
+    names = {}
+    for text in texts:
+        for match in HASHTAG_RE.finditer(text or ''):
+            names.setdefault(match.group(1).casefold()[:MAX_TAG_LENGTH], None)
+    return list(names)
+
+
+def get_tag_ids(names):
+    """Map tag names to ids, creating the missing tags."""
+    if not names:
+        return {}
+    Tag.objects.bulk_create([Tag(name=name) for name in names], ignore_conflicts=True)
+    return dict(Tag.objects.filter(name__in=names).values_list('name', 'id'))
+
+
+def decremented():
+    # post_count - 1, but never below 0 (a PositiveIntegerField) when it drifted
+    return Greatest(F('post_count') - 1, 0)
+
+
+def sync_post_tags(post, when=None, created=False):
+    """
+    Bring the post's PostTag rows and the tag counters in line with its text.
+    Newly added tags get a trending event at `when` (default now).
+    """
+    names = extract_hashtags(post.title, post.content)
+    if created and not names:
+        return
+    db = post._state.db
+    existing = set() if created else set(PostTag.objects.using(db).filter(post=post).values_list('tag_id', flat=True))
+    wanted = set(get_tag_ids(names).values())
+    added, removed = wanted - existing, existing - wanted
+    if added:
+        PostTag.objects.using(db).bulk_create([
+            PostTag(post=post, tag_id=tag_id, created_at=post.created_at) for tag_id in added
+        ])
+        Tag.objects.filter(pk__in=added).update(
+            post_count=F('post_count') + 1,
+            trending_score=add_event('trending_score', trending_half_life(), when),
+        )
+    if removed:
+        PostTag.objects.using(db).filter(post=post, tag_id__in=removed).delete()
+        Tag.objects.filter(pk__in=removed).update(post_count=decremented())
+
+
+def remove_post_tags(post):
+    """Decrement the counters of a post's tags; its PostTag rows go with the post."""
+    tag_ids = list(PostTag.objects.using(post._state.db).filter(post=post).values_list('tag_id', flat=True))
+    if tag_ids:
+        Tag.objects.filter(pk__in=tag_ids).update(post_count=decremented())
@@ -0,0 +1,67 @@
+import math
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from posts.models import Comment, Like, Post, PostScore
+from posts.ranking import event_score
+from posts.sharding import get_shards
+from posts.trending import get_config, prune_threshold
+
+
+class Command(BaseCommand):
+    help = (
+        'Compute trending scores for posts that have none, e.g. posts from before trending scores '
+        'existed or from bulk imports (new posts, likes and comments are scored on save). '
+        'Replays the post, its likes and its comments at their own dates. Skips posts whose score '
+        'has decayed below TRENDING_POSTS["PRUNE_BELOW"]. Safe to re-run: existing scores are left as they are.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        config = get_config()
+        half_life = config['HALF_LIFE_HOURS']
+        threshold = prune_threshold()
+        started = time.perf_counter()
+        total = 0
+        for alias in get_shards():
+            last_pk = 0
+            while True:
+                # Keyset over the primary key: constant cost per chunk
+                chunk = list(
+                    Post.objects.using(alias).filter(pk__gt=last_pk, trending__isnull=True).order_by('pk')
+                    .values_list('pk', 'created_at')[:options['chunk_size']]
+                )
+                if not chunk:
+                    break
+                last_pk = chunk[-1][0]
+
+                # Every event's score, per post: the post itself, its likes and comments
+                events = defaultdict(list)
+                for post_id, created_at in chunk:
+                    events[post_id].append(event_score(created_at, half_life, config['POST_WEIGHT']))
+                post_ids = list(events)
+                for model, weight in ((Like, config['LIKE_WEIGHT']), (Comment, config['COMMENT_WEIGHT'])):
+                    rows = model.objects.using(alias).filter(post_id__in=post_ids).values_list('post_id', 'created_at')
+                    for post_id, created_at in rows.iterator():
+                        events[post_id].append(event_score(created_at, half_life, weight))
+
+                scores = [
+                    PostScore(post_id=post_id, score=logsumexp(values))
+                    for post_id, values in events.items()
+                ]
+                live = [score for score in scores if score.score >= threshold]
+                # ignore_conflicts: a like or comment may have scored the post meanwhile
+                PostScore.objects.using(alias).bulk_create(live, ignore_conflicts=True)
+                total += len(live)
+            self.stdout.write(f'{alias}: scored up to post {last_pk}')
+        self.stdout.write(self.style.SUCCESS(f'Backfilled {total} post scores in {time.perf_counter() - started:.1f}s'))
+
+
+def logsumexp(values):
+    """log(sum(exp(v))) without overflow: the score of several events (see posts/ranking.py)."""
+    top = max(values)
+    return top + math.log(sum(math.exp(value - top) for value in values))
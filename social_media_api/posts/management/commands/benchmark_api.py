@@ -0,0 +1,279 @@
+# posts/management/commands/benchmark_api.py
+import asyncio
+import json
+import random
+import re
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from notifications.models import Notification
+from posts.models import Like, Post, PostScore
+from posts.sharding import for_post, for_user, get_shards
+
+User = get_user_model()
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def asgi_request(application, method, url, key):
+    """Make one request to an ASGI application, as an ASGI server would. Returns (status, headers)."""
+    path, _, query = url.partition('?')
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': method.upper(), 'scheme': 'https', 'path': path, 'raw_path': path.encode(),
+        'query_string': query.encode(), 'root_path': '',
+        'headers': [(b'host', b'testserver'), (b'authorization', f'Token {key}'.encode())],
+        'client': ('127.0.0.1', 0), 'server': ('testserver', 443),
+    }
+    body_sent = False
+
+    async def receive():
+        nonlocal body_sent
+        if body_sent:
+            # The client stays connected: wait until the handler stops listening
+            await asyncio.Event().wait()
+        body_sent = True
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    start = {}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            start.update(message)
+
+    await application(scope, receive, send)
+    return start['status'], {name.lower(): value for name, value in start['headers']}
+
+
+def header_queries(headers):
+    # Counted by ServerTimingMiddleware
+    match = re.search(rb'desc="(\d+) queries"', headers.get(b'server-timing', b''))
+    return int(match.group(1)) if match else 0
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive the social API endpoints concurrently through the in-process WSGI '
+        'and/or ASGI handler and report latency percentiles, throughput and queries '
+        'per request. Under ASGI the feed, post list and notifications are served by '
+        'async views (social_media_api/asgi_urls.py). Run it against a seeded '
+        'database (see seed_social). The likes and follows it makes, and the tokens '
+        'it creates, are deleted afterwards.'
+    )
+
+    # Endpoints that write: every request likes / follows something new, and
+    # what they made is deleted after each run
+    WRITES = ('like', 'follow')
+
+    # name -> (method, function building the URL from a random post id)
+    ENDPOINTS = {
+        'feed': ('get', lambda post_id: reverse('user_feed')),
+        'post_list': ('get', lambda post_id: reverse('post-list')),
+        'post_detail': ('get', lambda post_id: reverse('post-detail', args=[post_id])),
+        'trending': ('get', lambda post_id: reverse('post-trending')),
+        'like': ('post', lambda post_id: reverse('like_post', args=[post_id])),
+        'follow': ('post', None),
+        'notifications': ('get', lambda post_id: reverse('notifications_list')),
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--mode', choices=['wsgi', 'asgi', 'both'], default='wsgi',
+                            help='WSGI: a thread per concurrent request. ASGI: concurrent tasks on one event loop')
+        parser.add_argument('--endpoints', default=','.join(self.ENDPOINTS),
+                            help='Comma separated subset of: ' + ', '.join(self.ENDPOINTS))
+        parser.add_argument('--users', type=int, default=100, help='Distinct users to authenticate as')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        endpoints = [name.strip() for name in options['endpoints'].split(',') if name.strip()]
+        unknown = set(endpoints) - set(self.ENDPOINTS)
+        if unknown:
+            raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+        rng = random.Random(options['seed'])
+        # Authenticate as a fixed, ordered set of users so runs are comparable
+        users = list(User.objects.filter(is_active=True).order_by('id')[:options['users']])
+        # The newest posts of every shard
+        post_ids = sorted((
+            post_id for alias in get_shards()
+            for post_id in Post.objects.using(alias).order_by('-id').values_list('id', flat=True)[:10000]
+        ), reverse=True)[:10000]
+        if not users or not post_ids:
+            raise CommandError('The database is empty, run seed_social first')
+        tokens = [Token.objects.get_or_create(user=user) for user in users]
+        keys = [token.key for token, _ in tokens]
+        user_ids = [user.pk for user in users]
+        if 'trending' in endpoints:
+            # Only posts with a PostScore row are candidates: score the seeded ones
+            call_command('backfill_post_scores', stdout=self.stderr)
+
+        modes = ['wsgi', 'asgi'] if options['mode'] == 'both' else [options['mode']]
+        report = {
+            'requests_per_endpoint': options['requests'],
+            'concurrency': options['concurrency'],
+            'seed': options['seed'],
+            'modes': modes,
+            'post_scores': sum(PostScore.objects.using(alias).count() for alias in get_shards()),
+            'endpoints': {},
+        }
+        try:
+            self.run_endpoints(report, endpoints, modes, rng, keys, user_ids, post_ids, options)
+        finally:
+            Token.objects.filter(pk__in=[token.pk for token, created in tokens if created]).delete()
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                fh.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def run_endpoints(self, report, endpoints, modes, rng, keys, user_ids, post_ids, options):
+        actors = dict(zip(keys, user_ids))
+        for name in endpoints:
+            if name not in self.WRITES:
+                jobs = [(rng.choice(keys), rng.choice(post_ids), rng.choice(user_ids)) for _ in range(options['requests'])]
+            report['endpoints'][name] = {}
+            for mode in modes:
+                # Both modes replay the same reads; writes get new jobs each time
+                if name in self.WRITES:
+                    jobs = self.write_jobs(name, rng, keys, actors, post_ids, options['requests'])
+                run = self.run_endpoint if mode == 'wsgi' else self.run_endpoint_asgi
+                try:
+                    result = report['endpoints'][name][mode] = run(name, jobs, options['concurrency'])
+                finally:
+                    if name in self.WRITES:
+                        self.undo(name, jobs, actors)
+                self.stderr.write(
+                    f"{name:14} {mode} p50={result['p50_ms']:8.2f}ms "
+                    f"p95={result['p95_ms']:8.2f}ms "
+                    f"p99={result['p99_ms']:8.2f}ms "
+                    f"{result['throughput_rps']:8.1f} req/s "
+                    f"{result['queries_per_request']:6.2f} queries/req"
+                )
+
+    def write_jobs(self, name, rng, keys, actors, post_ids, count):
+        """
+        `count` (key, post id, user id) jobs that each like a post / follow a
+        user for the first time, so that none of them is answered 400.
+        """
+        user_ids = list(actors.values())
+        if name == 'like':
+            # post_ids are the newest posts: an id range
+            taken = {
+                pair for alias in get_shards()
+                for pair in Like.objects.using(alias).filter(user_id__in=user_ids, post_id__gte=min(post_ids))
+                .values_list('user_id', 'post_id')
+            }
+        else:
+            Follow = User.followers.through
+            taken = set(Follow.objects.filter(to_customuser_id__in=user_ids).values_list('to_customuser_id', 'from_customuser_id'))
+            taken.update((user_id, user_id) for user_id in user_ids)
+        jobs = []
+        for _ in range(count * 10):
+            key, post_id, user_id = rng.choice(keys), rng.choice(post_ids), rng.choice(user_ids)
+            pair = (actors[key], post_id if name == 'like' else user_id)
+            if pair not in taken:
+                taken.add(pair)
+                jobs.append((key, post_id, user_id))
+                if len(jobs) == count:
+                    break
+        return jobs
+
+    def undo(self, name, jobs, actors):
+        """Delete the likes (with their notifications) or follows that `jobs` made."""
+        if name == 'follow':
+            Follow = User.followers.through
+            for key, _, user_id in jobs:
+                Follow.objects.filter(to_customuser_id=actors[key], from_customuser_id=user_id).delete()
+            return
+        post_type = ContentType.objects.get_for_model(Post)
+        for key, post_id, _ in jobs:
+            for_post(Like.objects.all(), post_id).filter(user_id=actors[key], post_id=post_id).delete()
+            author_id = for_post(Post.objects.all(), post_id).values_list('author_id', flat=True).first()
+            for_user(Notification.objects.all(), author_id).filter(
+                actor_id=actors[key], verb='liked your post', target_content_type=post_type, target_object_id=post_id,
+            ).delete()
+
+    def run_endpoint(self, name, jobs, concurrency):
+        method, build_url = self.ENDPOINTS[name]
+
+        def call(job):
+            key, post_id, user_id = job
+            # One client per call keeps the threads independent
+            client = Client(HTTP_AUTHORIZATION=f'Token {key}')
+            url = build_url(post_id) if build_url else reverse('follow_user', args=[user_id])
+            try:
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    response = getattr(client, method)(url, secure=True)
+                    elapsed = time.perf_counter() - start
+                return elapsed, len(queries), response.status_code
+            finally:
+                close_old_connections()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(call, jobs))
+        return self.summarize(method, results, time.perf_counter() - started)
+
+    def run_endpoint_asgi(self, name, jobs, concurrency):
+        method, build_url = self.ENDPOINTS[name]
+
+        async def drive(application):
+            limit = asyncio.Semaphore(concurrency)
+
+            async def call(job):
+                key, post_id, user_id = job
+                url = build_url(post_id) if build_url else reverse('follow_user', args=[user_id])
+                async with limit:
+                    start = time.perf_counter()
+                    code, headers = await asgi_request(application, method, url, key)
+                    return time.perf_counter() - start, header_queries(headers), code
+
+            started = time.perf_counter()
+            results = await asyncio.gather(*(call(job) for job in jobs))
+            return results, time.perf_counter() - started
+
+        # Query counts come from the Server-Timing header
+        with override_settings(ROOT_URLCONF='social_media_api.asgi_urls', SERVER_TIMING_HEADER=True):
+            results, wall = asyncio.run(drive(ASGIHandler()))
+        return self.summarize(method, results, wall)
+
+    def summarize(self, method, results, wall):
+        latencies = [elapsed * 1000 for elapsed, _, _ in results]
+        statuses = {}
+        for _, _, code in results:
+            statuses[str(code)] = statuses.get(str(code), 0) + 1
+        return {
+            'method': method.upper(),
+            'requests': len(results),
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+            'mean_ms': round(statistics.fmean(latencies), 3),
+            'throughput_rps': round(len(results) / wall, 2),
+            'queries_per_request': round(statistics.fmean(q for _, q, _ in results), 2),
+            'status_codes': statuses,
+        }
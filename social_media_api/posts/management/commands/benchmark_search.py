@@ -0,0 +1,122 @@
+import itertools
+import json
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import filters
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from posts.management.commands.benchmark_api import percentile
+from posts.management.commands.seed_social import WORDS, chunked
+from posts.models import Post
+from posts.search import FullTextSearchFilter, search_available
+from posts.utils import explicit_timestamps
+from posts.views import PostViewSet
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the LIKE based SearchFilter with the full-text FullTextSearchFilter '
+        'on the post list query (first page + count). Tops the posts table up to '
+        '--posts synthetic posts first. Use a scratch database (DATABASE_URL).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1_000_000, help='Make sure at least this many posts exist')
+        parser.add_argument('--queries', type=int, default=50, help='Search queries per backend')
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--chunk-size', type=int, default=10000)
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        vocabulary = self.vocabulary(rng)
+        self.top_up(rng, vocabulary, options['posts'], options['chunk_size'])
+        if not search_available(Post.objects.db):
+            self.stderr.write('No full-text index on this database, FullTextSearchFilter will fall back to LIKE')
+
+        # Mostly single word queries over the top of the vocabulary, some two word ones
+        queries = [
+            ' '.join(rng.choice(vocabulary[:2000]) for _ in range(rng.choice((1, 1, 2))))
+            for _ in range(options['queries'])
+        ]
+        report = {'posts': Post.objects.count(), 'queries': len(queries), 'backends': {}}
+        for name, backend in (('like', filters.SearchFilter()), ('fulltext', FullTextSearchFilter())):
+            report['backends'][name] = self.run(backend, queries, options['page_size'])
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def vocabulary(self, rng, size=20000):
+        """The seed words plus made-up ones, most frequent first."""
+        syllables = ['ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'ti', 'vo', 'ze', 'pa', 'qui', 'dor', 'len', 'mar']
+        words = list(WORDS)
+        seen = set(words)
+        while len(words) < size:
+            word = ''.join(rng.choices(syllables, k=rng.randint(2, 4)))
+            if word not in seen:
+                seen.add(word)
+                words.append(word)
+        return words
+
+    def top_up(self, rng, vocabulary, total, chunk_size):
+        missing = total - Post.objects.count()
+        if missing <= 0:
+            return
+        author, _ = User.objects.get_or_create(
+            username='search_bench', defaults={'password': make_password(None)},
+        )
+        # Word frequencies follow Zipf's law, like natural text
+        cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+        now = timezone.now()
+        started = time.perf_counter()
+        posts = (
+            Post(
+                author=author,
+                title=' '.join(rng.choices(vocabulary, cum_weights=cum_weights, k=rng.randint(2, 6))).capitalize(),
+                content=' '.join(rng.choices(vocabulary, cum_weights=cum_weights, k=rng.randint(10, 60))),
+                created_at=now - timedelta(seconds=rng.randint(0, 365 * 24 * 3600)),
+                updated_at=now,
+            )
+            for _ in range(missing)
+        )
+        with explicit_timestamps(Post):
+            for chunk in chunked(posts, chunk_size):
+                with transaction.atomic():
+                    Post.objects.bulk_create(chunk)
+        self.stderr.write(f'Created {missing} posts in {time.perf_counter() - started:.1f}s')
+
+    def run(self, backend, queries, page_size):
+        factory = APIRequestFactory()
+        view = PostViewSet(action='list', kwargs={})
+        timings = []
+        for query in queries:
+            request = Request(factory.get('/', {'search': query}))
+            view.request = request
+            started = time.perf_counter()
+            queryset = backend.filter_queryset(request, PostViewSet.queryset.all(), view)
+            # What the paginated list endpoint runs: a count and the first page
+            queryset.count()
+            list(queryset[:page_size])
+            timings.append((time.perf_counter() - started) * 1000)
+        return {
+            'mean_ms': round(statistics.mean(timings), 2),
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+        }
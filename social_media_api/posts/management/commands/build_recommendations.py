@@ -0,0 +1,76 @@
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts import recommendations
+from posts.models import Recommendation
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild every user's recommended posts from recent likes (item-item "
+        "collaborative filtering, see posts/recommendations.py). Run it periodically, e.g. nightly."
+    )
+
+    def add_arguments(self, parser):
+        config = recommendations.get_config()
+        parser.add_argument('--days', type=int, default=config['WINDOW_DAYS'], help='Use likes from this many days back')
+        parser.add_argument('--neighbours', type=int, default=config['NEIGHBOURS'], help='Similar posts kept per post')
+        parser.add_argument('--top-n', type=int, default=config['TOP_N'], help='Candidates stored per user')
+        parser.add_argument('--block-size', type=int, default=1000, help='Users (and posts) per matrix block')
+        parser.add_argument('--chunk-size', type=int, default=100000, help='Likes read per query')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Worker processes scoring user blocks (0 = score in this process)')
+
+    def handle(self, *args, **options):
+        started = timezone.now()
+        clock = time.perf_counter()
+
+        user_ids, post_ids, author_ids = recommendations.load_likes(
+            started - timedelta(days=options['days']), options['chunk_size'],
+        )
+        self.stdout.write(f'Loaded {len(user_ids)} likes in {time.perf_counter() - clock:.1f}s')
+        author_of = recommendations.post_authors(post_ids, author_ids)
+        matrix, users, posts = recommendations.build_matrix(user_ids, post_ids)
+        del user_ids, post_ids, author_ids
+
+        clock = time.perf_counter()
+        neighbours = recommendations.item_neighbours(matrix, options['neighbours'], options['block_size'])
+        self.stdout.write(
+            f'{matrix.shape[0]} users x {matrix.shape[1]} posts, {neighbours.nnz} neighbour links '
+            f'in {time.perf_counter() - clock:.1f}s'
+        )
+
+        clock = time.perf_counter()
+        block_size = options['block_size']
+        blocks = [(start, min(start + block_size, len(users))) for start in range(0, len(users), block_size)]
+        stored = 0
+        if options['workers']:
+            # The matrices go to each worker once; tasks are just block bounds.
+            # At most two blocks per worker are in flight, so finished results
+            # cannot pile up while we write them.
+            with ProcessPoolExecutor(
+                options['workers'], initializer=recommendations.init_worker,
+                initargs=(matrix, neighbours, options['top_n']),
+            ) as executor:
+                pending = deque()
+                for block in blocks + [None] * (2 * options['workers']):
+                    if block is not None:
+                        pending.append((block, executor.submit(recommendations.recommend_block_in_worker, block)))
+                    if pending and (block is None or len(pending) > 2 * options['workers']):
+                        (start, stop), future = pending.popleft()
+                        stored += recommendations.store_block(users[start:stop], users, posts, author_of, *future.result())
+        else:
+            for start, stop in blocks:
+                result = recommendations.recommend_block(matrix, neighbours, start, stop, options['top_n'])
+                stored += recommendations.store_block(users[start:stop], users, posts, author_of, *result)
+
+        # Users without recent likes: their old candidates are stale
+        Recommendation.objects.filter(created_at__lt=started).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored {stored} recommendations for {len(users)} users in {time.perf_counter() - clock:.1f}s'
+        ))
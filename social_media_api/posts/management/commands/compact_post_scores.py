@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import PostScore
+from posts.sharding import get_shards
+from posts.trending import get_config, prune_threshold
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete trending scores that have decayed below TRENDING_POSTS["PRUNE_BELOW"], '
+        'keeping the score table (and its index) down to live candidates. Run it periodically, e.g. hourly.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        threshold = prune_threshold()
+        total = 0
+        for alias in get_shards():
+            while True:
+                # Small batches keep each delete transaction (and lock) short
+                batch = list(
+                    PostScore.objects.using(alias).filter(score__lt=threshold)
+                    .values_list('pk', flat=True)[:options['batch_size']]
+                )
+                if not batch:
+                    break
+                PostScore.objects.using(alias).filter(pk__in=batch).delete()
+                total += len(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f"Pruned {total} post scores below {get_config()['PRUNE_BELOW']}"
+        ))
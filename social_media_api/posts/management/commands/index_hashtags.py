@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.hashtags import sync_post_tags
+from posts.models import Post
+from posts.sharding import get_shards
+
+
+class Command(BaseCommand):
+    help = (
+        'Parse hashtags of existing posts into Tag / PostTag (new posts are indexed on save). '
+        'Safe to re-run: posts already indexed are left as they are.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--after-id', type=int, default=0, help='Only index posts with a larger id')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        total = 0
+        for alias in get_shards():
+            last_pk = options['after_id']
+            while True:
+                # Keyset over the primary key: constant cost per chunk
+                chunk = list(
+                    Post.objects.using(alias).filter(pk__gt=last_pk).order_by('pk')
+                    .only('pk', 'title', 'content', 'created_at')[:options['chunk_size']]
+                )
+                if not chunk:
+                    break
+                # One commit per chunk and database (tags live on 'default') rather than per statement
+                with transaction.atomic(using='default'), transaction.atomic(using=alias):
+                    for post in chunk:
+                        # Trending credit at the post's own date, so old posts barely count
+                        sync_post_tags(post, when=post.created_at)
+                last_pk = chunk[-1].pk
+                total += len(chunk)
+            self.stdout.write(f'{alias}: indexed up to post {last_pk}')
+        self.stdout.write(self.style.SUCCESS(f'Indexed {total} posts in {time.perf_counter() - started:.1f}s'))
@@ -0,0 +1,105 @@
+# posts/management/commands/move_user_shard.py
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from notifications.models import Notification
+from posts.models import Comment, Like, Mention, Post, PostScore, PostTag, ShardAssignment
+from posts.sharding import forget_user, get_shards, placements
+from posts.utils import explicit_timestamps
+
+# Models whose ids come from each shard's own sequence: the same id may be
+# taken on the target, so their rows are copied under new ids. Nothing refers
+# to them by id.
+PER_SHARD_IDS = (Like, PostTag, Mention, Notification)
+
+
+class Command(BaseCommand):
+    help = (
+        "Move a user's posts (with their comments, likes, tags, scores and mentions) and notifications to "
+        "another shard and pin the user there. Writes to those rows are refused (503) while they are "
+        "copied, and after a failure until the command is run again: it resumes the move."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_id', type=int)
+        parser.add_argument('target', help='Database alias of the destination shard')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        user_id, target, batch_size = options['user_id'], options['target'], options['batch_size']
+        if target not in get_shards():
+            raise CommandError(f"'{target}' is not in DATABASE_SHARDS ({', '.join(get_shards())})")
+        source, moving = placements([user_id])[user_id]
+        if source != target:
+            # 0. Refuse writes to the user's rows, so none is left behind on the source
+            self.hold(user_id, source)
+            rows, post_ids = self.copy(user_id, source, target, batch_size)
+            # 2. Point the user at the new shard; reads and writes switch over from here
+            self.assign(user_id, target, post_ids)
+            self.stdout.write(
+                f'Copied user {user_id} from {source} to {target}: '
+                + ', '.join(f'{len(objects)} {model._meta.verbose_name_plural}' for model, objects in rows)
+            )
+        elif moving:
+            # A failed move elsewhere, given up: the rows never left, release them
+            self.assign(user_id, target, [])
+
+        # 3. Remove the old copies. Also finishes a move that stopped after step 2:
+        # then the user is already on the target and the copies are left elsewhere.
+        for alias in get_shards():
+            if alias != target:
+                post_ids = self.remove(user_id, alias)
+                forget_user(user_id, post_ids)
+        self.stdout.write(self.style.SUCCESS(f'User {user_id} is on {target}'))
+
+    def copy(self, user_id, source, target, batch_size):
+        """Step 1: copy the user's rows to the target, in one transaction."""
+        posts = Post.objects.using(source).filter(author_id=user_id)
+        post_ids = list(posts.values_list('id', flat=True))
+        rows = [
+            (Post, list(posts)),
+            (Comment, list(Comment.objects.using(source).filter(post_id__in=post_ids))),
+            (Like, list(Like.objects.using(source).filter(post_id__in=post_ids))),
+            (PostTag, list(PostTag.objects.using(source).filter(post_id__in=post_ids))),
+            (PostScore, list(PostScore.objects.using(source).filter(post_id__in=post_ids))),
+            (Mention, list(Mention.objects.using(source).filter(post_id__in=post_ids))),
+            (Notification, list(Notification.objects.using(source).filter(recipient_id=user_id))),
+        ]
+
+        # Keep timestamps. Posts and comments keep their (global) ids, PostScore
+        # rows are keyed by their post.
+        for model, objects in rows:
+            if model in PER_SHARD_IDS:
+                for obj in objects:
+                    obj.pk = None
+        with explicit_timestamps(Post, Comment, Like, Notification), transaction.atomic(using=target):
+            # Copies made by an earlier run that stopped before step 2
+            self.remove(user_id, target)
+            for model, objects in rows:
+                model.objects.using(target).bulk_create(objects, batch_size=batch_size)
+        return rows, post_ids
+
+    def hold(self, user_id, source):
+        ShardAssignment.objects.using('default').update_or_create(
+            user_id=user_id, defaults={'alias': source, 'moving': True},
+        )
+        forget_user(user_id)
+
+    def assign(self, user_id, target, post_ids):
+        ShardAssignment.objects.using('default').update_or_create(
+            user_id=user_id, defaults={'alias': target, 'moving': False},
+        )
+        forget_user(user_id, post_ids)
+
+    def remove(self, user_id, alias):
+        """
+        Delete the user's posts (comments, likes, tags, scores and mentions
+        cascade) and notifications from one shard. Returns the post ids.
+        """
+        post_ids = list(Post.objects.using(alias).filter(author_id=user_id).values_list('id', flat=True))
+        with transaction.atomic(using=alias):
+            # PostTag rows go first so deleting the posts does not decrement the tag counters
+            PostTag.objects.using(alias).filter(post_id__in=post_ids).delete()
+            Post.objects.using(alias).filter(id__in=post_ids).delete()
+            Notification.objects.using(alias).filter(recipient_id=user_id).delete()
+        return post_ids
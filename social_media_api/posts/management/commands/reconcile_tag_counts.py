@@ -0,0 +1,42 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from posts.models import PostTag, Tag
+from posts.sharding import get_shards
+
+
+class Command(BaseCommand):
+    help = (
+        'Recount Tag.post_count from the PostTag rows on every shard and fix the counters that drifted '
+        '(the counters and the rows are not written in one transaction). Run it periodically, e.g. daily.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        counts = Counter()
+        for alias in get_shards():
+            # One GROUP BY per shard, over the (tag, created_at) index
+            counts.update(dict(
+                PostTag.objects.using(alias).order_by().values_list('tag_id').annotate(n=Count('*'))
+            ))
+
+        fixed, last_pk = 0, 0
+        while True:
+            # Keyset over the primary key: constant cost per chunk
+            chunk = list(
+                Tag.objects.filter(pk__gt=last_pk).order_by('pk').only('pk', 'post_count')[:options['chunk_size']]
+            )
+            if not chunk:
+                break
+            drifted = [tag for tag in chunk if tag.post_count != counts[tag.pk]]
+            for tag in drifted:
+                self.stdout.write(f'#{tag.pk}: {tag.post_count} -> {counts[tag.pk]}')
+                tag.post_count = counts[tag.pk]
+            Tag.objects.bulk_update(drifted, ['post_count'])
+            fixed += len(drifted)
+            last_pk = chunk[-1].pk
+        self.stdout.write(self.style.SUCCESS(f'Fixed {fixed} tag counters'))
@@ -0,0 +1,240 @@
+# posts/management/commands/seed_social.py
+import bisect
+import itertools
+import math
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from notifications.models import Notification
+from posts.models import Comment, Like, Post
+from posts.sharding import allocate_ids, get_shards, is_sharded, shards_for_users
+from posts.utils import explicit_timestamps
+
+User = get_user_model()
+
+WORDS = (
+    'django api python social feed post like follow coffee music travel code '
+    'weekend photo garden city river mountain book movie game team launch '
+    'release bug fix idea design data cloud morning night summer winter'
+).split()
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a realistic social graph (power-law followers, posts, comments, '
+        'likes and notifications) for load testing, then index the new posts\' hashtags '
+        'and trending scores. Deterministic for a given --seed. With DATABASE_SHARDS, rows go '
+        'to their owner\'s shard.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--posts-per-user', type=float, default=5, help='Average posts per user')
+        parser.add_argument('--follows-per-user', type=float, default=20, help='Average accounts followed per user')
+        parser.add_argument('--likes-per-post', type=float, default=8)
+        parser.add_argument('--comments-per-post', type=float, default=2)
+        parser.add_argument('--alpha', type=float, default=1.1, help='Power-law exponent for popularity')
+        parser.add_argument('--days', type=int, default=30, help='Spread content over this many past days')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows per bulk_create / transaction')
+        parser.add_argument('--prefix', default='seed', help='Username prefix for generated users')
+        parser.add_argument('--password', default='password', help='Password shared by all generated users')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.chunk_size = options['chunk_size']
+        self.now = timezone.now().replace(microsecond=0)
+        self.span = options['days'] * 24 * 3600
+        prefix = options['prefix']
+
+        if User.objects.filter(username__startswith=f'{prefix}_').exists():
+            raise CommandError(f"Users with prefix '{prefix}_' already exist, use another --prefix or delete them first")
+
+        started = time.perf_counter()
+        with explicit_timestamps(Post, Comment, Like, Notification):
+            user_ids = self.create_users(options['users'], prefix, options['password'])
+            self.shards = shards_for_users(user_ids)
+            # Popularity by rank: the first users are the "celebrities"
+            weights = [1 / (rank + 1) ** options['alpha'] for rank in range(len(user_ids))]
+            cum_weights = list(itertools.accumulate(weights))
+            self.create_follows(user_ids, cum_weights, options['follows_per_user'])
+            posts = self.create_posts(user_ids, cum_weights, options['posts_per_user'])
+            self.create_comments(user_ids, posts, options['comments_per_post'])
+            self.create_likes_and_notifications(user_ids, posts, options['likes_per_post'])
+
+        # bulk_create sends no signals: fill in what saving the posts one by one would have
+        if posts:
+            call_command('index_hashtags', after_id=posts[0][0] - 1, stdout=self.stdout)
+        call_command('backfill_post_scores', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f'Done in {time.perf_counter() - started:.1f}s'))
+
+    # Helpers
+
+    def pick(self, population, cum_weights):
+        """Weighted pick (power-law) using a precomputed cumulative weight table."""
+        x = self.rng.random() * cum_weights[-1]
+        return population[bisect.bisect(cum_weights, x)]
+
+    def random_time(self, after=None):
+        start = after or self.now - timedelta(seconds=self.span)
+        seconds = max(int((self.now - start).total_seconds()), 1)
+        return start + timedelta(seconds=self.rng.randrange(seconds))
+
+    def sentence(self, words):
+        return ' '.join(self.rng.choice(WORDS) for _ in range(words))
+
+    def hashtags(self):
+        # Zero to two hashtags, so tag pages and trending tags have data
+        return ''.join(f' #{self.rng.choice(WORDS)}' for _ in range(self.rng.choice((0, 1, 1, 2))))
+
+    def geometric_count(self, mean):
+        """
+        Per-item count with the requested mean and a long tail (geometric
+        distribution): most items get a few, some get many.
+        """
+        if mean <= 0:
+            return 0
+        return int(math.log(1.0 - self.rng.random()) / math.log(mean / (mean + 1)))
+
+    def bulk_insert(self, model, rows, ignore_conflicts=False, shard_of=None):
+        """
+        Insert rows in chunks, one transaction per chunk and shard. Returns the
+        row count. `shard_of(row)` gives the shard of a sharded model's row;
+        posts and comments then take their ids from the global allocator.
+        """
+        total = 0
+        for chunk in chunked(rows, self.chunk_size):
+            if model in (Post, Comment) and is_sharded():
+                for row, pk in zip(chunk, allocate_ids(len(chunk))):
+                    row.pk = pk
+            by_shard = {}
+            for row in chunk:
+                by_shard.setdefault(shard_of(row) if shard_of else None, []).append(row)
+            for alias, objects in by_shard.items():
+                with transaction.atomic(using=alias):
+                    model.objects.db_manager(alias).bulk_create(
+                        objects, batch_size=self.chunk_size, ignore_conflicts=ignore_conflicts,
+                    )
+            total += len(chunk)
+        return total
+
+    # Shards of the sharded rows (see posts/sharding.py)
+
+    def author_shard(self, row):
+        return self.shards[row.author_id]
+
+    def post_shard(self, row):
+        return self.post_shards[row.post_id]
+
+    def recipient_shard(self, row):
+        return self.shards[row.recipient_id]
+
+    # Generators
+
+    def create_users(self, count, prefix, password):
+        # Hash once and share it: create_user would spend ~100ms per user in the hasher
+        hashed = make_password(password)
+        total = self.bulk_insert(User, (
+            User(username=f'{prefix}_{i}', email=f'{prefix}_{i}@example.com', password=hashed,
+                 bio=self.sentence(8), date_joined=self.random_time())
+            for i in range(count)
+        ))
+        self.stdout.write(f'  users: {total}')
+        # bulk_create does not return ids on every backend, so read them back in order
+        return list(
+            User.objects.filter(username__startswith=f'{prefix}_')
+            .order_by('id').values_list('id', flat=True)
+        )
+
+    def create_follows(self, user_ids, cum_weights, follows_per_user):
+        Follow = User.followers.through
+
+        def rows():
+            for follower in user_ids:
+                targets = {self.pick(user_ids, cum_weights) for _ in range(self.geometric_count(follows_per_user))}
+                targets.discard(follower)
+                for target in targets:
+                    # "follower follows target", same row as follower.following.add(target)
+                    yield Follow(from_customuser_id=target, to_customuser_id=follower)
+
+        self.stdout.write(f'  follows: {self.bulk_insert(Follow, rows(), ignore_conflicts=True)}')
+
+    def create_posts(self, user_ids, cum_weights, posts_per_user):
+        total = int(len(user_ids) * posts_per_user)
+        # Popular accounts post more often too
+        authors = [self.pick(user_ids, cum_weights) for _ in range(total)]
+        last_id = max(
+            Post.objects.using(alias).order_by('-id').values_list('id', flat=True).first() or 0
+            for alias in get_shards()
+        )
+        total = self.bulk_insert(Post, (
+            Post(author_id=author, title=self.sentence(4).capitalize(), content=self.sentence(30) + self.hashtags(),
+                 created_at=created, updated_at=created)
+            for author, created in ((author, self.random_time()) for author in authors)
+        ), shard_of=self.author_shard)
+        self.stdout.write(f'  posts: {total}')
+        # (id, author_id, created_at) of everything we just created, in id order:
+        # the ids after the last one from before (an id range, not a huge IN list)
+        generated = set(user_ids)
+        posts = sorted(
+            row for alias in get_shards()
+            for row in Post.objects.using(alias).filter(id__gt=last_id).values_list('id', 'author_id', 'created_at')
+            if row[1] in generated
+        )
+        self.post_shards = {post_id: self.shards[author_id] for post_id, author_id, _ in posts}
+        return posts
+
+    def create_comments(self, user_ids, posts, comments_per_post):
+        def rows():
+            for post_id, _, created in posts:
+                for _ in range(self.geometric_count(comments_per_post)):
+                    when = self.random_time(after=created)
+                    yield Comment(post_id=post_id, author_id=self.rng.choice(user_ids),
+                                  content=self.sentence(12), created_at=when, updated_at=when)
+
+        self.stdout.write(f'  comments: {self.bulk_insert(Comment, rows(), shard_of=self.post_shard)}')
+
+    def create_likes_and_notifications(self, user_ids, posts, likes_per_post):
+        post_type = ContentType.objects.get_for_model(Post)
+        likes, notifications = [], []
+        like_total = notification_total = 0
+
+        for post_id, author_id, created in posts:
+            likers = {self.rng.choice(user_ids) for _ in range(self.geometric_count(likes_per_post))}
+            for liker in likers:
+                when = self.random_time(after=created)
+                likes.append(Like(post_id=post_id, user_id=liker, created_at=when))
+                # Mirrors LikePostView: no notification for liking your own post
+                if liker != author_id:
+                    notifications.append(Notification(
+                        recipient_id=author_id, actor_id=liker, verb='liked your post',
+                        target_content_type=post_type, target_object_id=post_id, timestamp=when,
+                    ))
+            # Flush periodically so memory stays bounded for large runs
+            if len(likes) >= self.chunk_size:
+                like_total += self.bulk_insert(Like, likes, ignore_conflicts=True, shard_of=self.post_shard)
+                notification_total += self.bulk_insert(Notification, notifications, shard_of=self.recipient_shard)
+                likes, notifications = [], []
+
+        like_total += self.bulk_insert(Like, likes, ignore_conflicts=True, shard_of=self.post_shard)
+        notification_total += self.bulk_insert(Notification, notifications, shard_of=self.recipient_shard)
+        self.stdout.write(f'  likes: {like_total}')
+        self.stdout.write(f'  notifications: {notification_total}')
@@ -0,0 +1,93 @@
+# posts/mentions.py
+"""
+@mention extraction and the Mention index.
+
+Mentions are parsed when a post or comment is saved (posts/signals.py).
+The names in a text are resolved with one username__in query, whatever
+their number. Mention rows live on the post's shard and answer "posts
+mentioning me" (MentionsView). Users mentioned for the first time in a
+text are notified with one bulk insert per shard.
+"""
+import re
+
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+
+from notifications.models import Notification
+
+from .models import Comment, Mention, Post
+from .sharding import placements
+
+# '@' not preceded by a word character (e-mail addresses), then a username
+# (letters, digits and . + - _) not ending in punctuation
+MENTION_RE = re.compile(r'(?<![\w@.+-])@([\w.+-]*\w)')
+MAX_USERNAME_LENGTH = 150
+MAX_MENTIONS = 20  # per text, so a post cannot notify everybody
+
+
+def extract_mentions(*texts):
+    """De-duplicated usernames in order of appearance, at most MAX_MENTIONS."""
+    names = {}
+    for text in texts:
+        for match in MENTION_RE.finditer(text or ''):
+            names.setdefault(match.group(1)[:MAX_USERNAME_LENGTH], None)
+    return list(names)[:MAX_MENTIONS]
+
+
+def resolve_usernames(names):
+    """Map the usernames that exist to user ids, in one query."""
+    if not names:
+        return {}
+    return dict(get_user_model().objects.filter(username__in=names).values_list('username', 'id'))
+
+
+def sync_mentions(instance, created=False):
+    """Bring the Mention rows of a post or comment in line with its text and notify new mentions."""
+    if isinstance(instance, Post):
+        post_id, comment, texts = instance.pk, None, (instance.title, instance.content)
+    else:
+        post_id, comment, texts = instance.post_id, instance, (instance.content,)
+    names = extract_mentions(*texts)
+    if created and not names:
+        return
+    rows = Mention.objects.using(instance._state.db).filter(post_id=post_id, comment=comment)
+    existing = set() if created else set(rows.values_list('user_id', flat=True))
+    wanted = set(resolve_usernames(names).values())
+    added, removed = wanted - existing, existing - wanted
+    if added:
+        rows.bulk_create([
+            Mention(post_id=post_id, comment=comment, user_id=user_id, created_at=instance.created_at)
+            for user_id in sorted(added)
+        ])
+        notify_mentioned(instance, added - {instance.author_id})
+    if removed:
+        rows.filter(user_id__in=removed).delete()
+
+
+def notify_mentioned(instance, user_ids):
+    if not user_ids:
+        return
+    from notifications.tasks import notify
+    target_type = ContentType.objects.get_for_model(instance)
+    verb = 'mentioned you in a comment' if isinstance(instance, Comment) else 'mentioned you in a post'
+    # Notifications live on each recipient's shard
+    by_shard, moving = {}, []
+    for user_id, (alias, is_moving) in placements(sorted(user_ids)).items():
+        if is_moving:
+            moving.append(user_id)
+        else:
+            by_shard.setdefault(alias, []).append(user_id)
+    for alias, recipients in by_shard.items():
+        Notification.objects.using(alias).bulk_create([
+            Notification(
+                recipient_id=user_id, actor_id=instance.author_id, verb=verb,
+                target_content_type=target_type, target_object_id=instance.pk,
+            )
+            for user_id in recipients
+        ])
+    if moving:
+        # Their notifications are being copied to another shard: notify them once they are moved
+        notify.enqueue(
+            recipient_ids=moving, actor_id=instance.author_id, verb=verb,
+            target_type_id=target_type.pk, target_id=instance.pk,
+        )
@@ -0,0 +1,82 @@
+# Generated by Django 6.0 on 2026-10-19 11:05
+
+from django.db import migrations
+
+# The DDL is copied here rather than imported from posts/search.py: this
+# migration must keep creating the same schema whatever that module becomes.
+FTS_TABLE = 'posts_post_fts'
+
+SQLITE_SCHEMA = [
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        title, content, content='posts_post', content_rowid='id', tokenize='porter unicode61'
+    )""",
+    f"""CREATE TRIGGER posts_post_fts_insert AFTER INSERT ON posts_post BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END""",
+    f"""CREATE TRIGGER posts_post_fts_delete AFTER DELETE ON posts_post BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+    END""",
+    f"""CREATE TRIGGER posts_post_fts_update AFTER UPDATE OF title, content ON posts_post BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO {FTS_TABLE}(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END""",
+    # Index the rows that already exist
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+SQLITE_DROP = [
+    'DROP TRIGGER IF EXISTS posts_post_fts_insert',
+    'DROP TRIGGER IF EXISTS posts_post_fts_delete',
+    'DROP TRIGGER IF EXISTS posts_post_fts_update',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+POSTGRES_SCHEMA = [
+    """ALTER TABLE posts_post ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(content, '')), 'B')
+    ) STORED""",
+    'CREATE INDEX posts_post_search_idx ON posts_post USING GIN (search_vector)',
+]
+
+POSTGRES_DROP = [
+    'DROP INDEX IF EXISTS posts_post_search_idx',
+    'ALTER TABLE posts_post DROP COLUMN IF EXISTS search_vector',
+]
+
+
+def sqlite_has_fts5(connection):
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        return any(option == 'ENABLE_FTS5' for option, in cursor.fetchall())
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        # Without FTS5 the search filter falls back to LIKE
+        statements = SQLITE_SCHEMA if sqlite_has_fts5(connection) else []
+    elif connection.vendor == 'postgresql':
+        statements = POSTGRES_SCHEMA
+    else:
+        statements = []
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for statement in {'sqlite': SQLITE_DROP, 'postgresql': POSTGRES_DROP}.get(vendor, []):
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_hot_query_indexes'),
+    ]
+
+    operations = [
+        # FTS5 table + triggers on SQLite, tsvector column + GIN index on PostgreSQL
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 6.0 on 2026-10-19 12:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0005_post_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True)),
+                ('post_count', models.PositiveIntegerField(default=0)),
+                ('trending_score', models.FloatField(blank=True, db_index=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PostTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='post_tags', to='posts.post')),
+                ('tag', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='post_tags', to='posts.tag')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['tag', '-created_at'], name='posttag_tag_created_idx')],
+                'unique_together': {('post', 'tag')},
+            },
+        ),
+    ]
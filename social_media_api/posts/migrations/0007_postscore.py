@@ -0,0 +1,24 @@
+# Generated by Django 6.0 on 2026-10-19 13:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_tags'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostScore',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trending', serialize=False, to='posts.post')),
+                ('score', models.FloatField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-score'], name='postscore_score_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_postsearchindex'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shardassignment',
+            name='moving',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -1,34 +1,171 @@
 # posts/models.py
 from django.db import models
 from django.conf import settings
+from .search import FTS_TABLE, FullTextField
+from .sharding import ShardedQuerySet
 
 class Post(models.Model):
-    author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='posts')
+    # db_constraint=False on user foreign keys: with sharding (posts/sharding.py)
+    # the users table lives on 'default' while the row may live on another shard.
+    # Migration 0003 only drops the constraints on the other shards, and
+    # sharding.delete_user_rows() does the cascade there.
+    author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='posts', db_constraint=False)
     title = models.CharField(max_length=200)
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ShardedQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at'], name='post_created_idx'),  # post list
+            models.Index(fields=['author', '-created_at'], name='post_author_created_idx'),  # feed / author pages
+            models.Index(fields=['updated_at'], name='post_updated_idx'),  # Last-Modified of the list
+        ]
+
     def __str__(self):
         return self.title
 
 class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
-    author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='comments')
+    author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='comments', db_constraint=False)
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ShardedQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at'], name='comment_created_idx'),  # comment list
+            models.Index(fields=['post', '-created_at'], name='comment_post_created_idx'),  # a post's comments
+            models.Index(fields=['updated_at'], name='comment_updated_idx'),  # Last-Modified of the list
+        ]
+
     def __str__(self):
         return f'Comment by {self.author} on {self.post}'
 
 class Like(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='likes')
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='likes')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='likes', db_constraint=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = ShardedQuerySet.as_manager()
+
     class Meta:
         unique_together = ('post', 'user')  # Prevent multiple likes from same user
+        indexes = [
+            # The unique constraint covers (post, user); this covers "what did this user like"
+            models.Index(fields=['user', 'post'], name='like_user_post_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.user} liked {self.post}"
\ No newline at end of file
+        return f"{self.user} liked {self.post}"
+
+class Tag(models.Model):
+    """A hashtag. Counters are maintained on write (posts/hashtags.py). Lives on 'default'."""
+    name = models.CharField(max_length=64, unique=True)  # case-folded, without '#'
+    post_count = models.PositiveIntegerField(default=0)
+    # Log of the time-decayed post count, see posts/ranking.py
+    trending_score = models.FloatField(null=True, blank=True, db_index=True)
+
+    def __str__(self):
+        return f"#{self.name}"
+
+class PostTag(models.Model):
+    """Posting list entry: `post` uses `tag`. Lives on the post's shard."""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='post_tags')
+    # db_constraint=False: tags live on 'default', the row on the post's shard
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name='post_tags', db_constraint=False)
+    created_at = models.DateTimeField()  # copy of post.created_at, so a tag's posts page by date
+
+    objects = ShardedQuerySet.as_manager()
+
+    class Meta:
+        unique_together = ('post', 'tag')
+        indexes = [
+            models.Index(fields=['tag', '-created_at'], name='posttag_tag_created_idx'),  # a tag's posts
+        ]
+
+    def __str__(self):
+        return f"{self.post_id} #{self.tag_id}"
+
+class Mention(models.Model):
+    """`user` is @mentioned in `post`, or in `comment` on it (posts/mentions.py). Lives on the post's shard."""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='mentions')
+    comment = models.ForeignKey(Comment, on_delete=models.CASCADE, null=True, blank=True, related_name='mentions')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='mentions', db_constraint=False)
+    created_at = models.DateTimeField()  # copy of the post's / comment's, so a user's mentions page by date
+
+    objects = ShardedQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='mention_user_created_idx'),  # "mentioning me"
+        ]
+
+    def __str__(self):
+        return f"@{self.user_id} in {self.post_id}"
+
+class PostScore(models.Model):
+    """Trending score of a post, updated per like/comment (posts/trending.py). Lives on the post's shard."""
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True, related_name='trending')
+    # Log of the time-decayed engagement weight, see posts/ranking.py
+    score = models.FloatField()
+
+    objects = ShardedQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-score'], name='postscore_score_idx'),  # trending page
+        ]
+
+    def __str__(self):
+        return f"{self.post_id}: {self.score:.3f}"
+
+class Recommendation(models.Model):
+    """A candidate post for a user's recommended feed, written by build_recommendations. Lives on 'default'."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='recommendations')
+    # Plain ids: the post may live on any shard, its author's shard says which
+    post_id = models.BigIntegerField()
+    author_id = models.BigIntegerField()
+    score = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-score'], name='rec_user_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} -> {self.post_id} ({self.score:.3f})"
+
+class ShardAssignment(models.Model):
+    """Pins a user to a shard, overriding the hash placement. Lives on 'default'."""
+    user_id = models.BigIntegerField(unique=True)
+    alias = models.CharField(max_length=100)
+    # Set while move_user_shard copies the user's rows: writes to them are refused
+    moving = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f"user {self.user_id} -> {self.alias}"
+
+class GlobalId(models.Model):
+    """Allocates post/comment ids that are unique across shards. Lives on 'default'."""
+    id = models.BigAutoField(primary_key=True)
+
+class PostSearchIndex(models.Model):
+    """
+    The SQLite full-text index of posts (posts/search.py), so that searches
+    can join it. Created by migration 0005_post_search, not managed by Django.
+    """
+    post = models.OneToOneField(
+        Post, on_delete=models.DO_NOTHING, primary_key=True, db_column='rowid', db_constraint=False,
+        related_name='search_index',
+    )
+    document = FullTextField(db_column=FTS_TABLE)
+
+    class Meta:
+        managed = False
+        db_table = FTS_TABLE
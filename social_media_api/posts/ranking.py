@@ -0,0 +1,52 @@
+# posts/ranking.py
+"""
+Time-decayed scores that can be updated with a single UPDATE.
+
+A decayed count is sum(weight * 2 ** (-age / half_life)) over past events.
+Storing it directly would mean rewriting every row as time passes, so we
+store its logarithm relative to a fixed epoch instead:
+
+    score = log(sum(weight * exp(rate * (t - EPOCH))))
+
+Every row decays at the same rate, so ordering by the stored score is the
+same as ordering by the current decayed count, and adding an event is
+score = logaddexp(score, rate * (t - EPOCH) + log(weight)), which stays
+within float range however far t is from the epoch.
+"""
+import math
+from datetime import datetime, timezone as dt_timezone
+
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Abs, Exp, Greatest, Ln
+from django.utils import timezone
+
+EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def decay_rate(half_life_hours):
+    return math.log(2) / (half_life_hours * 3600)
+
+
+def event_score(when, half_life_hours, weight=1.0):
+    """The score of a single event of `weight` at `when`."""
+    return decay_rate(half_life_hours) * (when - EPOCH).total_seconds() + math.log(weight)
+
+
+def add_event(field, half_life_hours, when=None, weight=1.0):
+    """
+    Expression for `.update(field=add_event('field', ...))`: adds an event to
+    a nullable score column (NULL means no events yet).
+    """
+    value = Value(event_score(when or timezone.now(), half_life_hours, weight), output_field=FloatField())
+    return Case(
+        When(**{f'{field}__isnull': True}, then=value),
+        default=Greatest(F(field), value) + Ln(1 + Exp(-Abs(F(field) - value))),
+        output_field=FloatField(),
+    )
+
+
+def current_value(score, half_life_hours, now=None):
+    """The decayed count a stored score stands for, as of `now`."""
+    if score is None:
+        return 0.0
+    return math.exp(score - event_score(now or timezone.now(), half_life_hours))
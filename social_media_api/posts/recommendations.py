@@ -0,0 +1,168 @@
+# posts/recommendations.py
+"""
+Item-item collaborative filtering over likes.
+
+The batch side (build_recommendations command) runs in these steps:
+
+1. Read recent likes in keyset chunks into NumPy arrays (no model
+   instances), and build a sparse user x post matrix X.
+2. Item neighbours: cosine similarity between post columns, computed a
+   block of columns at a time and pruned to the NEIGHBOURS most similar
+   posts per post, so the similarity matrix never exists in full.
+3. For each block of users: scores = X_block @ neighbours. Drop posts the
+   user already liked and store the TOP_N best as Recommendation rows.
+
+Memory is bounded by the like arrays plus one block at a time. The read side
+(RecommendedFeedView) merges the stored candidates with recent posts.
+"""
+from django.conf import settings
+from django.db import transaction
+
+from .sharding import get_shards
+
+# NumPy/SciPy and the models are imported where used: web processes that only
+# read recommendations never load NumPy, and pool workers (which may be
+# spawned without Django set up) only need the matrix functions.
+
+# Defaults, override any of them with RECOMMENDATIONS in settings.py
+DEFAULTS = {
+    'WINDOW_DAYS': 30,    # likes (and so candidate posts) from this many days back
+    'NEIGHBOURS': 50,     # similar posts kept per post
+    'TOP_N': 100,         # candidates stored per user
+    'FRESH_EVERY': 3,     # the read endpoint puts a recent post in every n-th slot
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'RECOMMENDATIONS', {})}
+
+
+def load_likes(since, chunk_size=100000):
+    """(user_ids, post_ids, author_ids) arrays of the likes created since `since`, from every shard."""
+    import numpy as np
+    from .models import Like
+
+    users, posts, authors = [], [], []
+    for alias in get_shards():
+        last_pk = 0
+        while True:
+            rows = list(
+                Like.objects.using(alias).filter(pk__gt=last_pk, created_at__gte=since).order_by('pk')
+                .values_list('pk', 'user_id', 'post_id', 'post__author_id')[:chunk_size]
+            )
+            if not rows:
+                break
+            chunk = np.array(rows, dtype=np.int64)
+            users.append(chunk[:, 1])
+            posts.append(chunk[:, 2])
+            authors.append(chunk[:, 3])
+            last_pk = rows[-1][0]
+    if not users:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    return np.concatenate(users), np.concatenate(posts), np.concatenate(authors)
+
+
+def post_authors(post_ids, author_ids):
+    """{post id: author id}, built from each post's first like rather than from every like."""
+    import numpy as np
+
+    posts, first = np.unique(post_ids, return_index=True)
+    return dict(zip(posts.tolist(), author_ids[first].tolist()))
+
+
+def build_matrix(user_ids, post_ids):
+    """Binary user x post CSR matrix plus the ids behind its rows and columns."""
+    import numpy as np
+    from scipy import sparse
+
+    users, rows = np.unique(user_ids, return_inverse=True)
+    posts, cols = np.unique(post_ids, return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=(len(users), len(posts)),
+    )
+    matrix.data[:] = 1  # duplicates (a like copied between shards) count once
+    return matrix, users, posts
+
+
+def top_k_per_row(matrix, k):
+    """Keep the k largest entries of each row of a CSR matrix."""
+    import numpy as np
+    from scipy import sparse
+
+    rows, cols, data = [], [], []
+    for row in range(matrix.shape[0]):
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        values = matrix.data[start:end]
+        if len(values) > k:
+            keep = np.argpartition(-values, k)[:k]
+        else:
+            keep = np.arange(len(values))
+        rows.append(np.full(len(keep), row))
+        cols.append(matrix.indices[start:end][keep])
+        data.append(values[keep])
+    if not rows:
+        return sparse.csr_matrix(matrix.shape, dtype=np.float32)
+    return sparse.csr_matrix(
+        (np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))), shape=matrix.shape,
+    )
+
+
+def item_neighbours(matrix, k, block_size=2000):
+    """Post x post cosine similarities, each row pruned to its k nearest posts."""
+    import numpy as np
+    from scipy import sparse
+
+    norms = np.sqrt(np.asarray(matrix.sum(axis=0)).ravel())
+    normalized = (matrix @ sparse.diags(1 / np.maximum(norms, 1))).tocsc()
+    transposed = normalized.T.tocsr()
+    blocks = []
+    for start in range(0, matrix.shape[1], block_size):
+        # similarities of this block of posts to every post
+        block = (transposed[start:start + block_size] @ normalized).tocsr()
+        block.setdiag(0, k=start)  # a post is not its own neighbour
+        block.eliminate_zeros()
+        blocks.append(top_k_per_row(block, k))
+    return sparse.vstack(blocks, format='csr') if blocks else sparse.csr_matrix((0, 0), dtype=np.float32)
+
+
+def recommend_block(matrix, neighbours, start, stop, top_n):
+    """(user index, post index, score) arrays of the top_n unseen posts for users start..stop."""
+    import numpy as np
+
+    liked = matrix[start:stop]
+    scores = (liked @ neighbours).tocsr()
+    # Remove what the user has already liked
+    scores = scores - scores.multiply(liked > 0)
+    scores.eliminate_zeros()
+    best = top_k_per_row(scores, top_n).tocoo()
+    return best.row + start, best.col, best.data
+
+
+# Worker processes get the matrices once, through the pool initializer
+_worker_state = {}
+
+
+def init_worker(matrix, neighbours, top_n):
+    _worker_state.update(matrix=matrix, neighbours=neighbours, top_n=top_n)
+
+
+def recommend_block_in_worker(bounds):
+    state = _worker_state
+    return recommend_block(state['matrix'], state['neighbours'], bounds[0], bounds[1], state['top_n'])
+
+
+def store_block(block_user_ids, user_ids, post_ids, author_of, users, posts, scores):
+    """Replace the stored recommendations of the users in block_user_ids."""
+    from .models import Recommendation
+    objects = [
+        Recommendation(
+            user_id=int(user_ids[user]), post_id=int(post_ids[post]),
+            author_id=author_of[int(post_ids[post])], score=float(score),
+        )
+        for user, post, score in zip(users, posts, scores)
+    ]
+    with transaction.atomic():
+        Recommendation.objects.filter(user_id__in=[int(user_id) for user_id in block_user_ids]).delete()
+        Recommendation.objects.bulk_create(objects, batch_size=5000)
+    return len(objects)
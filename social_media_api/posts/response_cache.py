@@ -0,0 +1,170 @@
+# posts/response_cache.py
+"""
+Shared response cache for anonymous GETs of the public post/comment API.
+
+Entries hold the serialized data of a response, keyed on the path, the
+sorted query parameters and the negotiated format. Each entry records the
+version of every tag (surrogate key) it depends on: the collection
+('posts'), one tag per object in it ('post:12') and one per author shown
+in it ('author:alice'). Signals
+(posts/signals.py) invalidate a tag by giving it a new version, which
+makes every entry recorded under the old one a miss. Nothing has to be
+found and deleted.
+
+An invalidated or expired entry is rebuilt by one worker at a time; the
+others serve the previous entry until it is replaced (cachekit.stampede).
+
+Entries keep the ETag and Last-Modified set by ConditionalRequestMixin
+(conditional.mixins), so cached and uncached responses carry the same
+validators. If-None-Match answers 304.
+"""
+import hashlib
+import json
+import uuid
+from urllib.parse import urlencode
+
+from cachekit import stampede
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import patch_vary_headers
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+# Defaults, override any of them with RESPONSE_CACHE in settings.py
+DEFAULTS = {
+    'ALIAS': 'default',   # which entry of CACHES to use
+    'TIMEOUT': 300,       # seconds an entry lives even if nothing invalidates it
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'RESPONSE_CACHE', {})}
+
+
+def get_cache():
+    return caches[get_config()['ALIAS']]
+
+
+def tag_key(tag):
+    return f'respcache:tag:{tag}'
+
+
+def tag_versions(tags):
+    """Current version of each tag, creating versions for unknown tags."""
+    cache = get_cache()
+    keys = {tag: tag_key(tag) for tag in tags}
+    found = cache.get_many(keys.values())
+    versions = {}
+    for tag, key in keys.items():
+        if key not in found:
+            # A fresh random version: a tag evicted from the cache must not
+            # come back with a version old entries were stored under
+            cache.add(key, uuid.uuid4().hex, None)
+            found[key] = cache.get(key)
+        versions[tag] = found[key]
+    return versions
+
+
+def author_tag(username):
+    return f'author:{username}'
+
+
+def invalidate(*tags, using=None):
+    """Give the tags new versions, now and again when the transaction on `using` commits."""
+    def bump():
+        get_cache().set_many({tag_key(tag): uuid.uuid4().hex for tag in tags}, None)
+    bump()
+    # The second bump drops entries filled from the pre-commit state in between
+    transaction.on_commit(bump, using=using)
+
+
+def request_key(request):
+    params = sorted((key, value) for key, values in request.query_params.lists() for value in values if value != '')
+    raw = f'{request.path}?{urlencode(params)}|{request.accepted_renderer.format}'
+    return 'respcache:' + hashlib.sha256(raw.encode()).hexdigest()
+
+
+def make_entry(response, tags):
+    # Store plain JSON types: DRF's ReturnDict/ReturnList keep a reference to their serializer
+    return {
+        'data': json.loads(json.dumps(response.data, cls=JSONEncoder)),
+        'etag': response.get('ETag'),
+        'last_modified': response.get('Last-Modified'),
+        'tags': tags,
+    }
+
+
+class AnonymousCacheMixin:
+    """
+    For ModelViewSets: serves list/retrieve to anonymous clients from the
+    response cache. Add it before ConditionalRequestMixin, whose validators
+    the entries keep. Set `cache_tag_prefix` (per object) and
+    `cache_collection_tag`; invalidate them through `invalidate()`.
+    Every object's `author`, and its embedded comments' authors, add an
+    'author:<username>' tag.
+
+    Authenticated requests bypass the cache unless `cache_authenticated` is
+    set, for views whose responses carry no per-user fields.
+    """
+    cache_tag_prefix = None
+    cache_collection_tag = None
+    cache_authenticated = False
+
+    def list(self, request, *args, **kwargs):
+        return self.cached(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached(super().retrieve, request, *args, **kwargs)
+
+    def get_cache_tags(self, data):
+        items = data.get('results', [data]) if isinstance(data, dict) else data
+        tags = {f'{self.cache_tag_prefix}:{item["id"]}' for item in items if 'id' in item}
+        for item in items:
+            for shown in [item, *item.get('comments', [])]:
+                if shown.get('author') is not None:
+                    tags.add(author_tag(shown['author']))
+        if 'results' in data or isinstance(data, list):
+            tags.add(self.cache_collection_tag)
+        return tags
+
+    def cached(self, handler, request, *args, **kwargs):
+        if request.user.is_authenticated and not self.cache_authenticated:
+            return handler(request, *args, **kwargs)
+
+        response = None
+
+        def build():
+            nonlocal response
+            # Snapshot the collection version first so a post created while
+            # we query cannot be stamped as already included
+            collection = tag_versions([self.cache_collection_tag])
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return None
+            tags = self.get_cache_tags(response.data)
+            versions = tag_versions(tags - collection.keys())
+            versions.update({tag: version for tag, version in collection.items() if tag in tags})
+            return make_entry(response, versions)
+
+        # One worker rebuilds an invalidated or expired entry, the others
+        # keep serving the old one meanwhile (see cachekit.stampede)
+        entry = stampede.get_or_set(
+            request_key(request), build, get_config()['TIMEOUT'], cache=get_cache(),
+            is_valid=lambda entry: tag_versions(entry['tags']) == entry['tags'],
+        )
+        if entry is None:
+            return response
+        if response is None:
+            response = Response(entry['data'])
+
+        if entry['etag'] and entry['etag'] in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        if entry['etag']:
+            response['ETag'] = entry['etag']
+        if entry['last_modified']:
+            response['Last-Modified'] = entry['last_modified']
+        response['Cache-Control'] = 'no-cache'  # clients may keep it, but revalidate with the ETag
+        patch_vary_headers(response, ['Accept', 'Authorization', 'Cookie'])
+        return response
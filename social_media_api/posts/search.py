@@ -0,0 +1,101 @@
+# posts/search.py
+"""
+Full-text search over posts.
+
+SQLite: an external-content FTS5 table (posts_post_fts) indexing title and
+content, kept in sync with posts_post by triggers.
+PostgreSQL: a generated tsvector column (posts_post.search_vector) with a GIN
+index.
+
+Both are created by migration 0005_post_search and maintained by the database
+itself, so saves, deletes, bulk_create and raw updates all stay in sync.
+Queries join the FTS5 table through the unmanaged PostSearchIndex model.
+"""
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Lookup, TextField
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+FTS_TABLE = 'posts_post_fts'
+
+
+class FullTextField(TextField):
+    """FTS5's hidden column named after its table: the left side of MATCH."""
+
+    def deconstruct(self):
+        # Only adds a lookup: migrations see a TextField and do not import this module
+        name, path, args, kwargs = super().deconstruct()
+        return name, 'django.db.models.TextField', args, kwargs
+
+
+@FullTextField.register_lookup
+class Match(Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', [*lhs_params, *rhs_params]
+
+
+# Per database alias: is the full-text index available?
+_available = {}
+
+
+def search_available(alias):
+    if alias not in _available:
+        connection = connections[alias]
+        if connection.vendor == 'sqlite':
+            _available[alias] = FTS_TABLE in connection.introspection.table_names()
+        elif connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                columns = connection.introspection.get_table_description(cursor, 'posts_post')
+            _available[alias] = any(column.name == 'search_vector' for column in columns)
+        else:
+            _available[alias] = False
+    return _available[alias]
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """
+    Drop-in replacement for SearchFilter on posts (same ?search= parameter):
+    matches through the full-text index and orders by relevance, boosted
+    towards recent posts. Every search term must match, the last one as a
+    prefix so results appear while the user is still typing.
+
+    Falls back to SearchFilter (LIKE over search_fields) when the database
+    has no full-text index.
+    """
+    # Title matches count this many times more than content matches
+    title_weight = 4.0
+    # A post this many days old scores half of an identical new one
+    recency_days = 30
+
+    def filter_queryset(self, request, queryset, view):
+        terms = [word for term in self.get_search_terms(request) for word in re.findall(r'\w+', term)]
+        if not terms or not search_available(queryset.db):
+            return super().filter_queryset(request, queryset, view)
+
+        if connections[queryset.db].vendor == 'sqlite':
+            # Quote each term so FTS5 operators in user input are taken literally
+            match = ' '.join(f'"{term}"' for term in terms) + '*'
+            queryset = queryset.filter(search_index__document__match=match).annotate(search_rank=RawSQL(
+                f'-bm25({FTS_TABLE}, %s, 1.0) / '
+                "(1 + (julianday('now') - julianday(posts_post.created_at)) / %s)",
+                [self.title_weight, self.recency_days], output_field=FloatField(),
+            ))
+        else:
+            tsquery = ' & '.join(terms) + ':*'
+            # ts_rank weights are {D, C, B, A}; title is A, content is B
+            weights = '{0, 0, %s, 1}' % (1 / self.title_weight)
+            matches = RawSQL(
+                "posts_post.search_vector @@ to_tsquery('english', %s)", [tsquery], output_field=BooleanField(),
+            )
+            queryset = queryset.filter(matches).annotate(search_rank=RawSQL(
+                "ts_rank(%s::float4[], posts_post.search_vector, to_tsquery('english', %s)) / "
+                '(1 + EXTRACT(EPOCH FROM (now() - posts_post.created_at)) / 86400 / %s)',
+                [weights, tsquery, self.recency_days], output_field=FloatField(),
+            ))
+        return queryset.order_by('-search_rank', '-created_at')
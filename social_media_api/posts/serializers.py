@@ -1,6 +1,8 @@
 # posts/serializers.py
 from rest_framework import serializers
-from .models import Post, Comment
+from .models import Post, Comment, Tag
+from .hashtags import trending_half_life
+from .ranking import current_value
 from django.contrib.auth import get_user_model
 
 class UserSerializer(serializers.ModelSerializer):
@@ -23,4 +25,15 @@ class PostSerializer(serializers.ModelSerializer):
     class Meta:
         model = Post
         fields = ['id', 'author', 'title', 'content', 'created_at', 'updated_at', 'comments']
-        read_only_fields = ['created_at', 'updated_at']
\ No newline at end of file
+        read_only_fields = ['created_at', 'updated_at']
+
+class TagSerializer(serializers.ModelSerializer):
+    # Posts using the tag, decayed by age (half-life TRENDING_TAGS_HALF_LIFE_HOURS)
+    trending = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Tag
+        fields = ['name', 'post_count', 'trending']
+
+    def get_trending(self, tag):
+        return round(current_value(tag.trending_score, trending_half_life()), 3)
@@ -0,0 +1,324 @@
+# posts/sharding.py
+"""
+User-id sharding for posts, comments, likes and notifications.
+
+Settings:
+    DATABASE_SHARDS: database aliases holding the sharded tables. The default,
+    ['default'], means no sharding and this module stays out of the way.
+
+Placement:
+    * Post lives on its author's shard, Comment, Like, PostTag and PostScore on
+      their post's shard.
+    * Notification lives on its recipient's shard.
+    * A user's shard is hash(user id) unless a ShardAssignment row (written by
+      the move_user_shard command) pins it somewhere else.
+    * Users, tokens, tags, recommendations and the bookkeeping models stay on
+      'default'.
+
+While move_user_shard copies a user's rows, writes to them (saving or
+deleting their posts, comments and likes on them, their notifications) raise
+UserMoving, answered 503 by the API; jobs retry later.
+
+Deleting a user only cascades on 'default', the user's database:
+delete_user_rows deletes their rows on the other shards.
+
+Post and Comment ids come from a global allocator (GlobalId) so that an id is
+unique across shards. Code that reads sharded tables must say which shard to
+use (for_user / for_post) or scatter over all of them
+(ShardedQuerySetList); unqualified queries only see 'default'.
+"""
+import heapq
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models.signals import post_delete, pre_delete, pre_save
+from rest_framework.exceptions import APIException
+
+SHARD_CACHE_TIMEOUT = 300
+
+
+def get_shards():
+    return list(getattr(settings, 'DATABASE_SHARDS', ['default']))
+
+
+def is_sharded():
+    return len(get_shards()) > 1
+
+
+class UserMoving(APIException):
+    status_code = 503
+    default_detail = 'This account is being moved to another database, try again in a moment.'
+    default_code = 'user_moving'
+
+
+def placements(user_ids):
+    """
+    Map user ids to (shard alias, moving), with one cache round trip for the
+    lot. Users being moved are not cached, so their move is seen at once.
+    """
+    shards = get_shards()
+    user_ids = list(user_ids)
+    if len(shards) == 1:
+        return dict.fromkeys(user_ids, (shards[0], False))
+    cached = cache.get_many([f'user-shard:{user_id}' for user_id in user_ids])
+    result = {
+        user_id: (cached[f'user-shard:{user_id}'], False) for user_id in user_ids if f'user-shard:{user_id}' in cached
+    }
+    missing = [user_id for user_id in user_ids if user_id not in result]
+    if missing:
+        from .models import ShardAssignment
+        assigned = {
+            user_id: (alias, moving) for user_id, alias, moving in
+            ShardAssignment.objects.using('default').filter(user_id__in=missing)
+            .values_list('user_id', 'alias', 'moving')
+        }
+        for user_id in missing:
+            # crc32 rather than hash(): stable across processes and restarts
+            result[user_id] = assigned.get(user_id) or (shards[zlib.crc32(str(user_id).encode()) % len(shards)], False)
+        cache.set_many({
+            f'user-shard:{user_id}': result[user_id][0] for user_id in missing if not result[user_id][1]
+        }, SHARD_CACHE_TIMEOUT)
+    return result
+
+
+def shards_for_users(user_ids):
+    """Map user ids to shard aliases."""
+    return {user_id: alias for user_id, (alias, _) in placements(user_ids).items()}
+
+
+def shard_for_user(user_id):
+    return shards_for_users([user_id])[user_id]
+
+
+def check_not_moving(user_ids):
+    """Raise UserMoving if move_user_shard is copying the rows of one of `user_ids`."""
+    if is_sharded() and any(moving for _, moving in placements(user_ids).values()):
+        raise UserMoving()
+
+
+def shard_for_post(post_id):
+    """Find which shard holds a post (cached), or None if it does not exist."""
+    shards = get_shards()
+    if len(shards) == 1:
+        return shards[0]
+    from .models import Post
+    key = f'post-shard:{post_id}'
+    alias = cache.get(key)
+    if alias is None:
+        alias = next(
+            (alias for alias in shards if Post.objects.using(alias).filter(pk=post_id).exists()),
+            None,
+        )
+        if alias is not None:
+            cache.set(key, alias, SHARD_CACHE_TIMEOUT)
+    return alias
+
+
+def forget_user(user_id, post_ids=()):
+    """Drop cached placement after a user's rows were moved."""
+    cache.delete_many([f'user-shard:{user_id}'] + [f'post-shard:{pk}' for pk in post_ids])
+
+
+def for_user(queryset, user_id):
+    """`queryset` on the shard owning `user_id`, unchanged when not sharded."""
+    return queryset.using(shard_for_user(user_id)) if is_sharded() else queryset
+
+
+def for_post(queryset, post_id):
+    """`queryset` on the shard holding post `post_id`, unchanged when not sharded."""
+    return queryset.using(shard_for_post(post_id) or 'default') if is_sharded() else queryset
+
+
+def allocate_id():
+    from .models import GlobalId
+    return GlobalId.objects.using('default').create().pk
+
+
+def allocate_ids(count):
+    """`count` global ids, in one insert where the database returns the new ids."""
+    from .models import GlobalId
+    allocated = GlobalId.objects.using('default').bulk_create([GlobalId() for _ in range(count)])
+    return [obj.pk if obj.pk is not None else allocate_id() for obj in allocated]
+
+
+def assign_global_id(sender, instance, raw=False, **kwargs):
+    # pre_save receiver for Post and Comment
+    if instance.pk is None and not raw and is_sharded():
+        instance.pk = allocate_id()
+
+
+def owner_id(instance):
+    """The user whose shard holds `instance`: its post's author, or its recipient."""
+    from notifications.models import Notification
+    from .models import Post
+    if isinstance(instance, Post):
+        return instance.author_id
+    if isinstance(instance, Notification):
+        return instance.recipient_id
+    post = type(instance)._meta.get_field('post').get_cached_value(instance, None)
+    if post is not None:
+        return post.author_id
+    posts = for_post(Post.objects.all(), instance.post_id)
+    return posts.filter(pk=instance.post_id).values_list('author_id', flat=True).first()
+
+
+def refuse_writes_while_moving(sender, instance, raw=False, origin=None, **kwargs):
+    # pre_save and pre_delete receiver for the sharded models users write to.
+    # Deletes cascading from another row, or run on a queryset (like the
+    # move's own clean-up), are not checked.
+    if raw or not is_sharded() or (origin is not None and origin is not instance):
+        return
+    check_not_moving([owner_id(instance)])
+
+
+class ShardedQuerySet(models.QuerySet):
+    """
+    QuerySet for the sharded models. create() without an explicit using()
+    saves through Model.save(), so the router sees the instance and can pick
+    its shard (QuerySet.create would route without looking at the row).
+    """
+
+    def create(self, **kwargs):
+        if self._db is not None or not is_sharded():
+            return super().create(**kwargs)
+        obj = self.model(**kwargs)
+        obj.save(force_insert=True)
+        return obj
+
+
+class ShardedQuerySetList:
+    """
+    Read-only, ordered view over the same query on several shards, usable by
+    Django's Paginator (and so DRF pagination): count() sums the shards and
+    slicing fetches the first `stop` rows from each shard and merges them.
+    """
+
+    def __init__(self, querysets, key, reverse=True):
+        self.querysets = querysets
+        self.key = key
+        self.reverse = reverse
+        self.ordered = True
+
+    def count(self):
+        return sum(queryset.count() for queryset in self.querysets)
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return iter(self[0:None])
+
+    def order_by(self, *fields):
+        return ShardedQuerySetList([queryset.order_by(*fields) for queryset in self.querysets], self.key, self.reverse)
+
+    def filter(self, *args, **kwargs):
+        # Lets keyset (cursor) pagination narrow every shard the same way
+        return ShardedQuerySetList([queryset.filter(*args, **kwargs) for queryset in self.querysets], self.key, self.reverse)
+
+    def __getitem__(self, index):
+        if isinstance(index, int):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        parts = [queryset if stop is None else queryset[:stop] for queryset in self.querysets]
+        merged = heapq.merge(*parts, key=self.key, reverse=self.reverse)
+        return [row for position, row in enumerate(merged) if position >= start and (stop is None or position < stop)]
+
+
+class ShardRouter:
+    """
+    Routes writes (and hinted reads, e.g. related-object access) for the
+    sharded models. Returns None otherwise so the next router decides.
+    """
+
+    def shard_for_instance(self, instance):
+        from notifications.models import Notification
+        from .models import Comment, Like, Mention, Post, PostScore, PostTag
+        if isinstance(instance, Post):
+            return shard_for_user(instance.author_id)
+        if isinstance(instance, (Comment, Like, PostTag, PostScore, Mention)):
+            post = type(instance)._meta.get_field('post').get_cached_value(instance, None)
+            return post._state.db if post is not None and post._state.db else shard_for_post(instance.post_id)
+        if isinstance(instance, Notification):
+            return shard_for_user(instance.recipient_id)
+        return None
+
+    def is_sharded_model(self, model):
+        return model._meta.label in (
+            'posts.Post', 'posts.Comment', 'posts.Like', 'posts.PostTag', 'posts.PostScore', 'posts.Mention',
+            'notifications.Notification',
+        )
+
+    def db_for_read(self, model, **hints):
+        if not is_sharded() or not self.is_sharded_model(model):
+            return None
+        instance = hints.get('instance')
+        if instance is None:
+            return None
+        if self.is_sharded_model(type(instance)):
+            # Related lookups from a sharded row stay on its shard
+            return self.shard_for_instance(instance) if instance._state.adding else instance._state.db
+        if model._meta.label in ('posts.Post', 'notifications.Notification') and instance._meta.label == settings.AUTH_USER_MODEL:
+            # user.posts / user.notifications
+            return shard_for_user(instance.pk)
+        return None
+
+    def db_for_write(self, model, **hints):
+        if not is_sharded() or not self.is_sharded_model(model):
+            return None
+        instance = hints.get('instance')
+        if instance is not None and type(instance) is model:
+            # New rows go where their owner lives; _state.db is not reliable yet
+            # (assigning a related user copies that user's database into it)
+            if instance._state.adding:
+                return self.shard_for_instance(instance)
+            return instance._state.db
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if is_sharded() and (self.is_sharded_model(type(obj1)) or self.is_sharded_model(type(obj2))):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Tags, recommendations and the placement bookkeeping live on 'default' only
+        if app_label == 'posts' and model_name in ('tag', 'recommendation', 'shardassignment', 'globalid'):
+            return db == 'default'
+        return None
+
+
+def delete_user_rows(sender, instance, using, **kwargs):
+    """
+    post_delete receiver for the user model. Deleting a user cascades on its
+    own database only: its posts, comments, likes, mentions and notifications
+    on the other shards are deleted here, one transaction per shard.
+    """
+    if not is_sharded():
+        return
+    from notifications.models import Notification
+    from .models import Comment, Like, Mention, Post, ShardAssignment
+    owned = [
+        (Notification, 'recipient_id'), (Notification, 'actor_id'), (Mention, 'user_id'),
+        (Like, 'user_id'), (Comment, 'author_id'), (Post, 'author_id'),
+    ]
+    for alias in get_shards():
+        if alias == using:
+            continue
+        with transaction.atomic(using=alias):
+            for model, field in owned:
+                model.objects.using(alias).filter(**{field: instance.pk}).delete()
+    ShardAssignment.objects.using('default').filter(user_id=instance.pk).delete()
+    cache.delete(f'user-shard:{instance.pk}')
+
+
+def connect_signals():
+    from notifications.models import Notification
+    from .models import Comment, Like, Post
+    for model in (Post, Comment, Like, Notification):
+        uid = f'posts.sharding.moving.{model._meta.label_lower}'
+        pre_save.connect(refuse_writes_while_moving, sender=model, dispatch_uid=f'{uid}.save')
+        pre_delete.connect(refuse_writes_while_moving, sender=model, dispatch_uid=f'{uid}.delete')
+    pre_save.connect(assign_global_id, sender=Post, dispatch_uid='posts.sharding.post_id')
+    pre_save.connect(assign_global_id, sender=Comment, dispatch_uid='posts.sharding.comment_id')
+    post_delete.connect(delete_user_rows, sender=settings.AUTH_USER_MODEL, dispatch_uid='posts.sharding.user_rows')
@@ -0,0 +1,87 @@
+# posts/signals.py
+from django.conf import settings
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .hashtags import remove_post_tags, sync_post_tags
+from .mentions import sync_mentions
+from .models import Comment, Like, Post
+from .response_cache import author_tag, invalidate
+from .trending import record_event
+
+
+@receiver(post_save, sender=Post)
+def index_post_tags(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not {'title', 'content'} & set(update_fields):
+        return
+    sync_post_tags(instance, created=created)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Comment)
+def index_mentions(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not {'title', 'content'} & set(update_fields):
+        return
+    sync_mentions(instance, created=created)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Like)
+@receiver(post_save, sender=Comment)
+def update_trending_score(sender, instance, created, raw=False, **kwargs):
+    if raw or not created:
+        return
+    post_id = instance.pk if sender is Post else instance.post_id
+    # The row lives next to the post (same shard)
+    record_event(post_id, sender.__name__.upper(), using=instance._state.db)
+
+
+@receiver(pre_delete, sender=Post)
+def unindex_post_tags(sender, instance, **kwargs):
+    # Before the delete: afterwards the PostTag rows are gone
+    remove_post_tags(instance)
+
+
+# Response cache tags (posts/response_cache.py): 'posts' / 'comments' cover
+# the collections, 'post:<id>' / 'comment:<id>' single objects, and
+# 'author:<username>' every response showing that username. A post's
+# representation embeds its comments.
+
+@receiver([post_save, post_delete], sender=Post)
+def invalidate_post_responses(sender, instance, created=False, **kwargs):
+    tags = [f'post:{instance.pk}']
+    if created or kwargs['signal'] is post_delete:
+        tags.append('posts')
+    invalidate(*tags, using=instance._state.db)
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def invalidate_comment_responses(sender, instance, created=False, **kwargs):
+    tags = [f'comment:{instance.pk}', f'post:{instance.post_id}']
+    if created or kwargs['signal'] is post_delete:
+        tags.append('comments')
+    invalidate(*tags, using=instance._state.db)
+
+
+@receiver([post_save, post_delete], sender=Like)
+def invalidate_liked_post_responses(sender, instance, **kwargs):
+    invalidate(f'post:{instance.post_id}', using=instance._state.db)
+
+
+@receiver(post_init, sender=settings.AUTH_USER_MODEL)
+def remember_username(sender, instance, **kwargs):
+    # What the row held when loaded, so a rename is seen without a query
+    # (None if the field was deferred)
+    instance._loaded_username = instance.__dict__.get('username')
+
+
+@receiver(pre_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_author_responses(sender, instance, raw=False, using=None, **kwargs):
+    old = getattr(instance, '_loaded_username', None)
+    if not raw and instance.pk is not None and old is not None and old != instance.username:
+        invalidate(author_tag(old), author_tag(instance.username), using=using)
+    instance._loaded_username = instance.__dict__.get('username')
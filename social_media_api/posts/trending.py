@@ -0,0 +1,54 @@
+# posts/trending.py
+"""
+Trending posts, maintained incrementally.
+
+Every like, comment and the post itself add a weighted event to the post's
+PostScore row (one UPDATE, see posts/ranking.py for the decayed log-score).
+GET /api/posts/trending/ reads the top rows off the score index; nothing is
+aggregated at request time. compact_post_scores prunes rows whose decayed
+value has become negligible, so the table holds only live candidates.
+
+Unlikes and deleted comments do not lower a score: their contribution
+decays away like everything else.
+"""
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import PostScore
+from .ranking import add_event, event_score
+
+# Defaults, override any of them with TRENDING_POSTS in settings.py
+DEFAULTS = {
+    'HALF_LIFE_HOURS': 12,     # an event's weight halves every this many hours
+    'POST_WEIGHT': 1.0,        # publishing the post
+    'LIKE_WEIGHT': 1.0,
+    'COMMENT_WEIGHT': 3.0,     # a comment is more engagement than a like
+    'PRUNE_BELOW': 0.05,       # compaction drops rows whose decayed weight fell under this
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'TRENDING_POSTS', {})}
+
+
+def record_event(post_id, kind, using='default', when=None):
+    """Add a 'POST', 'LIKE' or 'COMMENT' event to the post's score (upsert)."""
+    config = get_config()
+    weight, half_life = config[f'{kind}_WEIGHT'], config['HALF_LIFE_HOURS']
+    when = when or timezone.now()
+    scores = PostScore.objects.using(using).filter(post_id=post_id)
+    if scores.update(score=add_event('score', half_life, when, weight)):
+        return
+    try:
+        with transaction.atomic(using=using):
+            PostScore.objects.using(using).create(post_id=post_id, score=event_score(when, half_life, weight))
+    except IntegrityError:
+        # Created concurrently by another event
+        scores.update(score=add_event('score', half_life, when, weight))
+
+
+def prune_threshold(now=None):
+    """Stored scores below this stand for a decayed weight under PRUNE_BELOW."""
+    config = get_config()
+    return event_score(now or timezone.now(), config['HALF_LIFE_HOURS'], config['PRUNE_BELOW'])
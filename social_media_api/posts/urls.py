@@ -1,7 +1,7 @@
 # posts/urls.py
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import PostViewSet, CommentViewSet, FeedView, LikePostView, UnlikePostView
+from .views import PostViewSet, CommentViewSet, FeedView, LikePostView, UnlikePostView, RecommendedFeedView, TagPostsView, TrendingTagsView, MentionsView
 
 router = DefaultRouter()
 router.register(r'posts', PostViewSet)
@@ -10,7 +10,11 @@ router.register(r'comments', CommentViewSet)
 urlpatterns = [
     path('', include(router.urls)),
     path('feed/', FeedView.as_view(), name='user_feed'),
+    path('feed/recommended/', RecommendedFeedView.as_view(), name='recommended_feed'),
     # New Routes
     path('posts/<int:pk>/like/', LikePostView.as_view(), name='like_post'),
     path('posts/<int:pk>/unlike/', UnlikePostView.as_view(), name='unlike_post'),
+    path('tags/trending/', TrendingTagsView.as_view(), name='trending_tags'),
+    path('tags/<str:name>/posts/', TagPostsView.as_view(), name='tag_posts'),
+    path('mentions/', MentionsView.as_view(), name='mentions'),
 ]
\ No newline at end of file
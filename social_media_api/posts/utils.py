@@ -0,0 +1,21 @@
+# posts/utils.py
+from contextlib import contextmanager
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """
+    Let bulk_create keep the created_at/updated_at/timestamp values we set
+    instead of overwriting them with now() (auto_now / auto_now_add).
+    """
+    saved = []
+    for model in models:
+        for field in model._meta.concrete_fields:
+            if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+                saved.append((field, field.auto_now, field.auto_now_add))
+                field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
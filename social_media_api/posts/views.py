@@ -6,26 +6,85 @@ from .permissions import IsAuthorOrReadOnly
 from rest_framework import filters
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
-from .models import Post, Like
+from .models import Post, Like, Mention, PostScore, PostTag, Recommendation, Tag
+from .recommendations import get_config as recommendations_config
+from .ranking import current_value
+from .trending import get_config as trending_config
+from rest_framework.decorators import action
+from .serializers import TagSerializer
+from rest_framework.pagination import CursorPagination
+from notifications import fanout
 from notifications.models import Notification
 from django.contrib.contenttypes.models import ContentType
+from operator import attrgetter
+from .sharding import for_post, get_shards, is_sharded, shards_for_users, ShardedQuerySetList
+from .search import FullTextSearchFilter
+from .response_cache import AnonymousCacheMixin
+from conditional import ConditionalRequestMixin
 
-class PostViewSet(viewsets.ModelViewSet):
+class PostViewSet(AnonymousCacheMixin, ConditionalRequestMixin, viewsets.ModelViewSet):
     queryset = Post.objects.all().order_by('-created_at')
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
+    cache_tag_prefix, cache_collection_tag = 'post', 'posts'
+    conditional_related = ['comments']  # embedded in each post
     
-    # Enable filtering
-    filter_backends = [filters.SearchFilter]
+    # Enable filtering (full-text, ranked; see posts/search.py)
+    filter_backends = [FullTextSearchFilter]
     search_fields = ['title', 'content']
 
+    def get_queryset(self):
+        # Detail routes read from the shard holding the post
+        queryset = super().get_queryset()
+        if 'pk' in self.kwargs:
+            return for_post(queryset, self.kwargs['pk'])
+        if self.action == 'list':
+            # Users live on 'default': authors are prefetched, not joined
+            return queryset.prefetch_related('author', 'comments__author')
+        return queryset
+
+    def filter_queryset(self, queryset):
+        if is_sharded() and self.action == 'list':
+            # Scatter the (filtered) list query over every shard and merge by date,
+            # or by relevance when searching
+            parts = [super(PostViewSet, self).filter_queryset(queryset.using(alias)) for alias in get_shards()]
+            searching = 'search_rank' in parts[0].query.annotations
+            return ShardedQuerySetList(parts, key=attrgetter('search_rank' if searching else 'created_at'))
+        return super().filter_queryset(queryset)
+
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        post = serializer.save(author=self.request.user)
+        # Followers are notified by a background job (notifications/fanout.py)
+        fanout.schedule(post)
 
-class CommentViewSet(viewsets.ModelViewSet):
+    @action(detail=False)
+    def trending(self, request):
+        """Top posts by decayed engagement, read off the PostScore index (posts/trending.py)."""
+        try:
+            limit = max(0, min(int(request.query_params.get('limit', 20)), 100))
+        except ValueError:
+            limit = 20
+        if is_sharded():
+            # Users live on 'default': prefetch authors instead of joining them
+            scores = ShardedQuerySetList([
+                PostScore.objects.using(alias).select_related('post')
+                .prefetch_related('post__author', 'post__comments__author').order_by('-score')
+                for alias in get_shards()
+            ], key=attrgetter('score'))
+        else:
+            scores = PostScore.objects.select_related('post__author').prefetch_related('post__comments__author').order_by('-score')
+        scores = list(scores[:limit])
+        data = self.get_serializer([score.post for score in scores], many=True).data
+        half_life = trending_config()['HALF_LIFE_HOURS']
+        for item, score in zip(data, scores):
+            item['trending'] = round(current_value(score.score, half_life), 3)
+        return Response(data)
+
+class CommentViewSet(AnonymousCacheMixin, ConditionalRequestMixin, viewsets.ModelViewSet):
     queryset = Comment.objects.all().order_by('-created_at')
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
+    cache_tag_prefix, cache_collection_tag = 'comment', 'comments'
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
@@ -37,8 +96,74 @@ class FeedView(generics.ListAPIView):
     def get_queryset(self):
         # Get users the current user is following
         following_users = self.request.user.following.all()
+        if is_sharded():
+            # Group the followed authors by shard, query each shard once and merge
+            by_shard = {}
+            for user_id, alias in shards_for_users(following_users.values_list('id', flat=True)).items():
+                by_shard.setdefault(alias, []).append(user_id)
+            return ShardedQuerySetList([
+                Post.objects.using(alias).filter(author_id__in=user_ids).order_by('-created_at')
+                .prefetch_related('author', 'comments__author')
+                for alias, user_ids in by_shard.items()
+            ], key=attrgetter('created_at'))
         # Filter posts where author is in that list, order by newest first
-        return Post.objects.filter(author__in=following_users).order_by('-created_at')
+        return Post.objects.filter(author__in=following_users).order_by('-created_at').prefetch_related('author', 'comments__author')
+
+class RecommendedFeedView(generics.GenericAPIView):
+    """
+    Posts picked by collaborative filtering (stored by build_recommendations)
+    with a recent post in every FRESH_EVERY-th slot, skipping the user's own
+    and already liked posts. Users without recommendations get recent posts.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = PostSerializer
+
+    def posts(self, user, alias=None):
+        queryset = Post.objects.all() if alias is None else Post.objects.using(alias)
+        # Users live on 'default': authors are prefetched, not joined
+        return queryset.exclude(author=user).exclude(likes__user=user).prefetch_related('author', 'comments__author')
+
+    def get(self, request, *args, **kwargs):
+        try:
+            limit = max(0, min(int(request.query_params.get('limit', 20)), 100))
+        except ValueError:
+            limit = 20
+        user = request.user
+
+        # Candidates in score order, fetched from the shards holding them
+        candidates = list(Recommendation.objects.filter(user=user).order_by('-score').values_list('post_id', 'author_id')[:limit])
+        if is_sharded():
+            shard_of = shards_for_users({author_id for post_id, author_id in candidates})
+            by_shard = {}
+            for post_id, author_id in candidates:
+                by_shard.setdefault(shard_of[author_id], []).append(post_id)
+            found = {post.pk: post for alias, post_ids in by_shard.items() for post in self.posts(user, alias).filter(pk__in=post_ids)}
+            recent = ShardedQuerySetList(
+                [self.posts(user, alias).order_by('-created_at') for alias in get_shards()], key=attrgetter('created_at'),
+            )[:limit]
+        else:
+            found = {post.pk: post for post in self.posts(user).filter(pk__in=[post_id for post_id, author_id in candidates])}
+            recent = list(self.posts(user).order_by('-created_at')[:limit])
+        recommended = [found[post_id] for post_id, author_id in candidates if post_id in found]
+
+        # Every FRESH_EVERY-th slot takes a recent post; either list fills in when the other runs out
+        fresh_every = recommendations_config()['FRESH_EVERY']
+        sources = {'recommended': iter(recommended), 'recent': iter(recent)}
+        results, seen = [], set()
+        while len(results) < limit and sources:
+            preferred = 'recent' if (len(results) + 1) % fresh_every == 0 else 'recommended'
+            source = preferred if preferred in sources else next(iter(sources))
+            post = next(sources[source], None)
+            if post is None:
+                del sources[source]
+            elif post.pk not in seen:
+                seen.add(post.pk)
+                results.append((source, post))
+
+        data = self.get_serializer([post for source, post in results], many=True).data
+        for item, (source, post) in zip(data, results):
+            item['source'] = source
+        return Response(data)
 
 class LikePostView(generics.GenericAPIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -46,10 +171,10 @@ class LikePostView(generics.GenericAPIView):
 
     def post(self, request, pk, *args, **kwargs):
         # Use generics.get_object_or_404 is also an option, but this is direct
-        post = generics.get_object_or_404(Post, pk=pk)
+        post = generics.get_object_or_404(for_post(Post.objects.all(), pk), pk=pk)
         
-        # 1. Create Like
-        like, created = Like.objects.get_or_create(user=request.user, post=post)
+        # 1. Create Like (on the post's shard)
+        like, created = for_post(Like.objects.all(), pk).get_or_create(user=request.user, post=post)
 
         if not created:
             return Response({"message": "You have already liked this post"}, status=status.HTTP_400_BAD_REQUEST)
@@ -70,13 +195,83 @@ class UnlikePostView(generics.GenericAPIView):
     queryset = Post.objects.all()
 
     def post(self, request, pk, *args, **kwargs):
-        post = generics.get_object_or_404(Post, pk=pk)
+        post = generics.get_object_or_404(for_post(Post.objects.all(), pk), pk=pk)
         
         # Check if like exists
-        like = Like.objects.filter(user=request.user, post=post).first()
+        like = for_post(Like.objects.all(), pk).filter(user=request.user, post=post).first()
         
         if like:
             like.delete()
             return Response({"message": "Post unliked"}, status=status.HTTP_200_OK)
         
-        return Response({"message": "You haven't liked this post"}, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        return Response({"message": "You haven't liked this post"}, status=status.HTTP_400_BAD_REQUEST)
+
+class TagPostsPagination(CursorPagination):
+    # Keyset pagination over the (tag, -created_at) index
+    ordering = ('-created_at', '-id')
+
+class TagPostsView(generics.ListAPIView):
+    """Posts using a hashtag, newest first."""
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    serializer_class = PostSerializer
+    pagination_class = TagPostsPagination
+
+    def get_queryset(self):
+        tag = generics.get_object_or_404(Tag, name=self.kwargs['name'].casefold())
+        # Users live on 'default': authors are prefetched, not joined
+        if is_sharded():
+            return ShardedQuerySetList([
+                PostTag.objects.using(alias).filter(tag=tag)
+                .select_related('post').prefetch_related('post__author', 'post__comments__author')
+                for alias in get_shards()
+            ], key=attrgetter('created_at'))
+        return PostTag.objects.filter(tag=tag).select_related('post').prefetch_related('post__author', 'post__comments__author')
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.get_queryset())
+        serializer = self.get_serializer([post_tag.post for post_tag in page], many=True)
+        return self.get_paginated_response(serializer.data)
+
+class MentionsPagination(CursorPagination):
+    # Keyset pagination over the (user, -created_at) index
+    ordering = ('-created_at', '-id')
+
+class MentionsView(generics.ListAPIView):
+    """
+    Posts mentioning the current user, newest mention first. `comment` is the
+    id of the comment holding the mention, or null for the post itself.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = PostSerializer
+    pagination_class = MentionsPagination
+
+    def get_queryset(self):
+        def mentions(queryset):
+            # Users live on 'default': authors are prefetched, not joined
+            return queryset.filter(user=self.request.user).select_related('post').prefetch_related('post__author', 'post__comments__author')
+        if is_sharded():
+            return ShardedQuerySetList(
+                [mentions(Mention.objects.using(alias)) for alias in get_shards()], key=attrgetter('created_at'),
+            )
+        return mentions(Mention.objects.all())
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.get_queryset())
+        data = self.get_serializer([mention.post for mention in page], many=True).data
+        for item, mention in zip(data, page):
+            item['comment'] = mention.comment_id
+        return self.get_paginated_response(data)
+
+class TrendingTagsView(generics.ListAPIView):
+    """Tags ordered by their decayed post count (see posts/ranking.py)."""
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    serializer_class = TagSerializer
+    pagination_class = None
+    max_limit = 50
+
+    def get_queryset(self):
+        try:
+            limit = min(int(self.request.query_params.get('limit', 10)), self.max_limit)
+        except ValueError:
+            limit = 10
+        return Tag.objects.filter(trending_score__isnull=False, post_count__gt=0).order_by('-trending_score')[:max(limit, 0)]
\ No newline at end of file
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'social_media_api.settings')
+# Route the list endpoints to their async views (settings.ROOT_URLCONF)
+os.environ['DJANGO_ASGI'] = '1'
 
 application = get_asgi_application()
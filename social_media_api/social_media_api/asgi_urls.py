@@ -0,0 +1,18 @@
+# social_media_api/asgi_urls.py
+"""
+URLconf of the ASGI entry point (asgi.py): the I/O-bound list endpoints
+are answered by async views, everything else as under WSGI.
+"""
+from django.urls import path
+
+from notifications.async_views import AsyncNotificationListView
+from posts.async_views import AsyncFeedView, AsyncPostListView
+
+from .urls import urlpatterns as sync_urlpatterns
+
+# Same paths and names as the sync views, listed first so they win
+urlpatterns = [
+    path('api/posts/', AsyncPostListView.as_view(), name='post-list'),
+    path('api/feed/', AsyncFeedView.as_view(), name='user_feed'),
+    path('api/notifications/', AsyncNotificationListView.as_view(), name='notifications_list'),
+] + sync_urlpatterns
@@ -0,0 +1,116 @@
+# social_media_api/async_generics.py
+"""
+Async versions of DRF's APIView and ListAPIView, served through asgi.py.
+
+DRF dispatches synchronously. AsyncAPIView keeps its request wrapping,
+content negotiation, authentication, permissions, throttles, exception
+handling and rendering, but awaits the handler. The checks run in one
+sync_to_async call, the list queries through the async ORM (acount(),
+async iteration), so a request waiting on the database holds no thread.
+
+Serializers run on the event loop: the queryset must prefetch everything
+they read, as a lazy query there raises SynchronousOnlyOperation.
+Querysets that are not QuerySets (ShardedQuerySetList, merged in Python)
+are paginated and serialized in a thread instead.
+"""
+import inspect
+
+from asgiref.sync import sync_to_async
+from django.core.paginator import InvalidPage
+from django.db.models import QuerySet
+from rest_framework import generics
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+
+class AsyncAPIView(APIView):
+    """
+    `sync_view`: an equivalent sync view (an as_view() function) that
+    delegate() hands requests to, for methods or cases the async view
+    does not implement itself.
+    """
+    sync_view = None
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            # Authentication, permissions and throttles may query the database
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            # options() and http_method_not_allowed() stay sync
+            response = handler(request, *args, **kwargs)
+            if inspect.isawaitable(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def delegate(self, request, *args, **kwargs):
+        """Answer the request with `sync_view`, in a thread."""
+        return await sync_to_async(self.sync_view)(request._request, *args, **kwargs)
+
+
+class AsyncListAPIView(AsyncAPIView, generics.GenericAPIView):
+
+    async def get(self, request, *args, **kwargs):
+        return await self.alist(await self.aget_filtered_queryset())
+
+    async def aget_filtered_queryset(self):
+        # get_queryset() may query, e.g. to find the shards to read from
+        return await sync_to_async(lambda: self.filter_queryset(self.get_queryset()))()
+
+    async def alist(self, queryset):
+        if not isinstance(queryset, QuerySet):
+            return await sync_to_async(self.list_sync)(queryset)
+        page = await self.apaginate_queryset(queryset)
+        if page is None:
+            return Response(self.get_serializer([obj async for obj in queryset], many=True).data)
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+    def list_sync(self, queryset):
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(self.get_serializer(queryset, many=True).data)
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+    async def apaginate_queryset(self, queryset):
+        """PageNumberPagination.paginate_queryset() with async count and fetch."""
+        pagination = self.paginator
+        if pagination is None:
+            return None
+        if not isinstance(pagination, PageNumberPagination):
+            return await sync_to_async(pagination.paginate_queryset)(queryset, self.request, view=self)
+
+        request = pagination.request = self.request
+        page_size = pagination.get_page_size(request)
+        if not page_size:
+            return None
+        paginator = pagination.django_paginator_class(queryset, page_size)
+        # Paginator.count is cached: fill it in instead of letting it run count()
+        paginator.count = await queryset.acount()
+        page_number = pagination.get_page_number(request, paginator)
+        try:
+            page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(pagination.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        page.object_list = [obj async for obj in page.object_list]
+        pagination.page = page
+
+        if paginator.num_pages > 1 and pagination.template is not None:
+            # The browsable API should display pagination controls.
+            pagination.display_page_controls = True
+        return page.object_list
@@ -0,0 +1,153 @@
+# social_media_api/db_routers.py
+import hashlib
+import logging
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# The replica the current request reads from, chosen once per request so
+# that its queries see one consistent snapshot. None outside of requests
+# (management commands, shell, workers): everything uses the primary.
+use_replica = ContextVar('use_replica', default=None)
+
+
+def get_replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+class ReplicaHealth:
+    """
+    Remembers which replicas are reachable. A replica is re-checked at most
+    every REPLICA_HEALTH_CHECK_INTERVAL seconds, and is taken out of rotation
+    as soon as a connection attempt fails.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.status = {}  # alias -> (healthy, checked_at)
+
+    def is_healthy(self, alias):
+        interval = getattr(settings, 'REPLICA_HEALTH_CHECK_INTERVAL', 10)
+        healthy, checked_at = self.status.get(alias, (True, 0))
+        if time.monotonic() - checked_at < interval:
+            return healthy
+        try:
+            connections[alias].ensure_connection()
+            healthy = True
+        except DatabaseError:
+            logger.warning('Replica %s is unreachable, reading from the primary instead', alias)
+            healthy = False
+        with self.lock:
+            self.status[alias] = (healthy, time.monotonic())
+        return healthy
+
+    def reset(self):
+        with self.lock:
+            self.status.clear()
+
+
+health = ReplicaHealth()
+
+
+def pick_replica():
+    """A random healthy replica, or None if there is none."""
+    replicas = [alias for alias in get_replicas() if health.is_healthy(alias)]
+    return random.choice(replicas) if replicas else None
+
+
+def pin_key(credentials):
+    """
+    Cache key pinning a client to the primary. Clients are identified by
+    their credentials (token header or session cookie) rather than their user,
+    so the decision can be made before any query runs.
+    """
+    if not credentials:
+        return None
+    return 'db-pin:' + hashlib.sha256(credentials.encode()).hexdigest()
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Lets safe-method requests read from replicas, except for clients that
+    wrote recently: after a POST/PUT/PATCH/DELETE the client is pinned to the
+    primary for READ_YOUR_WRITES_SECONDS so it always sees its own writes.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        key, reads = self.route(request)
+        token = use_replica.set(pick_replica() if reads else None)
+        try:
+            response = self.get_response(request)
+        finally:
+            use_replica.reset(token)
+        return self.pin(request, response, key)
+
+    async def __acall__(self, request):
+        # use_replica is a ContextVar: sync_to_async carries it to the ORM's threads.
+        # The health check connects to the replicas, which must not run in the event loop.
+        key, reads = self.route(request)
+        token = use_replica.set(await sync_to_async(pick_replica)() if reads else None)
+        try:
+            response = await self.get_response(request)
+        finally:
+            use_replica.reset(token)
+        return self.pin(request, response, key)
+
+    def route(self, request):
+        """The client's pin key, and whether this request may read from a replica."""
+        key = pin_key(request.META.get('HTTP_AUTHORIZATION') or request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+        pinned = key is not None and cache.get(key) is not None
+        return key, request.method in SAFE_METHODS and not pinned
+
+    def pin(self, request, response, key):
+        if request.method not in SAFE_METHODS:
+            # Pin whoever made the write, including a session that was just created
+            if key is None and settings.SESSION_COOKIE_NAME in response.cookies:
+                key = pin_key(response.cookies[settings.SESSION_COOKIE_NAME].value)
+            if key is not None:
+                cache.set(key, 1, getattr(settings, 'READ_YOUR_WRITES_SECONDS', 5))
+        return response
+
+
+class ReplicaRouter:
+    """
+    Sends reads to the replica ReplicaRoutingMiddleware picked for the
+    request, and everything else (writes, reads inside transactions) to the
+    primary. Falls back to the primary if that replica fails mid-request.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = use_replica.get()
+        if alias is None or connections['default'].in_atomic_block:
+            return 'default'
+        return alias if health.is_healthy(alias) else 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        databases = {'default', *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
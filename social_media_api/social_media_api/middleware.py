@@ -0,0 +1,185 @@
+# social_media_api/middleware.py
+import logging
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+logger = logging.getLogger('social_media_api.timing')
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised (when QUERY_BUDGET_RAISE is on) if a view runs more queries than its budget."""
+
+
+class RequestTiming:
+    """Per-request counters filled in by ServerTimingMiddleware."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.view_started = None
+        self.view_finished = None
+        self.render_finished = None
+        self.query_budget = None
+        self.view_name = None
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook: time every query run during the request
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+
+    def mark_rendered(self, response):
+        self.render_finished = time.perf_counter()
+        return response
+
+
+def ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+class ServerTimingMiddleware:
+    """
+    Records DB query count, DB time, view time and render time for each request
+    and reports them as structured log fields, and as a Server-Timing header
+    to staff users (or to everyone with DEBUG or SERVER_TIMING_HEADER).
+
+    A view can declare ``query_budget = <n>``; exceeding it logs a warning, or
+    raises QueryBudgetExceeded when settings.QUERY_BUDGET_RAISE is True (tests).
+    Put it first in MIDDLEWARE so the total covers the other middleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timing = request.timing = RequestTiming()
+        with self.timed_queries(timing):
+            response = self.get_response(request)
+        return self.report(request, response, timing)
+
+    async def __acall__(self, request):
+        timing = request.timing = RequestTiming()
+        # Connections are per thread: hook those of the thread where the async
+        # ORM and the sync parts of this request run (thread-sensitive sync_to_async)
+        stack = await sync_to_async(self.timed_queries)(timing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        # request.user may still be lazy, and loading it queries
+        show_timing = await sync_to_async(self.show_timing)(request)
+        return self.report(request, response, timing, show_timing)
+
+    def timed_queries(self, timing):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timing))
+        return stack
+
+    def report(self, request, response, timing, show_timing=None):
+        finished = time.perf_counter()
+        view_time = render_time = 0.0
+        if timing.view_started is not None:
+            # DRF / template responses: the view ends before rendering starts
+            view_time = (timing.view_finished or finished) - timing.view_started
+            if timing.view_finished and timing.render_finished:
+                render_time = timing.render_finished - timing.view_finished
+        total = finished - timing.started
+
+        if show_timing is None:
+            show_timing = self.show_timing(request)
+        if show_timing:
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={ms(timing.db_time)};desc="{timing.queries} queries"',
+                f'view;dur={ms(view_time)}',
+                f'render;dur={ms(render_time)}',
+                f'total;dur={ms(total)}',
+            ])
+        logger.info('%s %s', request.method, request.path, extra={
+            'method': request.method,
+            'path': request.path,
+            'view': timing.view_name,
+            'status': response.status_code,
+            'db_queries': timing.queries,
+            'db_ms': ms(timing.db_time),
+            'view_ms': ms(view_time),
+            'render_ms': ms(render_time),
+            'total_ms': ms(total),
+        })
+
+        if timing.query_budget is not None and timing.queries > timing.query_budget:
+            message = (f'{timing.view_name} ran {timing.queries} queries, '
+                       f'over its budget of {timing.query_budget} ({request.method} {request.path})')
+            if getattr(settings, 'QUERY_BUDGET_RAISE', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+        return response
+
+    def show_timing(self, request):
+        # Query counts and timings help profiling the site: not for everyone
+        if settings.DEBUG or getattr(settings, 'SERVER_TIMING_HEADER', False):
+            return True
+        user = getattr(request, 'user', None)
+        return bool(user is not None and user.is_staff)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timing = request.timing
+        # as_view() functions expose the class as .cls (DRF) or .view_class (Django)
+        view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+        timing.view_name = (view_class or view_func).__name__
+        timing.query_budget = getattr(view_class, 'query_budget', None)
+        timing.view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # Called after the view returns and before the response is rendered
+        timing = request.timing
+        timing.view_finished = time.perf_counter()
+        response.add_post_render_callback(timing.mark_rendered)
+        return response
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise is sync-only: under ASGI Django would switch threads around it
+    on every request, static or not. This version passes non-static requests
+    straight through to the next async middleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            # Stats and opens the file
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
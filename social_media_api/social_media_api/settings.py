@@ -12,17 +12,23 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 import dj_database_url
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Apps shared by every project in this repository live in <repo>/shared
+sys.path.append(str(BASE_DIR.parent / 'shared'))
+# `manage.py test` also runs the tests of the shared apps installed below
+TEST_RUNNER = 'testrunner.ProjectTestRunner'
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/6.0/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SSECRET_KEY = os.environ.get('SECRET_KEY', 'django-insecure-default-key-for-dev')
+SECRET_KEY = os.environ.get('SECRET_KEY', 'django-insecure-default-key-for-dev')
 
 DEBUG = False
 
@@ -43,13 +49,20 @@ INSTALLED_APPS = [
     'accounts',
     'posts',
     'notifications',
+    'jobs',
+    'querylog',
+    'cachekit',
+    'tokenauth',
 ]
 
 AUTH_USER_MODEL = 'accounts.CustomUser'
 
 MIDDLEWARE = [
+    # First, so its totals include every other middleware
+    'social_media_api.middleware.ServerTimingMiddleware',
+    'social_media_api.db_routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'social_media_api.middleware.AsyncWhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -58,7 +71,8 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'social_media_api.urls'
+# asgi.py serves the async list views (see asgi_urls.py)
+ROOT_URLCONF = 'social_media_api.asgi_urls' if os.environ.get('DJANGO_ASGI') else 'social_media_api.urls'
 
 TEMPLATES = [
     {
@@ -76,6 +90,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'social_media_api.wsgi.application'
+ASGI_APPLICATION = 'social_media_api.asgi.application'
 
 
 # Database
@@ -93,6 +108,30 @@ DATABASES = {
 db_from_env = dj_database_url.config(conn_max_age=600)
 DATABASES['default'].update(db_from_env)
 
+# Read replicas: comma separated URLs in DATABASE_REPLICA_URLS. Safe-method
+# requests read from them (see social_media_api/db_routers.py).
+DATABASE_REPLICAS = []
+for index, url in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_URLS', '').split(','))):
+    DATABASES[f'replica_{index}'] = dj_database_url.parse(url, conn_max_age=600)
+    DATABASES[f'replica_{index}']['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS.append(f'replica_{index}')
+
+# Shards for posts, comments, likes and notifications: 'default' plus any
+# comma separated URLs in DATABASE_SHARD_URLS (see posts/sharding.py)
+DATABASE_SHARDS = ['default']
+for index, url in enumerate(filter(None, os.environ.get('DATABASE_SHARD_URLS', '').split(',')), start=1):
+    DATABASES[f'shard_{index}'] = dj_database_url.parse(url, conn_max_age=600)
+    DATABASE_SHARDS.append(f'shard_{index}')
+
+DATABASE_ROUTERS = [
+    'posts.sharding.ShardRouter',
+    'social_media_api.db_routers.ReplicaRouter',
+]
+
+# After a write, the client reads from the primary for this many seconds
+READ_YOUR_WRITES_SECONDS = 5
+REPLICA_HEALTH_CHECK_INTERVAL = 10
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -131,15 +170,110 @@ STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
+# Uploads: profile pictures and their resized variants (accounts/avatars.py)
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Uploaded files are streamed to a temporary file and rejected as soon as they
+# are too large or not an image, see shared/mediakit/uploads.py for all keys
+FILE_UPLOAD_HANDLERS = ['mediakit.uploads.ImageUploadHandler']
+UPLOADS = {
+    'MAX_BYTES': 5 * 1024 * 1024,
+    'MAX_PIXELS': 4096 * 4096,
+}
+
+# Served by mediakit.serve_media (urls.py). Behind nginx, set MEDIA_SENDFILE to
+# 'x-accel-redirect' and alias its internal /protected-media/ location to MEDIA_ROOT
+MEDIA_SERVING = {
+    'PREFIXES': ['profile_pics/', 'avatars/'],
+    'IMMUTABLE_PREFIXES': ['avatars/'],  # content-addressed (accounts/avatars.py)
+    'SENDFILE': os.environ.get('MEDIA_SENDFILE') or None,
+}
+
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'tokenauth.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
 }
 
+# A small LRU in each worker process in front of one cache shared by all
+# workers on the host, in a memory-mapped file (see shared/cachekit/backends.py).
+CACHES = {
+    'default': {
+        'BACKEND': 'cachekit.backends.TieredCache',
+        'LOCATION': 'default',
+        'OPTIONS': {'SHARED': 'shared', 'LOCAL_MAXSIZE': 1000, 'LOCAL_TIMEOUT': 5},
+    },
+    'shared': {
+        'BACKEND': 'cachekit.backends.SharedMemoryCache',
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'social_media_api'),
+        'OPTIONS': {'SIZE': int(os.environ.get('CACHE_SIZE_MB', 64)) * 1024 * 1024},
+    },
+}
+
+# Token -> user lookups are cached for TIMEOUT seconds (see shared/tokenauth/authentication.py).
+# Set LOCAL_MAXSIZE > 0 to add a small per-process LRU in front of the cache.
+TOKEN_AUTH_CACHE = {
+    'ALIAS': 'default',
+    'TIMEOUT': 60,
+    'LOCAL_MAXSIZE': 0,
+    'LOCAL_TIMEOUT': 5,
+}
+
+# Anonymous GETs of posts/comments are cached, see posts/response_cache.py
+RESPONSE_CACHE = {
+    'ALIAS': 'default',
+    'TIMEOUT': 300,
+}
+
+# Trending tags: a post's contribution to its tags' score halves every this many hours
+TRENDING_TAGS_HALF_LIFE_HOURS = 24
+
+# Trending posts: weights and decay of likes/comments, see posts/trending.py for all keys
+TRENDING_POSTS = {
+    'HALF_LIFE_HOURS': 12,
+    'LIKE_WEIGHT': 1.0,
+    'COMMENT_WEIGHT': 3.0,
+}
+
+# Recommended feed, see posts/recommendations.py for all keys
+RECOMMENDATIONS = {
+    'WINDOW_DAYS': 30,
+    'TOP_N': 100,
+    'FRESH_EVERY': 3,
+}
+
+# Background jobs run by `manage.py run_jobs`, see jobs/queue.py for all keys
+JOBS = {
+    'WORKERS': 4,
+    'POOL': 'thread',
+    'MAX_ATTEMPTS': 5,
+}
+
+# Follower notifications for new posts, see notifications/fanout.py for all keys
+NOTIFICATIONS = {
+    'FAN_OUT_CHUNK': 1000,
+    'MAX_PER_WINDOW': 10,
+    'WINDOW': 3600,
+}
+
+# Resized profile pictures, see accounts/avatars.py for all keys
+AVATARS = {
+    'SIZES': {'small': 48, 'medium': 96, 'large': 256},
+    'FORMATS': ['webp', 'jpeg'],
+    'QUALITY': 80,
+}
+
+# Views may set `query_budget`; exceeding it logs a warning (test_settings.py: raises)
+QUERY_BUDGET_RAISE = False
+
+# Server-Timing (query count and timings) is sent to staff users, or to every
+# client with DEBUG or SERVER_TIMING_HEADER on (e.g. for benchmark_api)
+SERVER_TIMING_HEADER = False
+
 # Security settings for production
 SECURE_BROWSER_XSS_FILTER = True
 X_FRAME_OPTIONS = 'DENY'
@@ -0,0 +1,20 @@
+# social_media_api/test_settings.py
+"""Settings for `manage.py test`, which selects them (see manage.py)."""
+from .settings import *  # noqa: F401,F403
+
+# Exceeding a view's query_budget fails the test instead of logging a warning
+QUERY_BUDGET_RAISE = True
+
+# A per-process LocMemCache: the shared memory file would outlive the test database
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+}
+
+# Local SQLite stand-ins for replicas and shards. They are only used by the
+# router and sharding tests, which enable them with override_settings.
+if not DATABASE_REPLICAS:  # noqa: F405
+    for alias in ('replica_a', 'replica_b'):
+        DATABASES[alias] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / f'{alias}.sqlite3'}  # noqa: F405
+if len(DATABASE_SHARDS) == 1:  # noqa: F405
+    for alias in ('shard_1', 'shard_2'):
+        DATABASES[alias] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / f'{alias}.sqlite3'}  # noqa: F405
@@ -1,9 +1,12 @@
 from django.contrib import admin
 from django.urls import path, include
+from mediakit import serve_media
 
 urlpatterns = [
+    path('admin/querylog/', include('querylog.urls')),
     path('admin/', admin.site.urls),
     path('api/accounts/', include('accounts.urls')),
     path('api/', include('posts.urls')),
     path('api/notifications/', include('notifications.urls')),
+    path('media/<path:path>', serve_media, name='media'),
 ]
\ No newline at end of file